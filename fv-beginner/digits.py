@@ -0,0 +1,115 @@
+from nmigen import *
+from nmigen.asserts import *
+
+__all__ = ['hex_digit', 'dec_digits', 'DoubleDabble']
+
+"""
+Conversion of digits to ASCII characters shared by the modules in fv-beginner
+"""
+
+def hex_digit(nibble):
+	"""
+	ASCII code of the lower-case hex digit for nibble, i.e. nibble + '0' up to 9 and
+	nibble + 'a' - 10 from there on. Two small adders and a mux rather than a 16-way case
+	"""
+	return Mux(nibble < 10, nibble + ord('0'), nibble + (ord('a') - 10))
+
+def dec_digits(width):
+	"""
+	Number of decimal digits needed for any unsigned value of the given width
+	"""
+	return len(str((1 << width) - 1))
+
+class DoubleDabble(Elaboratable):
+	"""
+	Sequential binary to BCD converter (double dabble). i_start loads i_value, and width clock
+	cycles later o_bcd holds its dec_digits(width) decimal digits, least significant first, 4 bits
+	each. o_busy is asserted in between
+
+	In formal verification mode, f_value exposes the value being converted
+
+	Every clock cycle, each BCD digit of 5 or more has 3 added to it, and then the BCD digits and
+	the value are shifted left together by one bit. One adder per digit does the whole conversion,
+	instead of dividing by 10 once per digit
+	"""
+	def __init__(self, width, fv_mode=False):
+		self.width = width
+		self.i_start = Signal(1, reset=0)
+		self.i_value = Signal(width, reset=0)
+		self.o_bcd = Signal(4 * dec_digits(width), reset=0)
+		self.o_busy = Signal(1, reset=0)
+		self.fv_mode = fv_mode
+
+		# Extra ports for formal verification
+		self.f_value = Signal(width, reset=0)
+	def ports(self):
+		ports = [self.i_start, self.i_value, self.o_bcd, self.o_busy]
+		if self.fv_mode:
+			ports.append(self.f_value)
+		return ports
+	def elaborate(self, platform):
+		m = Module()
+
+		WIDTH = self.width
+		DIGITS = dec_digits(WIDTH)
+
+		# Bits of the value not converted yet, from the top
+		shift = Signal(WIDTH, reset=0)
+		count = Signal(range(WIDTH + 1), reset=0)
+
+		m.d.comb += self.o_busy.eq(count != 0)
+
+		adjusted = Signal(4 * DIGITS)
+		for i in range(DIGITS):
+			digit = self.o_bcd[4 * i:4 * (i + 1)]
+			m.d.comb += adjusted[4 * i:4 * (i + 1)].eq(Mux(digit >= 5, digit + 3, digit))
+
+		with m.If(self.i_start):
+			m.d.sync += shift.eq(self.i_value)
+			m.d.sync += self.o_bcd.eq(0)
+			m.d.sync += count.eq(WIDTH)
+		with m.Elif(count != 0):
+			m.d.sync += shift.eq(shift << 1)
+			m.d.sync += self.o_bcd.eq(Cat(shift[-1], adjusted))
+			m.d.sync += count.eq(count - 1)
+
+		if self.fv_mode:
+			"""
+			Formal-only copy of the value being converted
+			"""
+			f_value = self.f_value
+			with m.If(self.i_start):
+				m.d.sync += f_value.eq(self.i_value)
+
+			"""
+			Properties of o_bcd
+			"""
+			# Every BCD digit is a decimal digit
+			for i in range(DIGITS):
+				m.d.comb += Assert(self.o_bcd[4 * i:4 * (i + 1)] <= 9)
+			# The BCD digits always hold the bits of the value converted so far, so they hold
+			# the whole value once o_busy is de-asserted
+			f_dec = Signal(4 * DIGITS)
+			m.d.comb += f_dec.eq(sum(self.o_bcd[4 * i:4 * (i + 1)] * (10 ** i) \
+				for i in range(DIGITS)))
+			m.d.comb += Assert(f_dec == (f_value >> count))
+
+			"""
+			Properties of shift and count
+			"""
+			m.d.comb += Assert(count <= WIDTH)
+			m.d.comb += Assert(shift == (f_value << (WIDTH - count))[:WIDTH])
+
+		return m
+
+if __name__ == '__main__':
+	"""
+	Formal Verification
+	"""
+	from proofcache import *
+
+	class DoubleDabbleTest(FormalTestCase):
+		def test_double_dabble(self):
+			for width in [1, 4, 8, 16]:
+				self.assertFormal(DoubleDabble(width, fv_mode=True), mode='prove', depth=2)
+	DoubleDabbleTest().test_double_dabble()
@@ -10,6 +10,12 @@ from nmigen_boards.resources import *
 import itertools
 import os
 import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from simharness import *
+from proofcache import *
 
 __all__ = ["ReqWalker", "VersaECP5Platform"]
 
@@ -29,6 +35,9 @@ class ReqWalker(Elaboratable):
 		self.i_req = Signal(1, reset=0)
 		self.o_busy = Signal(1)
 		self.state = Signal(4, reset=0)
+		# Asserted while nothing but counter changes, for simharness.py
+		self.idle = Signal(1)
+		self.idle_counters = []
 		self.fv_mode = fv_mode
 	def ports(self):
 		return [
@@ -54,6 +63,10 @@ class ReqWalker(Elaboratable):
 
 		m.d.comb += self.o_busy.eq(self.state != 0)
 
+		# While walking, counter counts up to PERIOD - 1 and nothing else happens until it gets there
+		m.d.comb += self.idle.eq((self.state != 0) & (self.counter != PERIOD - 1))
+		self.idle_counters = [(self.counter, PERIOD - 1)]
+
 		with m.FSM():
 			with m.State('READY'):
 				m.next = 'READY'
@@ -434,18 +447,16 @@ if __name__ == "__main__":
 	m = Module()
 	m.submodules.reqwalker = reqwalker = ReqWalker()
 
-	sim = Simulator(m)
+	sim = SimHarness(m, idle=[reqwalker])
 
 	def process():
 		for i in range(3):
 			yield reqwalker.i_req.eq(1)
 			yield
 			yield reqwalker.i_req.eq(0)
-			for j in range(100):
-				yield
+			yield Wait(100)
 		yield reqwalker.i_req.eq(1)
-		for i in range(300):
-			yield
+		yield Wait(300)
 
 	sim.add_clock(0.25)
 	sim.add_sync_process(process)
@@ -456,7 +467,7 @@ if __name__ == "__main__":
 	"""
 	Formal Verification
 	"""
-	class ReqWalkerTest(FHDLTestCase):
+	class ReqWalkerTest(FormalTestCase):
 		def test_reqwalker(self):
 			reqwalker = ReqWalker(fv_mode = True)
 			self.assertFormal(reqwalker, mode = "prove", depth = 5)
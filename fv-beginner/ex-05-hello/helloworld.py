@@ -6,13 +6,18 @@ from nmigen.build import *
 from nmigen.build import ResourceError
 from nmigen.vendor.lattice_ecp5 import *
 from nmigen_boards.resources import *
-from functools import reduce
 
 import itertools
 import os
 import subprocess
+import sys
 
-from txuart import *
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart import *
+from simharness import *
+from proofcache import *
+from properties import *
 
 __all__ = ["HelloWorld", "VersaECP5Platform"]
 
@@ -38,19 +43,19 @@ class HelloWorld(Elaboratable):
 	def elaborate(self, platform):
 		m = Module()
 
-		o_uart_tx = Signal(1, reset=1)
-
 		state = Signal(range(len(self.msg)), reset=0)
 
+		m.submodules.txuart = txuart = TXUART(fv_mode=self.fv_mode)
+		m.d.comb += txuart.i_wr.eq(self.o_wr)
+		m.d.comb += txuart.i_data.eq(self.o_data)
+		m.d.comb += self.i_busy.eq(txuart.o_busy)
+
 		if platform is not None and platform != "formal":
-			o_uart_tx = platform.request("uart").tx.o
-		
-		m.submodules.txuart = txuart = TXUART(self.o_wr, self.o_data, self.i_busy, \
-			o_uart_tx, self.fv_mode)
+			m.d.comb += platform.request("uart").tx.o.eq(txuart.o_uart_tx)
 
 		m.d.comb += self.o_wr.eq(~self.i_busy)
 
-		with m.FSM():
+		with m.FSM() as fsm:
 			for i in range(len(self.msg)):
 				with m.State(str(i)):
 					m.next = str(i)
@@ -71,22 +76,15 @@ class HelloWorld(Elaboratable):
 
 			"""
 			Assume there is a reasonable upper bound on the consecutive number of clock
-			cycles that i_busy is asserted, say, 10 * CLOCKS_PER_BAUD
+			cycles that i_busy is asserted, say, 12 * CLOCKS_PER_BAUD, since the transmitter
+			takes the next byte during the stop bits of the current one, and with the holding
+			register full, it can stay busy for just over a frame
 			This is required for some assertions to pass k-induction
 			"""
-			# CLOCKS_PER_BAUD = 4 in simulation (see txuart.py)
+			# CLOCKS_PER_BAUD = 4 in simulation (see uart/txuart.py)
 			CLOCKS_PER_BAUD = 4
 
-			f_past10n_valid = Signal(1, reset=0)
-			f_past10n_ctr = Signal(range(10 * CLOCKS_PER_BAUD), reset=0)
-			m.d.sync += f_past10n_ctr.eq(f_past10n_ctr + 1)
-			with m.If(f_past10n_ctr == 10 * CLOCKS_PER_BAUD - 1):
-				m.d.sync += f_past10n_ctr.eq(f_past10n_ctr)
-				m.d.sync += f_past10n_valid.eq(1)
-
-			with m.If(f_past10n_valid & reduce(lambda a, b: a & b, \
-				(Past(self.i_busy, i) for i in range(1, 10 * CLOCKS_PER_BAUD + 1)))):
-				m.d.comb += Assume(~self.i_busy)
+			bounded_stall(m, self.i_busy, 12 * CLOCKS_PER_BAUD, name='f_busy_stall')
 
 			"""
 			Properties of o_wr
@@ -110,6 +108,12 @@ class HelloWorld(Elaboratable):
 			# Initial state is zero (= transmit first character)
 			with m.If(~f_past_valid):
 				m.d.comb += Assert(state == 0)
+			# state is always the index of a character in the message, and the FSM is in the
+			# corresponding state
+			m.d.comb += Assert(state < len(self.msg))
+			for i in range(len(self.msg)):
+				with m.If(state == i):
+					m.d.comb += Assert(fsm.ongoing(str(i)))
 			# o_wr triggers state transitions, and state transitions are correct
 			with m.If(f_past_valid & Past(self.o_wr)):
 				m.d.comb += Assert(state == ((Past(state) + 1) % len(self.msg)))
@@ -123,7 +127,7 @@ if __name__ == "__main__":
 	m = Module()
 	m.submodules.helloworld = helloworld = HelloWorld()
 
-	sim = Simulator(m)
+	sim = SimHarness(m)
 
 	def process():
 		for i in range(1000):
@@ -138,9 +142,9 @@ if __name__ == "__main__":
 	"""
 	Formal Verification
 	"""
-	class HelloWorldTest(FHDLTestCase):
+	class HelloWorldTest(FormalTestCase):
 		def test_helloworld(self):
-			self.assertFormal(HelloWorld(fv_mode=True), mode='prove', depth=66)
+			self.assertFormal(HelloWorld(fv_mode=True), mode='prove', depth=8)
 	HelloWorldTest().test_helloworld()
 
 	"""
@@ -6,33 +6,63 @@ from nmigen.build import *
 from nmigen.build import ResourceError
 from nmigen.vendor.lattice_ecp5 import *
 from nmigen_boards.resources import *
+from nmigen.lib.coding import *
 from functools import reduce
 
 import itertools
 import os
 import subprocess
+import sys
 
-__all__ = ["ChgDetector"]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from proofcache import *
+
+__all__ = ["ChgDetector", "MultiChgDetector"]
 
 """
 Change detector for txdata
 See https://zipcpu.com/tutorial/lsn-06-txdata.pdf for more details
+
+MultiChgDetector is the same for any number of channels, sharing one strobe and one output between
+all of them, so that a single TXData (or TXFormat) can report the changes of all the channels
 """
 
 class ChgDetector(Elaboratable):
-	def __init__(self, i_data, o_stb, o_data, i_busy, fv_mode=False):
+	"""
+	Strobes out i_data on o_data whenever it differs from the value last strobed out and i_busy is
+	de-asserted. Since the value is sampled at that point, the intermediate values of a fast
+	changing i_data are never queued, and the sink always gets the latest one
+
+	interval, if given, turns on coalescing mode: successive strobes are then at least interval + 1
+	clock cycles apart, so that a fast changing i_data cannot take all of the bandwidth of the
+	sink, and the following are counted
+	- o_dropped, the number of values of i_data that were never strobed out because a newer one
+	  came along first
+	- o_latency, the number of clock cycles from the first change of i_data since the last strobe
+	  to the strobe that reported it, for the latest strobe
+	Both saturate rather than wrap around
+	"""
+	def __init__(self, i_data, o_stb, o_data, i_busy, interval=None, fv_mode=False):
+		assert interval is None or interval >= 0
 		self.i_data = i_data
 		self.o_stb = o_stb
 		self.o_data = o_data
 		self.i_busy = i_busy
+		self.interval = interval
+		self.o_dropped = Signal(32, reset=0)
+		self.o_latency = Signal(32, reset=0)
 		self.fv_mode = fv_mode
 	def ports(self):
-		return [
+		ports = [
 			self.i_data,
 			self.o_stb,
 			self.o_data,
 			self.i_busy
 		]
+		if self.interval is not None:
+			ports += [self.o_dropped, self.o_latency]
+		return ports
 	def elaborate(self, platform):
 		m = Module()
 
@@ -41,11 +71,45 @@ class ChgDetector(Elaboratable):
 		stb_past = Signal(1)
 		m.d.comb += stb_past.eq(self.o_stb)
 
+		# Asserted when the minimum interval since the last strobe is over
+		open_ = Signal(1)
+		if not self.interval:
+			m.d.comb += open_.eq(1)
+		else:
+			holdoff = Signal(range(self.interval + 1), reset=0)
+			m.d.comb += open_.eq(holdoff == 0)
+			with m.If(holdoff != 0):
+				m.d.sync += holdoff.eq(holdoff - 1)
+
+		latch = Signal(1)
+		m.d.comb += latch.eq((~stb_past) & open_ & (~self.i_busy) & (self.i_data != self.o_data))
+
 		with m.If(stb_past):
 				m.d.sync += self.o_stb.eq(0)
-		with m.Elif((~self.i_busy) & (self.i_data != self.o_data)):
+		with m.Elif(latch):
 			m.d.sync += self.o_stb.eq(1)
 			m.d.sync += self.o_data.eq(self.i_data)
+			if self.interval:
+				m.d.sync += holdoff.eq(self.interval)
+
+		if self.interval is not None:
+			# A value is dropped when i_data moves on from it before it has been strobed out, i.e.
+			# while it still differs from o_data
+			last = Signal(len(self.i_data), reset=0)
+			m.d.sync += last.eq(self.i_data)
+			with m.If((self.i_data != last) & (last != self.o_data) & \
+				(self.o_dropped != 0xFFFFFFFF)):
+				m.d.sync += self.o_dropped.eq(self.o_dropped + 1)
+
+			# Clock cycles since i_data first differed from o_data
+			age = Signal(32, reset=0)
+			with m.If(latch):
+				m.d.sync += self.o_latency.eq(age)
+				m.d.sync += age.eq(0)
+			with m.Elif(self.i_data == self.o_data):
+				m.d.sync += age.eq(0)
+			with m.Elif(age != 0xFFFFFFFF):
+				m.d.sync += age.eq(age + 1)
 
 		if self.fv_mode:
 			"""
@@ -83,10 +147,10 @@ class ChgDetector(Elaboratable):
 			# o_stb is de-asserted for this clock cycle
 			with m.If(f_past_valid & (Past(self.i_data) == Past(self.o_data))):
 				m.d.comb += Assert(~self.o_stb)
-			# Given that i_busy and o_stb were de-asserted in the previous clock cycle,
-			# if there was a change to the data in the previous clock cycle then o_stb
-			# is asserted in this clock cycle
-			with m.If(f_past_valid & (~Past(self.i_busy)) & (~Past(self.o_stb)) & \
+			# Given that i_busy and o_stb were de-asserted in the previous clock cycle (and the
+			# minimum interval was over), if there was a change to the data in the previous clock
+			# cycle then o_stb is asserted in this clock cycle
+			with m.If(f_past_valid & (~Past(self.i_busy)) & (~Past(self.o_stb)) & Past(open_) & \
 				(Past(self.i_data) != Past(self.o_data))):
 				m.d.comb += Assert(self.o_stb)
 
@@ -96,16 +160,182 @@ class ChgDetector(Elaboratable):
 			# o_data is initially zero
 			with m.If(~f_past_valid):
 				m.d.comb += Assert(self.o_data == 0)
-			# Given that i_busy and o_stb were de-asserted in the previous clock cycle,
-			# whatever value i_data had in the previous clock cycle, o_data now contains
-			# that value in this clock cycle
-			with m.If(f_past_valid & (~Past(self.i_busy)) & ~Past(self.o_stb)):
+			# Given that i_busy and o_stb were de-asserted in the previous clock cycle (and the
+			# minimum interval was over), whatever value i_data had in the previous clock cycle,
+			# o_data now contains that value in this clock cycle
+			with m.If(f_past_valid & (~Past(self.i_busy)) & (~Past(self.o_stb)) & Past(open_)):
 				m.d.comb += Assert(self.o_data == Past(self.i_data))
-			# o_data should remain stable when o_stb or i_busy are asserted even if i_data
-			# changes
-			with m.If(f_past_valid & (Past(self.i_busy) | Past(self.o_stb))):
+			# o_data should remain stable when o_stb or i_busy are asserted (or within the minimum
+			# interval) even if i_data changes
+			with m.If(f_past_valid & (Past(self.i_busy) | Past(self.o_stb) | ~Past(open_))):
 				m.d.comb += Assert(Stable(self.o_data))
 
+			if self.interval is not None:
+				"""
+				Properties of coalescing mode
+				"""
+				# Successive strobes are at least interval + 1 clock cycles apart (which they are
+				# anyway for an interval of 0 or 1)
+				f_since = Signal(range(self.interval + 2), reset=self.interval)
+				with m.If(self.o_stb):
+					m.d.sync += f_since.eq(0)
+				with m.Elif(f_since != self.interval):
+					m.d.sync += f_since.eq(f_since + 1)
+				m.d.comb += Assert(f_since <= self.interval)
+				with m.If(self.o_stb):
+					m.d.comb += Assert(f_since == self.interval)
+				if self.interval:
+					with m.If(self.o_stb):
+						m.d.comb += Assert(holdoff == self.interval)
+					with m.Else():
+						m.d.comb += Assert(holdoff == Mux(f_since + 1 >= self.interval, 0, \
+							self.interval - 1 - f_since))
+				# last always holds the value i_data had in the previous clock cycle
+				with m.If(f_past_valid):
+					m.d.comb += Assert(last == Past(self.i_data))
+				# The count of dropped values never goes down, and goes up by at most one at a time
+				with m.If(f_past_valid):
+					m.d.comb += Assert(self.o_dropped - Past(self.o_dropped) <= 1)
+				# A value that was never strobed out is counted as soon as i_data moves on from it
+				with m.If(f_past_valid & Past(f_past_valid) & \
+					(Past(self.i_data, 2) != Past(self.o_data)) & \
+					(Past(self.i_data) != Past(self.i_data, 2)) & \
+					(Past(self.o_dropped) != 0xFFFFFFFF)):
+					m.d.comb += Assert(self.o_dropped == Past(self.o_dropped) + 1)
+				# age starts out at zero, and restarts whenever a change is strobed out or i_data
+				# matches o_data
+				with m.If(~f_past_valid | Past(latch) | (Past(self.i_data) == Past(self.o_data))):
+					m.d.comb += Assert(age == 0)
+				# A change strobed out in the clock cycle it happens in has a latency of zero
+				with m.If(f_past_valid & Past(f_past_valid) & Past(latch) & \
+					(Past(self.i_data, 2) == Past(self.o_data, 2))):
+					m.d.comb += Assert(self.o_latency == 0)
+
+		return m
+
+class MultiChgDetector(Elaboratable):
+	"""
+	Change detector for a list of channels i_data. Each channel keeps a copy of the value it last
+	reported, and is dirty while its input differs from it. Whenever i_busy is de-asserted, a
+	dirty-bit scanner picks one dirty channel, and its number and value are strobed out on
+	o_channel and o_data like in ChgDetector. Only the channels that changed are reported
+
+	The scanner is a pair of priority encoders, the first over the dirty channels after the one
+	last reported and the second over all of them, which makes it round-robin: a channel that
+	keeps changing cannot starve the others
+	"""
+	def __init__(self, i_data, o_stb, o_channel, o_data, i_busy, fv_mode=False):
+		self.i_data = list(i_data)
+		self.o_stb = o_stb
+		self.o_channel = o_channel
+		self.o_data = o_data
+		self.i_busy = i_busy
+		self.fv_mode = fv_mode
+	def ports(self):
+		return self.i_data + [
+			self.o_stb,
+			self.o_channel,
+			self.o_data,
+			self.i_busy
+		]
+	def elaborate(self, platform):
+		m = Module()
+
+		CHANNELS = len(self.i_data)
+		WIDTH = len(self.o_data)
+
+		# Values last reported by each channel
+		reported = Array(Signal(WIDTH, name='reported%d' % k, reset=0) for k in range(CHANNELS))
+		dirty = Signal(CHANNELS)
+		for k in range(CHANNELS):
+			m.d.comb += dirty[k].eq(self.i_data[k] != reported[k])
+
+		# Round-robin dirty-bit scanner
+		after = Signal(CHANNELS)
+		for k in range(CHANNELS):
+			m.d.comb += after[k].eq(dirty[k] & (k > self.o_channel))
+		m.submodules.after_enc = after_enc = PriorityEncoder(CHANNELS)
+		m.submodules.dirty_enc = dirty_enc = PriorityEncoder(CHANNELS)
+		m.d.comb += after_enc.i.eq(after)
+		m.d.comb += dirty_enc.i.eq(dirty)
+		channel = Signal(range(CHANNELS))
+		m.d.comb += channel.eq(Mux(after_enc.n, dirty_enc.o, after_enc.o))
+
+		i_data = Array(self.i_data)
+
+		m.d.sync += self.o_stb.eq(0)
+
+		with m.If(self.o_stb):
+			m.d.sync += self.o_stb.eq(0)
+		with m.Elif((~self.i_busy) & (dirty != 0)):
+			m.d.sync += self.o_stb.eq(1)
+			m.d.sync += self.o_channel.eq(channel)
+			m.d.sync += self.o_data.eq(i_data[channel])
+			m.d.sync += reported[channel].eq(i_data[channel])
+
+		if self.fv_mode:
+			"""
+			Indicator of when Past() is valid
+			"""
+			f_past_valid = Signal(1, reset=0)
+			m.d.sync += f_past_valid.eq(1)
+
+			"""
+			Assumptions on input behavior, the same as for ChgDetector
+			"""
+			with m.If(~f_past_valid):
+				m.d.comb += Assume(~self.i_busy)
+			with m.If(f_past_valid & (~Past(self.i_busy)) & ~Past(self.o_stb)):
+				m.d.comb += Assume(~self.i_busy)
+			with m.If(f_past_valid & (~Past(self.i_busy)) & Past(self.o_stb)):
+				m.d.comb += Assume(self.i_busy)
+
+			"""
+			Properties of o_stb
+			"""
+			# o_stb is initially de-asserted
+			with m.If(~f_past_valid):
+				m.d.comb += Assert(~self.o_stb)
+			# o_stb is never asserted when i_busy is asserted
+			with m.If(self.i_busy):
+				m.d.comb += Assert(~self.o_stb)
+			# If no channel was dirty in the previous clock cycle then o_stb is de-asserted
+			with m.If(f_past_valid & (Past(dirty) == 0)):
+				m.d.comb += Assert(~self.o_stb)
+			# Given that i_busy and o_stb were de-asserted in the previous clock cycle, if any
+			# channel was dirty then o_stb is asserted in this clock cycle
+			with m.If(f_past_valid & (~Past(self.i_busy)) & (~Past(self.o_stb)) & \
+				(Past(dirty) != 0)):
+				m.d.comb += Assert(self.o_stb)
+
+			"""
+			Properties of o_channel and o_data
+			"""
+			m.d.comb += Assert(self.o_channel < CHANNELS)
+			with m.If(f_past_valid & self.o_stb):
+				# The channel reported was dirty
+				m.d.comb += Assert(Past(dirty).bit_select(self.o_channel, 1))
+				# No dirty channel was skipped over since the one reported before
+				for k in range(CHANNELS):
+					with m.If(Past(dirty)[k]):
+						with m.If(Past(self.o_channel) < self.o_channel):
+							m.d.comb += Assert((k <= Past(self.o_channel)) | (k >= self.o_channel))
+						with m.Else():
+							m.d.comb += Assert((k <= Past(self.o_channel)) & (k >= self.o_channel))
+				# o_data holds the value of that channel in the previous clock cycle, which is
+				# now the value it last reported
+				for k in range(CHANNELS):
+					with m.If(self.o_channel == k):
+						m.d.comb += Assert(self.o_data == Past(self.i_data[k]))
+				m.d.comb += Assert(self.o_data == reported[self.o_channel])
+			# o_channel and o_data remain stable between strobes
+			with m.If(f_past_valid & ~self.o_stb):
+				m.d.comb += Assert(Stable(self.o_channel))
+				m.d.comb += Assert(Stable(self.o_data))
+			# The values last reported only change when they are strobed out
+			for k in range(CHANNELS):
+				with m.If(f_past_valid & ~(self.o_stb & (self.o_channel == k))):
+					m.d.comb += Assert(Stable(reported[k]))
 
 		return m
 
@@ -114,7 +344,7 @@ if __name__ == "__main__":
 	Formal Verification
 	No point in simulating/building such a trivial design
 	"""
-	class ChgDetectorTest(FHDLTestCase):
+	class ChgDetectorTest(FormalTestCase):
 		def test_chgdetector(self):
 			i_data = Signal(32, reset=0)
 			o_stb = Signal(1, reset=0)
@@ -122,4 +352,23 @@ if __name__ == "__main__":
 			i_busy = Signal(1, reset=0)
 			chgdetector = ChgDetector(i_data, o_stb, o_data, i_busy, fv_mode=True)
 			self.assertFormal(chgdetector, mode='prove')
-	ChgDetectorTest().test_chgdetector()
\ No newline at end of file
+		def test_chgdetector_coalesce(self):
+			for interval in [0, 1, 5]:
+				i_data = Signal(8, reset=0)
+				o_stb = Signal(1, reset=0)
+				o_data = Signal(8, reset=0)
+				i_busy = Signal(1, reset=0)
+				chgdetector = ChgDetector(i_data, o_stb, o_data, i_busy, interval=interval, \
+					fv_mode=True)
+				self.assertFormal(chgdetector, mode='prove')
+		def test_multi_chgdetector(self):
+			i_data = [Signal(8, reset=0) for k in range(4)]
+			o_stb = Signal(1, reset=0)
+			o_channel = Signal(2, reset=0)
+			o_data = Signal(8, reset=0)
+			i_busy = Signal(1, reset=0)
+			chgdetector = MultiChgDetector(i_data, o_stb, o_channel, o_data, i_busy, fv_mode=True)
+			self.assertFormal(chgdetector, mode='prove')
+	ChgDetectorTest().test_chgdetector()
+	ChgDetectorTest().test_chgdetector_coalesce()
+	ChgDetectorTest().test_multi_chgdetector()
\ No newline at end of file
@@ -6,34 +6,105 @@ from nmigen.build import *
 from nmigen.build import ResourceError
 from nmigen.vendor.lattice_ecp5 import *
 from nmigen_boards.resources import *
-from functools import reduce
 
 import itertools
 import os
 import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from proofcache import *
+from properties import *
 
 __all__ = ['Counter']
 
 """
 Event counter for txdata
 See https://zipcpu.com/tutorial/lsn-06-txdata.pdf for more details
+
+The counter is as wide as o_counter, and has a few options for counting high-rate events:
+- chunk splits the counter into chunks of that many bits, each with its own adder, and registers
+  the carry from one chunk into the next, so that the longest carry chain is chunk bits long
+  whatever the width of the counter. The lower chunks are delayed to line up with the carries, so
+  o_counter is always consistent, but lags the events by one clock cycle per extra chunk
+- saturate makes the counter stop at its largest value instead of wrapping around
+- snapshot adds i_snap, which latches o_counter into o_snapshot, so that a consistent value can be
+  read out (e.g. over a slow bus) while counting goes on
 """
 
 class Counter(Elaboratable):
-	def __init__(self, i_reset, i_event, o_counter, fv_mode = False):
+	def __init__(self, i_reset, i_event, o_counter, chunk=None, saturate=False, snapshot=False, \
+		fv_mode = False):
+		assert chunk is None or chunk > 0
 		self.i_reset = i_reset
 		self.i_event = i_event
 		self.o_counter = o_counter
+		self.chunk = chunk
+		self.saturate = saturate
+		self.snapshot = snapshot
+		self.i_snap = Signal(1, reset=0)
+		self.o_snapshot = Signal(len(o_counter), reset=0)
 		self.fv_mode = fv_mode
 	def ports(self):
-		return [self.i_reset, self.i_event, self.o_counter]
+		ports = [self.i_reset, self.i_event, self.o_counter]
+		if self.snapshot:
+			ports += [self.i_snap, self.o_snapshot]
+		return ports
 	def elaborate(self, platform):
 		m = Module()
 
-		with m.If(self.i_reset):
-			m.d.sync += self.o_counter.eq(0)
-		with m.Elif(self.i_event):
-			m.d.sync += self.o_counter.eq(self.o_counter + 1)
+		WIDTH = len(self.o_counter)
+		MAX = (1 << WIDTH) - 1
+
+		if self.chunk is None or self.chunk >= WIDTH:
+			CHUNKS = 1
+			with m.If(self.i_reset):
+				m.d.sync += self.o_counter.eq(0)
+			with m.Elif(self.i_event & ((self.o_counter != MAX) if self.saturate else 1)):
+				m.d.sync += self.o_counter.eq(self.o_counter + 1)
+		else:
+			# Chunk i counts the carries out of chunk i - 1 (or the events, for chunk 0), one clock
+			# cycle after they happen
+			CHUNKS = (WIDTH + self.chunk - 1) // self.chunk
+			offsets = [self.chunk * i for i in range(CHUNKS)]
+			widths = [self.chunk] * (CHUNKS - 1) + [WIDTH - offsets[-1]]
+			chunks = [Signal(w, name='chunk%d' % i, reset=0) for i, w in enumerate(widths)]
+			carries = [Signal(1, name='carry%d' % i, reset=0) for i in range(CHUNKS - 1)]
+			incs = [self.i_event] + carries
+			for i in range(CHUNKS):
+				with m.If(incs[i]):
+					m.d.sync += chunks[i].eq(chunks[i] + 1)
+				if i < CHUNKS - 1:
+					m.d.sync += carries[i].eq(incs[i] & (chunks[i] == (1 << widths[i]) - 1))
+
+			# Chunk i is delayed by CHUNKS - 1 - i clock cycles, to line up with the top chunk
+			lines = []
+			for i in range(CHUNKS):
+				line = [Signal(widths[i], name='chunk%d_d%d' % (i, k + 1), reset=0) \
+					for k in range(CHUNKS - 1 - i)]
+				for k, stage in enumerate(line):
+					m.d.sync += stage.eq(line[k - 1] if k > 0 else chunks[i])
+				lines.append(line)
+			delayed = Cat(*(line[-1] if line else chunk for line, chunk in zip(lines, chunks)))
+
+			# The top chunk wraps around at the same time as the whole counter would, which is
+			# when a saturating counter overflows
+			overflow = Signal(1, reset=0)
+			if self.saturate:
+				with m.If(incs[-1] & (chunks[-1] == (1 << widths[-1]) - 1)):
+					m.d.sync += overflow.eq(1)
+				m.d.comb += self.o_counter.eq(Mux(overflow, MAX, delayed))
+			else:
+				m.d.comb += self.o_counter.eq(delayed)
+
+			with m.If(self.i_reset):
+				for s in chunks + carries + sum(lines, []) + [overflow]:
+					m.d.sync += s.eq(0)
+
+		if self.snapshot:
+			with m.If(self.i_snap):
+				m.d.sync += self.o_snapshot.eq(self.o_counter)
 
 		if self.fv_mode:
 			"""
@@ -42,24 +113,43 @@ class Counter(Elaboratable):
 			f_past_valid = Signal(1, reset=0)
 			m.d.sync += f_past_valid.eq(1)
 
+			if CHUNKS == 1 and not self.saturate:
+				"""
+				Assume there is at least 1 event every 10 clock cycles
+				and at least 1 reset every 10 clock cycles for k-induction
+				to pass
+				"""
+				bounded_stall(m, ~self.i_reset, 9, name='f_reset_stall')
+				bounded_stall(m, ~self.i_event, 9, name='f_event_stall')
+
 			"""
-			Assume there is at least 1 event every 10 clock cycles
-			and at least 1 reset every 10 clock cycles for k-induction
-			to pass
+			Reference model: a plain counter f_raw that wraps around, and f_ovf, which is set once
+			it has, so that the count is f_raw, or the largest value for a saturating counter that
+			has overflowed. f_lag holds both as they were up to CHUNKS - 1 clock cycles ago, with
+			a reset clearing the past values too
 			"""
-			f_past9_valid = Signal(1, reset=0)
-			f_past9_ctr = Signal(range(9), reset=0)
-			m.d.sync += f_past9_ctr.eq(f_past9_ctr + 1)
-			with m.If(f_past9_ctr == 8):
-				m.d.sync += f_past9_ctr.eq(f_past9_ctr)
-				m.d.sync += f_past9_valid.eq(1)
-
-			with m.If(f_past9_valid & reduce(lambda a, b: a & b, \
-				((~Past(self.i_reset, i)) for i in range(1, 10)))):
-				m.d.comb += Assume(self.i_reset)
-			with m.If(f_past9_valid & reduce(lambda a, b: a & b, \
-				((~Past(self.i_event, i)) for i in range(1, 10)))):
-				m.d.comb += Assume(self.i_event)
+			f_raw = Signal(WIDTH, reset=0)
+			f_ovf = Signal(1, reset=0)
+			with m.If(self.i_reset):
+				m.d.sync += f_raw.eq(0)
+				m.d.sync += f_ovf.eq(0)
+			with m.Elif(self.i_event):
+				m.d.sync += f_raw.eq(f_raw + 1)
+				with m.If(f_raw == MAX):
+					m.d.sync += f_ovf.eq(1)
+			f_lag = [(f_raw, f_ovf)]
+			for k in range(1, CHUNKS):
+				raw = Signal(WIDTH, name='f_raw_lag%d' % k, reset=0)
+				ovf = Signal(1, name='f_ovf_lag%d' % k, reset=0)
+				m.d.sync += raw.eq(Mux(self.i_reset, 0, f_lag[-1][0]))
+				m.d.sync += ovf.eq(Mux(self.i_reset, 0, f_lag[-1][1]))
+				f_lag.append((raw, ovf))
+			# o_counter is always the count CHUNKS - 1 clock cycles ago
+			raw, ovf = f_lag[-1]
+			if self.saturate:
+				m.d.comb += Assert(self.o_counter == Mux(ovf, MAX, raw))
+			else:
+				m.d.comb += Assert(self.o_counter == raw)
 
 			"""
 			Counter properties
@@ -70,9 +160,46 @@ class Counter(Elaboratable):
 			# On reset, counter resets to zero on next clock cycle
 			with m.If(f_past_valid & Past(self.i_reset)):
 				m.d.comb += Assert(self.o_counter == 0)
-			# On event, given there is no reset, counter increments by 1
-			with m.If(f_past_valid & Past(self.i_event) & ~Past(self.i_reset)):
-				m.d.comb += Assert(self.o_counter == (Past(self.o_counter) + 1))
+			if CHUNKS == 1:
+				# On event, given there is no reset (and the counter is not saturated), counter
+				# increments by 1
+				with m.If(f_past_valid & Past(self.i_event) & ~Past(self.i_reset) & \
+					((Past(self.o_counter) != MAX) if self.saturate else 1)):
+					m.d.comb += Assert(self.o_counter == (Past(self.o_counter) + 1)[:WIDTH])
+			else:
+				"""
+				Pipelined carry properties
+				"""
+				# The chunks and the carries in flight always add up to the count, so nothing is
+				# lost or counted twice while a carry ripples up
+				f_internal = Signal(WIDTH + 1)
+				m.d.comb += f_internal.eq(sum(chunks[i] << offsets[i] for i in range(CHUNKS)) + \
+					sum(carries[i] << offsets[i + 1] for i in range(CHUNKS - 1)))
+				m.d.comb += Assert(f_internal[:WIDTH] == f_raw)
+				# Chunk i holds its part of the count as it was i clock cycles ago, and each
+				# delayed copy holds what the chunk held that many clock cycles before
+				for i in range(CHUNKS):
+					for k, value in enumerate([chunks[i]] + lines[i]):
+						m.d.comb += Assert(value == f_lag[i + k][0][offsets[i]:offsets[i] + widths[i]])
+				# A carry is in flight when the chunk below has just wrapped around
+				for i in range(CHUNKS - 1):
+					with m.If(carries[i]):
+						m.d.comb += Assert(chunks[i] == 0)
+				# A saturating counter overflows exactly when the top chunk wraps around, which is
+				# pending while the carry out of the top bit is still in flight
+				if self.saturate:
+					m.d.comb += Assert(overflow == f_lag[-1][1])
+					m.d.comb += Assert(f_ovf == (overflow | f_internal[WIDTH]))
+
+			if self.snapshot:
+				"""
+				Snapshot properties
+				"""
+				# i_snap latches the value of o_counter, which then stays put until the next one
+				with m.If(f_past_valid & Past(self.i_snap)):
+					m.d.comb += Assert(self.o_snapshot == Past(self.o_counter))
+				with m.If(f_past_valid & ~Past(self.i_snap)):
+					m.d.comb += Assert(Stable(self.o_snapshot))
 
 		return m
 
@@ -81,11 +208,30 @@ if __name__ == "__main__":
 	Formal Verification (sanity check)
 	No point in simulating/building this trivial design
 	"""
-	class CounterTest(FHDLTestCase):
+	class CounterTest(FormalTestCase):
 		def test_counter(self):
 			i_reset = Signal(1, reset=0)
 			i_event = Signal(1, reset=0)
 			o_counter = Signal(32, reset=0)
 			counter = Counter(i_reset, i_event, o_counter, fv_mode=True)
-			self.assertFormal(counter, mode='prove', depth=17)
-	CounterTest().test_counter()
\ No newline at end of file
+			self.assertFormal(counter, mode='prove', depth=3)
+		def test_counter_saturate(self):
+			i_reset = Signal(1, reset=0)
+			i_event = Signal(1, reset=0)
+			o_counter = Signal(8, reset=0)
+			counter = Counter(i_reset, i_event, o_counter, saturate=True, snapshot=True, \
+				fv_mode=True)
+			self.assertFormal(counter, mode='prove', depth=3)
+		def test_counter_pipelined(self):
+			# (width, chunk) pairs, the last one with a short top chunk
+			for width, chunk in [(48, 24), (64, 16), (10, 4)]:
+				for saturate in [False, True]:
+					i_reset = Signal(1, reset=0)
+					i_event = Signal(1, reset=0)
+					o_counter = Signal(width, reset=0)
+					counter = Counter(i_reset, i_event, o_counter, chunk=chunk, \
+						saturate=saturate, snapshot=True, fv_mode=True)
+					self.assertFormal(counter, mode='prove', depth=3)
+	CounterTest().test_counter()
+	CounterTest().test_counter_saturate()
+	CounterTest().test_counter_pipelined()
@@ -6,19 +6,33 @@ from nmigen.build import *
 from nmigen.build import ResourceError
 from nmigen.vendor.lattice_ecp5 import *
 from nmigen_boards.resources import *
-from functools import reduce
 
 import itertools
 import os
 import subprocess
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart import *
+from simharness import *
+from proofcache import *
+from properties import *
+from digits import *
 from counter import *
 from chgdetector import *
-from txuart import *
 
 __all__ = ['TXData', 'TXDataDemo', 'VersaECP5Platform']
 
 class TXData(Elaboratable):
+	"""
+	Prints i_data in hex as 0x followed by one digit per nibble and a newline, e.g. 0x0000002a for
+	a 32-bit i_data. The width of i_data can be anything, with the digits zero-padded to a whole
+	number of nibbles
+
+	The value is copied into a shift register and every hex digit is taken from its top nibble,
+	which is shifted out after each character, so that one hex encoder serves all the digits
+	"""
 	def __init__(self, i_stb, i_data, o_busy, o_uart_tx, fv_mode=False):
 		self.i_stb = i_stb
 		self.i_data = i_data
@@ -35,381 +49,51 @@ class TXData(Elaboratable):
 	def elaborate(self, platform):
 		m = Module()
 
+		# Hex digits in a line, and the state in which the newline is sent
+		DIGITS = (len(self.i_data) + 3) // 4
+		NEWLINE = DIGITS + 3
+
 		o_wr = Signal(1, reset=0)
 		o_data = Signal(8, reset=0)
 		i_busy = Signal(1, reset=0)
-		m.submodules.txuart = TXUART(o_wr, o_data, i_busy, self.o_uart_tx, self.fv_mode)
-
-		data_copy = Signal(32, reset=0)
-		state = Signal(4, reset=0)
+		m.submodules.txuart = txuart = TXUART(fv_mode=self.fv_mode)
+		m.d.comb += txuart.i_wr.eq(o_wr)
+		m.d.comb += txuart.i_data.eq(o_data)
+		m.d.comb += i_busy.eq(txuart.o_busy)
+		m.d.comb += self.o_uart_tx.eq(txuart.o_uart_tx)
+
+		data_copy = Signal(4 * DIGITS, reset=0)
+		# 0 when idle, 1 for '0', 2 for 'x', 3 to NEWLINE - 1 for the hex digits and NEWLINE for
+		# the newline
+		state = Signal(range(NEWLINE + 1), reset=0)
 		counter = Signal(32, reset=0)
 
 		m.d.comb += self.o_busy.eq(state != 0)
 		m.d.sync += counter.eq(counter + 1)
 
-		with m.FSM():
-			with m.State('IDLE'):
-				m.next = 'IDLE'
+		with m.If(state == 0):
+			m.d.sync += counter.eq(0)
+			with m.If(self.i_stb):
+				m.d.sync += state.eq(1)
+				m.d.sync += o_wr.eq(1)
+				m.d.sync += o_data.eq(ord('0'))
+				m.d.sync += data_copy.eq(self.i_data)
+		with m.Else():
+			m.d.sync += o_wr.eq(0)
+			with m.If((counter != 0) & ~i_busy):
 				m.d.sync += counter.eq(0)
-				with m.If(self.i_stb):
-					m.next = 'ZERO'
-					m.d.sync += state.eq(1)
-					m.d.sync += o_wr.eq(1)
-					m.d.sync += o_data.eq(ord('0'))
-					m.d.sync += data_copy.eq(self.i_data)
-			with m.State('ZERO'):
-				m.next = 'ZERO'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'X'
-					m.d.sync += state.eq(2)
-					m.d.sync += o_wr.eq(1)
-					m.d.sync += o_data.eq(ord('x'))
-					m.d.sync += counter.eq(0)
-			with m.State('X'):
-				m.next = 'X'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX7'
-					m.d.sync += state.eq(3)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[28:]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX7'):
-				m.next = 'HEX7'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX6'
-					m.d.sync += state.eq(4)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[24:28]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX6'):
-				m.next = 'HEX6'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX5'
-					m.d.sync += state.eq(5)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[20:24]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX5'):
-				m.next = 'HEX5'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX4'
-					m.d.sync += state.eq(6)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[16:20]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX4'):
-				m.next = 'HEX4'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX3'
-					m.d.sync += state.eq(7)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[12:16]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX3'):
-				m.next = 'HEX3'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX2'
-					m.d.sync += state.eq(8)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[8:12]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX2'):
-				m.next = 'HEX2'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX1'
-					m.d.sync += state.eq(9)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[4:8]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX1'):
-				m.next = 'HEX1'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'HEX0'
-					m.d.sync += state.eq(10)
-					m.d.sync += o_wr.eq(1)
-					with m.Switch(data_copy[:4]):
-						with m.Case(0x0):
-							m.d.sync += o_data.eq(ord('0'))
-						with m.Case(0x1):
-							m.d.sync += o_data.eq(ord('1'))
-						with m.Case(0x2):
-							m.d.sync += o_data.eq(ord('2'))
-						with m.Case(0x3):
-							m.d.sync += o_data.eq(ord('3'))
-						with m.Case(0x4):
-							m.d.sync += o_data.eq(ord('4'))
-						with m.Case(0x5):
-							m.d.sync += o_data.eq(ord('5'))
-						with m.Case(0x6):
-							m.d.sync += o_data.eq(ord('6'))
-						with m.Case(0x7):
-							m.d.sync += o_data.eq(ord('7'))
-						with m.Case(0x8):
-							m.d.sync += o_data.eq(ord('8'))
-						with m.Case(0x9):
-							m.d.sync += o_data.eq(ord('9'))
-						with m.Case(0xa):
-							m.d.sync += o_data.eq(ord('a'))
-						with m.Case(0xb):
-							m.d.sync += o_data.eq(ord('b'))
-						with m.Case(0xc):
-							m.d.sync += o_data.eq(ord('c'))
-						with m.Case(0xd):
-							m.d.sync += o_data.eq(ord('d'))
-						with m.Case(0xe):
-							m.d.sync += o_data.eq(ord('e'))
-						with m.Case(0xf):
-							m.d.sync += o_data.eq(ord('f'))
-					m.d.sync += counter.eq(0)
-			with m.State('HEX0'):
-				m.next = 'HEX0'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'NEWLINE'
-					m.d.sync += state.eq(11)
-					m.d.sync += o_wr.eq(1)
-					m.d.sync += o_data.eq(ord('\n'))
-					m.d.sync += counter.eq(0)
-			with m.State('NEWLINE'):
-				m.next = 'NEWLINE'
-				m.d.sync += o_wr.eq(0)
-				with m.If((counter != 0) & ~i_busy):
-					m.next = 'IDLE'
+				with m.If(state == NEWLINE):
 					m.d.sync += state.eq(0)
-					m.d.sync += counter.eq(0)
+				with m.Else():
+					m.d.sync += state.eq(state + 1)
+					m.d.sync += o_wr.eq(1)
+					with m.If(state == 1):
+						m.d.sync += o_data.eq(ord('x'))
+					with m.Elif(state == NEWLINE - 1):
+						m.d.sync += o_data.eq(ord('\n'))
+					with m.Else():
+						m.d.sync += o_data.eq(hex_digit(data_copy[-4:]))
+						m.d.sync += data_copy.eq(data_copy << 4)
 
 		if self.fv_mode:
 			"""
@@ -418,6 +102,13 @@ class TXData(Elaboratable):
 			f_past_valid = Signal(1, reset=0)
 			m.d.sync += f_past_valid.eq(1)
 
+			"""
+			Formal-only copy of the value being printed
+			"""
+			f_data = Signal(4 * DIGITS, reset=0)
+			with m.If((state == 0) & self.i_stb):
+				m.d.sync += f_data.eq(self.i_data)
+
 			"""
 			Assumptions on input pins
 			"""
@@ -427,16 +118,7 @@ class TXData(Elaboratable):
 			# When idle, i_stb is never de-asserted for more than 10 consecutive clock
 			# cycles
 			# This may be required for k-induction to pass
-			f_past10_valid = Signal(1, reset=0)
-			f_past10_ctr = Signal(range(10), reset=0)
-			m.d.sync += f_past10_ctr.eq(f_past10_ctr + 1)
-			with m.If(f_past10_ctr == 9):
-				m.d.sync += f_past10_ctr.eq(f_past10_ctr)
-				m.d.sync += f_past10_valid.eq(1)
-
-			with m.If(f_past10_valid & reduce(lambda a, b: a & b, \
-				(((Past(state, i) == 0) & ~Past(self.i_stb, i)) for i in range(1, 11)))):
-				m.d.comb += Assume(self.i_stb)
+			bounded_stall(m, (state == 0) & ~self.i_stb, 10, name='f_idle_stall')
 			# i_busy is initially de-asserted
 			with m.If(~f_past_valid):
 				m.d.comb += Assume(~i_busy)
@@ -450,9 +132,7 @@ class TXData(Elaboratable):
 				m.d.comb += Assume(~i_busy)
 			# i_busy is never asserted for more than 10 consecutive clock cycles
 			# This may be required for k-induction to pass
-			with m.If(f_past10_valid & reduce(lambda a, b: a & b, \
-				(Past(i_busy, i) for i in range(1, 11)))):
-				m.d.comb += Assume(~i_busy)
+			f_busy_stall = bounded_stall(m, i_busy, 10, name='f_busy_stall')
 
 			"""
 			Properties of o_busy
@@ -483,307 +163,39 @@ class TXData(Elaboratable):
 				m.d.comb += Assert(o_wr == (counter == 0))
 
 			"""
-			Properties of o_data
+			Properties of o_data and data_copy
 			"""
 			# Except when idle (where o_data is a don't care), o_data should contain the
-			# correct character in each state
+			# correct character in each state, with the hex digits most significant first.
+			# data_copy holds the digits that are left, so it is all zeros once they are out
 			with m.Switch(state):
 				with m.Case(0):
 					m.d.comb += Assert(1)
 				with m.Case(1):
 					m.d.comb += Assert(o_data == ord('0'))
+					m.d.comb += Assert(data_copy == f_data)
 				with m.Case(2):
 					m.d.comb += Assert(o_data == ord('x'))
-				with m.Case(3):
-					with m.Switch(data_copy[28:]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(4):
-					with m.Switch(data_copy[24:28]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(5):
-					with m.Switch(data_copy[20:24]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(6):
-					with m.Switch(data_copy[16:20]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(7):
-					with m.Switch(data_copy[12:16]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(8):
-					with m.Switch(data_copy[8:12]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(9):
-					with m.Switch(data_copy[4:8]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(10):
-					with m.Switch(data_copy[:4]):
-						with m.Case(0x0):
-							m.d.comb += Assert(o_data == ord('0'))
-						with m.Case(0x1):
-							m.d.comb += Assert(o_data == ord('1'))
-						with m.Case(0x2):
-							m.d.comb += Assert(o_data == ord('2'))
-						with m.Case(0x3):
-							m.d.comb += Assert(o_data == ord('3'))
-						with m.Case(0x4):
-							m.d.comb += Assert(o_data == ord('4'))
-						with m.Case(0x5):
-							m.d.comb += Assert(o_data == ord('5'))
-						with m.Case(0x6):
-							m.d.comb += Assert(o_data == ord('6'))
-						with m.Case(0x7):
-							m.d.comb += Assert(o_data == ord('7'))
-						with m.Case(0x8):
-							m.d.comb += Assert(o_data == ord('8'))
-						with m.Case(0x9):
-							m.d.comb += Assert(o_data == ord('9'))
-						with m.Case(0xa):
-							m.d.comb += Assert(o_data == ord('a'))
-						with m.Case(0xb):
-							m.d.comb += Assert(o_data == ord('b'))
-						with m.Case(0xc):
-							m.d.comb += Assert(o_data == ord('c'))
-						with m.Case(0xd):
-							m.d.comb += Assert(o_data == ord('d'))
-						with m.Case(0xe):
-							m.d.comb += Assert(o_data == ord('e'))
-						with m.Case(0xf):
-							m.d.comb += Assert(o_data == ord('f'))
-				with m.Case(11):
+					m.d.comb += Assert(data_copy == f_data)
+				for i in range(DIGITS):
+					with m.Case(3 + i):
+						m.d.comb += Assert(o_data == \
+							hex_digit(f_data[4 * (DIGITS - 1 - i):4 * (DIGITS - i)]))
+						m.d.comb += Assert(data_copy == (f_data << (4 * (i + 1)))[:4 * DIGITS])
+				with m.Case(NEWLINE):
 					m.d.comb += Assert(o_data == ord('\n'))
-				with m.Default():
-					m.d.comb += Assert(0) # This should never happen
+					m.d.comb += Assert(data_copy == 0)
+				# When every value of state has a case of its own (e.g. 16-bit i_data), there is
+				# no default left to cover
+				if (1 << len(state)) > NEWLINE + 1:
+					with m.Default():
+						m.d.comb += Assert(0) # This should never happen
 
-			"""
-			Properties of data_copy
-			"""
 			# When idle, if i_stb is asserted, data_copy should take the value of
 			# i_data on the next clock cycle
 			with m.If(f_past_valid & (Past(state) == 0) & Past(self.i_stb)):
 				m.d.comb += Assert(data_copy == Past(self.i_data))
 
-			# During transmission, data_copy should remain stable regardless of changes
-			# in i_data
-			with m.If(f_past_valid & (Past(state) != 0) & (state != 0)):
-				m.d.comb += Assert(Stable(data_copy))
-
 			"""
 			Properties of state
 			"""
@@ -791,7 +203,7 @@ class TXData(Elaboratable):
 			with m.If(~f_past_valid):
 				m.d.comb += Assert(state == 0)
 			# The circuit never enters an invalid state
-			m.d.comb += Assert(state < 12)
+			m.d.comb += Assert(state <= NEWLINE)
 			# When idle, if i_stb was asserted in the previous clock cycle then the state
 			# transitions to ZERO in this clock cycle
 			with m.If(f_past_valid & (Past(state) == 0) & Past(self.i_stb)):
@@ -803,7 +215,7 @@ class TXData(Elaboratable):
 				m.d.comb += Assert(Stable(state))
 			with m.If(f_past_valid & (Past(state) != 0) & \
 				(Past(counter) != 0) & ~Past(i_busy)):
-				m.d.comb += Assert(state == ((Past(state) + 1) % 12))
+				m.d.comb += Assert(state == ((Past(state) + 1) % (NEWLINE + 1)))
 
 			"""
 			Counter properties
@@ -819,6 +231,15 @@ class TXData(Elaboratable):
 			# overflows)
 			with m.If(f_past_valid & (state != 0) & Stable(state)):
 				m.d.comb += Assert(counter == Past(counter) + 1)
+			# Since o_wr, i_busy has been asserted on every clock cycle but the first, which
+			# bounds counter by how long i_busy can stay asserted
+			with m.If(state == 0):
+				m.d.comb += Assert(~i_busy)
+			with m.If((state != 0) & (counter == 0)):
+				m.d.comb += Assert(~i_busy)
+				m.d.comb += Assert(f_busy_stall == 0)
+			with m.If((state != 0) & (counter != 0)):
+				m.d.comb += Assert(f_busy_stall == counter - 1)
 
 		return m
 
@@ -865,7 +286,7 @@ if __name__ == "__main__":
 	o_uart_tx = Signal(1, reset=1)
 	m.submodules.txdata = txdata = TXData(i_stb, i_data, o_busy, o_uart_tx)
 
-	sim = Simulator(m)
+	sim = SimHarness(m)
 
 	def process():
 		for i in range(10):
@@ -875,8 +296,7 @@ if __name__ == "__main__":
 			yield i_stb.eq(0)
 			yield i_data.eq(0)
 			yield
-			while (yield o_busy):
-				yield
+			yield WaitWhile(o_busy)
 
 	sim.add_clock(1e-8)
 	sim.add_sync_process(process)
@@ -887,15 +307,25 @@ if __name__ == "__main__":
 	"""
 	Formal Verification
 	"""
-	class TXDataTest(FHDLTestCase):
+	class TXDataTest(FormalTestCase):
 		def test_txdata(self):
 			i_stb = Signal(1, reset=0)
 			i_data = Signal(32, reset=0)
 			o_busy = Signal(1, reset=0)
 			o_uart_tx = Signal(1, reset=1)
 			txdata = TXData(i_stb, i_data, o_busy, o_uart_tx, fv_mode=True)
-			self.assertFormal(txdata, mode='prove', depth=18)
+			self.assertFormal(txdata, mode='prove', depth=4)
+		def test_txdata_widths(self):
+			# 10 bits checks the zero padding of the top digit
+			for width in [8, 10, 16, 64]:
+				i_stb = Signal(1, reset=0)
+				i_data = Signal(width, reset=0)
+				o_busy = Signal(1, reset=0)
+				o_uart_tx = Signal(1, reset=1)
+				txdata = TXData(i_stb, i_data, o_busy, o_uart_tx, fv_mode=True)
+				self.assertFormal(txdata, mode='prove', depth=4)
 	TXDataTest().test_txdata()
+	TXDataTest().test_txdata_widths()
 
 	"""
 	Build
@@ -0,0 +1,448 @@
+from nmigen import *
+from nmigen.back.pysim import *
+from nmigen.asserts import *
+from nmigen.test.utils import *
+from nmigen.build import *
+from nmigen.build import ResourceError
+from nmigen.vendor.lattice_ecp5 import *
+from nmigen_boards.resources import *
+
+import itertools
+import os
+import re
+import string
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart import *
+from simharness import *
+from proofcache import *
+from properties import *
+from digits import *
+from counter import *
+from chgdetector import *
+
+__all__ = ['TXFormat', 'TXFormatDemo', 'MultiChannelDemo', 'format_program', 'format_record', \
+	'VersaECP5Platform']
+
+"""
+Microcoded formatted output over the UART, a generalisation of TXData
+
+The format is a Python format string, e.g. 'ctr=0x{0:08x},evt={1:d}\r\n', with one replacement
+field per value, which can be printed in hex (x), decimal (d, the default) or binary (b). A field
+is zero-padded (or cut down to its least significant digits) to the width given in front of the
+type, and is as wide as the largest value of its signal otherwise
+
+At elaboration time, the format is compiled into a small ROM with one opcode per character of the
+record: a literal character (which includes newlines), a hex digit or a decimal digit (which
+includes binary digits). i_stb latches every value at once, and the engine then steps through the
+ROM, sending one character per opcode. Decimal fields are converted to BCD by a DoubleDabble each
+in the meantime, so only the first decimal digit of a record may have to wait for one
+
+Characters are handed to the double-buffered TXUART as soon as it takes them, so records go out at
+the full line rate, with no idle time between characters
+"""
+
+# Opcodes in the format ROM
+OP_LIT = 0
+OP_HEX = 1
+OP_DEC = 2
+
+def _fields(fmt, widths):
+	"""
+	Splits fmt into (literal text, field index, type, digits, natural digits) tuples, where natural
+	digits is the number of digits needed for the width of the field. The field index is None
+	after the last field
+	"""
+	auto = 0
+	for literal, name, spec, conversion in string.Formatter().parse(fmt):
+		if name is None:
+			yield literal, None, None, 0, 0
+			continue
+		if conversion is not None:
+			raise ValueError("Conversions are not supported in format {!r}".format(fmt))
+		if name == '':
+			index = auto
+			auto += 1
+		elif name.isdigit():
+			index = int(name)
+		else:
+			raise ValueError("Invalid field {!r} in format {!r}".format(name, fmt))
+		if index >= len(widths):
+			raise ValueError("Field {} out of range in format {!r}".format(index, fmt))
+		match = re.fullmatch(r'0?(\d*)([xdb]?)', spec)
+		if match is None:
+			raise ValueError("Invalid format spec {!r} in format {!r}".format(spec, fmt))
+		kind = match.group(2) or 'd'
+		if kind == 'x':
+			natural = (widths[index] + 3) // 4
+		elif kind == 'd':
+			natural = dec_digits(widths[index])
+		else:
+			natural = widths[index]
+		digits = int(match.group(1)) if match.group(1) else natural
+		yield literal, index, kind, digits, natural
+
+def format_program(fmt, widths):
+	"""
+	Compiles fmt for values of the given widths into a list of opcodes, one per character, each of
+	which is either (OP_LIT, character code), or (OP_HEX or OP_DEC, (field, type, digit)) for
+	digit number digit (counting from the least significant one) of the given field and type.
+	Digits beyond the width of a field are zero padding, and are compiled into literal zeros
+	"""
+	program = []
+	for literal, index, kind, digits, natural in _fields(fmt, widths):
+		program += [(OP_LIT, ord(c)) for c in literal]
+		for digit in reversed(range(digits)):
+			if digit >= natural:
+				program.append((OP_LIT, ord('0')))
+			else:
+				program.append((OP_HEX if kind == 'x' else OP_DEC, (index, kind, digit)))
+	if not program:
+		raise ValueError("Empty format {!r}".format(fmt))
+	if any(code >= 256 for op, code in program if op == OP_LIT):
+		raise ValueError("Format {!r} is not 8-bit text".format(fmt))
+	return program
+
+def format_record(fmt, widths, values):
+	"""
+	Reference model: the record TXFormat sends for the given values
+	"""
+	record = ''
+	for op, arg in format_program(fmt, widths):
+		if op == OP_LIT:
+			record += chr(arg)
+			continue
+		index, kind, digit = arg
+		if kind == 'x':
+			record += '%x' % ((values[index] >> (4 * digit)) & 0xf)
+		elif kind == 'd':
+			record += str((values[index] // (10 ** digit)) % 10)
+		else:
+			record += str((values[index] >> digit) & 1)
+	return record
+
+class TXFormat(Elaboratable):
+	def __init__(self, fmt, i_stb, i_fields, o_busy, o_uart_tx, fv_mode=False):
+		self.fmt = fmt
+		self.i_stb = i_stb
+		self.i_fields = list(i_fields)
+		self.o_busy = o_busy
+		self.o_uart_tx = o_uart_tx
+		self.fv_mode = fv_mode
+		self.program = format_program(fmt, [len(field) for field in self.i_fields])
+		self.txuart = TXUART(fv_mode=fv_mode)
+	def ports(self):
+		return [self.i_stb] + self.i_fields + [self.o_busy, self.o_uart_tx]
+	def elaborate(self, platform):
+		m = Module()
+
+		m.submodules.txuart = txuart = self.txuart
+		m.d.comb += self.o_uart_tx.eq(txuart.o_uart_tx)
+
+		# Values latched by i_stb
+		values = [Signal(len(field), name='value%d' % i, reset=0) \
+			for i, field in enumerate(self.i_fields)]
+
+		# One BCD converter for every field printed in decimal
+		bcds = {}
+		for op, arg in self.program:
+			if op == OP_DEC and arg[1] == 'd' and arg[0] not in bcds:
+				index = arg[0]
+				dabble = DoubleDabble(len(self.i_fields[index]), fv_mode=self.fv_mode)
+				m.submodules['dabble%d' % index] = dabble
+				m.d.comb += dabble.i_start.eq(self.i_stb & ~self.o_busy)
+				m.d.comb += dabble.i_value.eq(self.i_fields[index])
+				bcds[index] = dabble
+
+		# Every digit the ROM can refer to, 4 bits each
+		sources = []
+		for op, arg in self.program:
+			if op != OP_LIT and arg not in sources:
+				sources.append(arg)
+		nibbles = []
+		for index, kind, digit in sources:
+			if kind == 'x':
+				nibbles.append(values[index][4 * digit:4 * (digit + 1)])
+			elif kind == 'd':
+				nibbles.append(bcds[index].o_bcd[4 * digit:4 * (digit + 1)])
+			else:
+				nibbles.append(values[index][digit])
+		nibbles = Array(nibbles or [Const(0, 4)])
+
+		# The format ROM, with the opcode in the bottom 2 bits, followed by either the character
+		# code or the index of the digit in nibbles
+		ARG_WIDTH = max(8, len(sources).bit_length())
+		rom = Array(Const(op | ((arg if op == OP_LIT else sources.index(arg)) << 2), \
+			2 + ARG_WIDTH) for op, arg in self.program)
+
+		pc = Signal(range(len(self.program)), reset=0)
+		word = Signal(2 + ARG_WIDTH)
+		op = Signal(2)
+		arg = Signal(ARG_WIDTH)
+		nibble = Signal(4)
+		m.d.comb += word.eq(rom[pc])
+		m.d.comb += op.eq(word[:2])
+		m.d.comb += arg.eq(word[2:])
+		m.d.comb += nibble.eq(nibbles[arg])
+
+		# Decimal digits wait for the conversion
+		converting = Signal(1)
+		m.d.comb += converting.eq(0)
+		for dabble in bcds.values():
+			with m.If(dabble.o_busy):
+				m.d.comb += converting.eq(1)
+
+		with m.Switch(op):
+			with m.Case(OP_LIT):
+				m.d.comb += txuart.i_data.eq(arg)
+			with m.Case(OP_HEX):
+				m.d.comb += txuart.i_data.eq(hex_digit(nibble))
+			with m.Default():
+				m.d.comb += txuart.i_data.eq(nibble + ord('0'))
+		m.d.comb += txuart.i_wr.eq(self.o_busy & ~((op == OP_DEC) & converting))
+		m.d.comb += txuart.sink.first.eq(pc == 0)
+		m.d.comb += txuart.sink.last.eq(pc == len(self.program) - 1)
+
+		with m.If(~self.o_busy):
+			with m.If(self.i_stb):
+				m.d.sync += self.o_busy.eq(1)
+				m.d.sync += pc.eq(0)
+				for value, field in zip(values, self.i_fields):
+					m.d.sync += value.eq(field)
+		with m.Elif(txuart.sink.valid & txuart.sink.ready):
+			with m.If(pc == len(self.program) - 1):
+				m.d.sync += self.o_busy.eq(0)
+				m.d.sync += pc.eq(0)
+			with m.Else():
+				m.d.sync += pc.eq(pc + 1)
+
+		if self.fv_mode:
+			"""
+			Indicator of when Past() is valid
+			"""
+			f_past_valid = Signal(1, reset=0)
+			m.d.sync += f_past_valid.eq(1)
+
+			"""
+			Formal-only copies of the values being printed
+			"""
+			f_values = [Signal(len(field), name='f_value%d' % i, reset=0) \
+				for i, field in enumerate(self.i_fields)]
+			with m.If(self.i_stb & ~self.o_busy):
+				for f_value, field in zip(f_values, self.i_fields):
+					m.d.sync += f_value.eq(field)
+
+			"""
+			Assumptions on input pins
+			"""
+			# i_stb is never asserted when o_busy is asserted
+			with m.If(self.o_busy):
+				m.d.comb += Assume(~self.i_stb)
+
+			"""
+			Properties of o_busy and pc
+			"""
+			# o_busy is initially de-asserted
+			with m.If(~f_past_valid):
+				m.d.comb += Assert(~self.o_busy)
+			# The program counter never runs off the end of the ROM
+			m.d.comb += Assert(pc < len(self.program))
+			# The program counter is at the start of the ROM whenever idle
+			with m.If(~self.o_busy):
+				m.d.comb += Assert(pc == 0)
+			# A record starts one clock cycle after i_stb
+			with m.If(f_past_valid & ~Past(self.o_busy) & Past(self.i_stb)):
+				m.d.comb += Assert(self.o_busy)
+			# The program counter moves on by one character at a time
+			with m.If(f_past_valid & Past(self.o_busy) & ~(Past(txuart.sink.valid) & \
+				Past(txuart.sink.ready))):
+				m.d.comb += Assert(Stable(pc))
+				m.d.comb += Assert(self.o_busy)
+
+			"""
+			Properties of the values
+			"""
+			# The values are latched by i_stb, and stay stable until the record is out
+			for value, f_value in zip(values, f_values):
+				with m.If(self.o_busy):
+					m.d.comb += Assert(value == f_value)
+			# The BCD converters are started along with the record, so that they convert the
+			# values latched
+			for index, dabble in bcds.items():
+				with m.If(self.o_busy):
+					m.d.comb += Assert(dabble.f_value == f_values[index])
+
+			"""
+			Properties of the characters sent
+			"""
+			# Characters are sent as a valid/ready stream, marked as a packet for each record
+			stream_protocol(m, txuart.sink, f_past_valid)
+			with m.If(~self.o_busy):
+				m.d.comb += Assert(~txuart.sink.valid)
+			# Each character is the one the format calls for at that position
+			with m.Switch(pc):
+				for i, (op_i, arg_i) in enumerate(self.program):
+					with m.Case(i):
+						if op_i == OP_LIT:
+							m.d.comb += Assert(txuart.i_data == arg_i)
+						else:
+							index, kind, digit = arg_i
+							if kind == 'x':
+								m.d.comb += Assert(txuart.i_data == \
+									hex_digit(f_values[index][4 * digit:4 * (digit + 1)]))
+							elif kind == 'b':
+								m.d.comb += Assert(txuart.i_data == \
+									f_values[index][digit] + ord('0'))
+							else:
+								with m.If(txuart.sink.valid):
+									m.d.comb += Assert(txuart.i_data == \
+										bcds[index].o_bcd[4 * digit:4 * (digit + 1)] + ord('0'))
+
+		return m
+
+class TXFormatDemo(Elaboratable):
+	"""
+	Demo of TXFormat printing an event counter in decimal and in hex on every event
+	"""
+	def elaborate(self, platform):
+		m = Module()
+
+		i_reset = Signal(1, reset=0)
+		i_event = Signal(1, reset=0)
+		io_counter = Signal(32, reset=0)
+		m.submodules.counter = counter = Counter(i_reset, i_event, io_counter)
+
+		io_stb = Signal(1, reset=0)
+		io_busy = Signal(1, reset=0)
+		o_uart_tx = Signal(1, reset=1)
+		if platform is not None:
+			o_uart_tx = platform.request('uart').tx.o
+		m.submodules.txformat = txformat = TXFormat('evt={0:d} (0x{0:08x})\r\n', io_stb, \
+			[io_counter], io_busy, o_uart_tx)
+
+		ctr = Signal(26, reset=0)
+		m.d.sync += i_event.eq(0)
+		m.d.sync += ctr.eq(ctr + 1)
+		with m.If(ctr == 0x3FFFFFF):
+			m.d.sync += i_event.eq(1)
+		# The counter has moved on by the clock cycle after the event
+		m.d.sync += io_stb.eq(i_event & ~io_busy)
+
+		return m
+
+class MultiChannelDemo(Elaboratable):
+	"""
+	Demo of many event counters reported over one serial link: a MultiChgDetector scans the
+	counters for changes and a single TXFormat prints the number and value of each counter that
+	changed, e.g. ch07=0x00000003
+	"""
+	def __init__(self, channels=64):
+		self.channels = channels
+	def elaborate(self, platform):
+		m = Module()
+
+		CHANNEL_BITS = max(1, (self.channels - 1).bit_length())
+
+		i_reset = Signal(1, reset=0)
+		i_events = [Signal(1, name='i_event%d' % k, reset=0) for k in range(self.channels)]
+		io_counters = [Signal(32, name='io_counter%d' % k, reset=0) for k in range(self.channels)]
+		for k in range(self.channels):
+			m.submodules['counter%d' % k] = Counter(i_reset, i_events[k], io_counters[k])
+
+		io_stb = Signal(1, reset=0)
+		io_channel = Signal(CHANNEL_BITS, reset=0)
+		io_data = Signal(32, reset=0)
+		io_busy = Signal(1, reset=0)
+		m.submodules.chgdetector = chgdetector = MultiChgDetector(io_counters, io_stb, \
+			io_channel, io_data, io_busy)
+
+		o_uart_tx = Signal(1, reset=1)
+		if platform is not None:
+			o_uart_tx = platform.request('uart').tx.o
+		m.submodules.txformat = txformat = TXFormat('ch{0:d}=0x{1:08x}\r\n', io_stb, \
+			[io_channel, io_data], io_busy, o_uart_tx)
+
+		# An event on one channel after another, every 2**22 clock cycles
+		ctr = Signal(22 + CHANNEL_BITS, reset=0)
+		m.d.sync += ctr.eq(ctr + 1)
+		for k in range(self.channels):
+			m.d.sync += i_events[k].eq((ctr[:22] == 0) & (ctr[22:] == k))
+
+		return m
+
+if __name__ == "__main__":
+	"""
+	Simulation
+	"""
+	m = Module()
+
+	fmt = 'ctr=0x{0:04x},evt={1:d},bits={1:08b}\r\n'
+	i_stb = Signal(1, reset=0)
+	i_ctr = Signal(16, reset=0)
+	i_evt = Signal(8, reset=0)
+	o_busy = Signal(1, reset=0)
+	o_uart_tx = Signal(1, reset=1)
+	m.submodules.txformat = txformat = TXFormat(fmt, i_stb, [i_ctr, i_evt], o_busy, o_uart_tx)
+	sink = txformat.txuart.sink
+
+	sim = SimHarness(m, ports=txformat.ports() + [sink.valid, sink.ready, sink.data])
+
+	def process():
+		tx_msg = ""
+		expected = ""
+		for i in range(4):
+			yield i_stb.eq(1)
+			yield i_ctr.eq(0x1234 * i)
+			yield i_evt.eq(83 * i)
+			expected += format_record(fmt, [16, 8], [0x1234 * i, 83 * i])
+			yield
+			yield i_stb.eq(0)
+			# Right after a clock edge, the simulator still shows the values from before it, so
+			# the design is settled before o_busy and the handshake are read
+			yield Settle()
+			while (yield o_busy):
+				if (yield sink.valid) and (yield sink.ready):
+					tx_msg += chr((yield sink.data))
+				yield
+				yield Settle()
+		print(repr(tx_msg))
+		assert tx_msg == expected, "Sent {!r}, expected {!r}".format(tx_msg, expected)
+
+	sim.add_clock(1e-8)
+	sim.add_sync_process(process)
+
+	with sim.write_vcd('txformat.vcd', 'txformat.gtkw', traces=txformat.ports()):
+		sim.run()
+
+	"""
+	Formal Verification
+	"""
+	class TXFormatTest(FormalTestCase):
+		def test_format_program(self):
+			self.assertEqual(format_record('0x{0:08x}\n', [32], [42]), '0x0000002a\n')
+			self.assertEqual(format_record('{:d},{:b}', [8, 3], [7, 5]), '007,101')
+			self.assertEqual(format_record('{0:2x}{0:5d}', [16], [0xabcd]), 'cd43981')
+			self.assertEqual(format_record('{0:6d}', [8], [255]), '000255')
+			with self.assertRaises(ValueError):
+				format_program('{0:s}', [8])
+			with self.assertRaises(ValueError):
+				format_program('{1:x}', [8])
+		def test_txformat(self):
+			i_stb = Signal(1, reset=0)
+			i_ctr = Signal(16, reset=0)
+			i_evt = Signal(8, reset=0)
+			o_busy = Signal(1, reset=0)
+			o_uart_tx = Signal(1, reset=1)
+			txformat = TXFormat('ctr=0x{0:04x},evt={1:d},bits={1:08b}\r\n', i_stb, \
+				[i_ctr, i_evt], o_busy, o_uart_tx, fv_mode=True)
+			self.assertFormal(txformat, mode='prove', depth=4)
+	TXFormatTest().test_format_program()
+	TXFormatTest().test_txformat()
+
+	"""
+	Build
+	"""
+	VersaECP5Platform().build(TXFormatDemo(), do_program=True)
@@ -6,14 +6,19 @@ from nmigen.build import *
 from nmigen.build import ResourceError
 from nmigen.vendor.lattice_ecp5 import *
 from nmigen_boards.resources import *
-from functools import reduce
 from math import ceil, log
 
 import itertools
 import os
 import subprocess
+import sys
 
-from txuart import *
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart import *
+from simharness import *
+from proofcache import *
+from properties import *
 
 __all__ = ['MemTX', 'MemTXDemo', 'VersaECP5Platform']
 
@@ -38,9 +43,6 @@ class MemTX(Elaboratable):
 		with open('psalm.txt', 'rb') as psalm_file:
 			psalm_bytes = list(psalm_file.read())
 
-		if platform is not None and platform != 'formal':
-			self.o_uart_tx = platform.request('uart').tx.o
-		
 		ADDRESS_WIDTH = ceil(log(len(psalm_bytes), 2))
 		ram = Memory(width=8, depth=1<<ADDRESS_WIDTH, init=psalm_bytes)
 		m.submodules.rdport = rdport = ram.read_port()
@@ -51,7 +53,14 @@ class MemTX(Elaboratable):
 
 		o_wr = Signal(1, reset=0)
 		i_busy = Signal(1, reset=0)
-		m.submodules.txuart = txuart = TXUART(o_wr, i_data, i_busy, self.o_uart_tx, self.fv_mode)
+		m.submodules.txuart = txuart = TXUART(fv_mode=self.fv_mode)
+		m.d.comb += txuart.i_wr.eq(o_wr)
+		m.d.comb += txuart.i_data.eq(i_data)
+		m.d.comb += i_busy.eq(txuart.o_busy)
+		m.d.comb += self.o_uart_tx.eq(txuart.o_uart_tx)
+
+		if platform is not None and platform != 'formal':
+			m.d.comb += platform.request('uart').tx.o.eq(self.o_uart_tx)
 
 		counter = Signal(2, reset=0)
 
@@ -86,15 +95,7 @@ class MemTX(Elaboratable):
 			with m.If(self.o_busy):
 				m.d.comb += Assume(~self.i_reset)
 			# o_busy is de-asserted for at most 10 consecutive clock cycles before i_reset is asserted
-			f_past10_valid = Signal(1, reset=0)
-			f_past10_ctr = Signal(range(10), reset=0)
-			m.d.sync += f_past10_ctr.eq(f_past10_ctr + 1)
-			with m.If(f_past10_ctr == 9):
-				m.d.sync += f_past10_ctr.eq(f_past10_ctr)
-				m.d.sync += f_past10_valid.eq(1)
-			with m.If(f_past10_valid & reduce(lambda a, b: a & b, \
-				(((~Past(self.o_busy, i)) & (~Past(self.i_reset, i))) for i in range(1, 11)))):
-				m.d.comb += Assume(self.i_reset)
+			bounded_stall(m, ~self.o_busy & ~self.i_reset, 10, name='f_idle_stall')
 			# The initial data in the read port of the block RAM corresponds to address 0x0
 			with m.If(~f_past_valid):
 				m.d.comb += Assume(rdport.data == ram[0])
@@ -112,9 +113,7 @@ class MemTX(Elaboratable):
 			with m.If(f_past_valid & (~Past(i_busy)) & Past(o_wr)):
 				m.d.comb += Assume(i_busy)
 			# i_busy is asserted for at most 10 consecutive clock cycles
-			with m.If(f_past10_valid & reduce(lambda a, b: a & b, \
-				(Past(i_busy, i) for i in range(1, 11)))):
-				m.d.comb += Assume(~i_busy)
+			bounded_stall(m, i_busy, 10, name='f_busy_stall')
 
 			"""
 			Properties of o_busy
@@ -136,6 +135,8 @@ class MemTX(Elaboratable):
 			# o_addr is initially zero
 			with m.If(~f_past_valid):
 				m.d.comb += Assert(o_addr == 0)
+			# o_addr never goes past the last byte
+			m.d.comb += Assert(o_addr <= len(psalm_bytes) - 1)
 			# o_addr remains stable during transmission
 			with m.If(f_past_valid & ((Past(counter) < 2) | Past(i_busy))):
 				m.d.comb += Assert(Stable(o_addr))
@@ -172,6 +173,10 @@ class MemTX(Elaboratable):
 			"""
 			Properties of counter
 			"""
+			# Counter never goes past 2, and the transmitter can only be busy once counter gets there
+			m.d.comb += Assert(counter <= 2)
+			with m.If(counter < 2):
+				m.d.comb += Assert(~i_busy)
 			# Counter is always counting up when it is less than 2
 			with m.If(f_past_valid & (Past(counter) < 2)):
 				m.d.comb += Assert(counter == Past(counter) + 1)
@@ -238,7 +243,7 @@ if __name__ == '__main__':
 	m = Module()
 	m.submodules.memtx = memtx = MemTX()
 
-	sim = Simulator(m)
+	sim = SimHarness(m)
 
 	def process():
 		for i in range(20000):
@@ -252,9 +257,9 @@ if __name__ == '__main__':
 	"""
 	Formal Verification
 	"""
-	class MemTXTest(FHDLTestCase):
+	class MemTXTest(FormalTestCase):
 		def test_memtx(self):
-			self.assertFormal(MemTX(fv_mode=True), mode='prove', depth=18)
+			self.assertFormal(MemTX(fv_mode=True), mode='prove', depth=4)
 	MemTXTest().test_memtx()
 
 	"""
@@ -0,0 +1,39 @@
+from nmigen import *
+from nmigen.build import *
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart import *
+
+__all__ = ['RXDemo', 'VersaECP5Platform']
+
+"""
+Top-level for the RS-232 receiver, showing the last byte received on the LEDs
+See http://zipcpu.com/tutorial/lsn-09-serialrx.pdf for more details
+
+The receiver itself, along with its simulation and formal verification, lives in uart/rxuart.py
+"""
+
+class RXDemo(Elaboratable):
+	def elaborate(self, platform):
+		m = Module()
+
+		m.submodules.rxuart = rxuart = RXUART()
+		m.d.comb += rxuart.i_uart_rx.eq(platform.request('uart').rx.i)
+
+		# The LEDs are active low, and only change once a whole byte has been received
+		leds = Signal(8, reset=0)
+		with m.If(rxuart.o_stb):
+			m.d.sync += leds.eq(rxuart.o_data)
+		m.d.comb += Cat(*(platform.request('led', i).o for i in range(8))).eq(~leds)
+
+		return m
+
+if __name__ == '__main__':
+	"""
+	Build
+	"""
+	VersaECP5Platform().build(RXDemo(), do_program=True)
@@ -0,0 +1,299 @@
+from nmigen import *
+from nmigen.back.pysim import *
+from nmigen.asserts import *
+from nmigen.test.utils import *
+from functools import reduce
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart.stream import *
+from proofcache import *
+
+__all__ = ['AFIFO']
+
+"""
+Asynchronous (dual-clock) FIFO
+
+The write side (sink, i_wr, i_data, o_full, o_fill) runs in the write domain and the read side
+(source, i_rd, o_data, o_empty) runs in the read domain, with the same ports as SFIFO. Each side
+keeps its own binary address, and passes it to the other side as a registered gray code through a
+two flip-flop synchronizer. Since only one bit of a gray code changes at a time, the other side
+always sees either the old address or the new one, and since the synchronized address lags behind,
+o_full and o_empty are pessimistic: the FIFO may look full (or empty) for a few clock cycles after
+a read (or a write) on the other side, but never the other way round. For the same reason, o_fill
+is the fill level as seen from the write side
+
+The read port is addressed with the address of the next word as soon as the current one is read,
+so the read side works like SFIFO in fwft mode, i.e. o_data is valid whenever o_empty is
+de-asserted. A write only becomes visible to the read side at least two read clock cycles after it
+was made, by which time the read port has caught up with it
+
+Use DomainRenamer to map the write and read domains to the ones in the design
+"""
+
+def gray(value):
+	"""
+	Gray code of a binary number
+	"""
+	return value ^ (value >> 1)
+
+def gray_to_bin(m, value):
+	"""
+	Binary number of a gray code
+	"""
+	result = Signal(len(value))
+	for i in range(len(value)):
+		m.d.comb += result[i].eq(reduce(lambda a, b: a ^ b, value[i:]))
+	return result
+
+class AFIFO(Elaboratable):
+	def __init__(self, LGFLEN=4, width=8, w_domain='write', r_domain='read', fv_mode=False):
+		self.LGFLEN = LGFLEN
+		self.width = width
+		self.w_domain = w_domain
+		self.r_domain = r_domain
+		self.sink = Stream(width, name='sink')
+		self.source = Stream(width, name='source')
+		self.i_wr = self.sink.valid
+		self.i_data = self.sink.data
+		self.o_full = Signal(1, reset=0)
+		self.o_fill = Signal(self.LGFLEN + 1, reset=0)
+		self.i_rd = self.source.ready
+		self.o_data = self.source.data
+		self.o_empty = Signal(1, reset=1)
+		self.fv_mode = fv_mode
+	def ports(self):
+		return [
+			# Write interface
+			self.i_wr,
+			self.i_data,
+			self.o_full,
+			self.o_fill,
+			self.sink.ready,
+			self.sink.first,
+			self.sink.last,
+			# Read interface
+			self.i_rd,
+			self.o_data,
+			self.o_empty,
+			self.source.valid,
+			self.source.first,
+			self.source.last
+		]
+	def elaborate(self, platform):
+		m = Module()
+
+		w_sync = m.d[self.w_domain]
+		r_sync = m.d[self.r_domain]
+
+		# Each word in memory holds a data item along with its first and last markers
+		WIDTH = self.width + 2
+		fifo_mem = Memory(width=WIDTH, depth=1<<self.LGFLEN, init=[0]*(1<<self.LGFLEN))
+		m.submodules.rdport = rdport = fifo_mem.read_port(domain=self.r_domain, transparent=False)
+		m.submodules.wrport = wrport = fifo_mem.write_port(domain=self.w_domain)
+
+		wr_word = Signal(WIDTH)
+		rd_word = Signal(WIDTH)
+		m.d.comb += wr_word.eq(Cat(self.sink.data, self.sink.first, self.sink.last))
+		m.d.comb += Cat(self.source.data, self.source.first, self.source.last).eq(rd_word)
+
+		w_wr = Signal(1, reset=0)
+		w_rd = Signal(1, reset=0)
+		m.d.comb += w_wr.eq(self.i_wr & ~self.o_full)
+		m.d.comb += w_rd.eq(self.i_rd & self.source.valid)
+
+		# Addresses of either side, in binary and as gray codes
+		wr_addr = Signal(self.LGFLEN + 1, reset=0)
+		wr_gray = Signal(self.LGFLEN + 1, reset=0)
+		rd_addr = Signal(self.LGFLEN + 1, reset=0)
+		rd_gray = Signal(self.LGFLEN + 1, reset=0)
+
+		"""
+		Write side
+		"""
+		with m.If(w_wr):
+			w_sync += wr_addr.eq(wr_addr + 1)
+			w_sync += wr_gray.eq(gray((wr_addr + 1)[:self.LGFLEN+1]))
+
+		# Read address, synchronized into the write domain
+		rd_gray_q = Signal(self.LGFLEN + 1, reset=0)
+		rd_gray_w = Signal(self.LGFLEN + 1, reset=0)
+		w_sync += rd_gray_q.eq(rd_gray)
+		w_sync += rd_gray_w.eq(rd_gray_q)
+		rd_addr_w = gray_to_bin(m, rd_gray_w)
+
+		m.d.comb += self.o_fill.eq(wr_addr - rd_addr_w)
+		m.d.comb += self.o_full.eq(self.o_fill == (1 << self.LGFLEN))
+		m.d.comb += self.sink.ready.eq(~self.o_full)
+
+		m.d.comb += wrport.en.eq(w_wr)
+		m.d.comb += wrport.addr.eq(wr_addr)
+		m.d.comb += wrport.data.eq(wr_word)
+
+		"""
+		Read side
+		"""
+		with m.If(w_rd):
+			r_sync += rd_addr.eq(rd_addr + 1)
+			r_sync += rd_gray.eq(gray((rd_addr + 1)[:self.LGFLEN+1]))
+
+		# Write address, synchronized into the read domain
+		wr_gray_q = Signal(self.LGFLEN + 1, reset=0)
+		wr_gray_r = Signal(self.LGFLEN + 1, reset=0)
+		r_sync += wr_gray_q.eq(wr_gray)
+		r_sync += wr_gray_r.eq(wr_gray_q)
+
+		# Comparing gray codes directly saves converting the synchronized address back to binary
+		m.d.comb += self.o_empty.eq(rd_gray == wr_gray_r)
+		m.d.comb += self.source.valid.eq(~self.o_empty)
+
+		# The read port is always enabled, so that it keeps up with writes while the read side waits
+		m.d.comb += rdport.en.eq(1)
+		m.d.comb += rdport.addr.eq(rd_addr + w_rd)
+		m.d.comb += rd_word.eq(rdport.data)
+
+		if self.fv_mode:
+			"""
+			An arbitrary address, and what the memory holds under it and under the read address
+			As in SFIFO, the memory is looked at through asynchronous read ports that exist for
+			formal verification only, rather than through a copy of the whole memory
+			"""
+			f_addr = AnyConst(self.LGFLEN + 1)
+			m.submodules.f_port = f_port = fifo_mem.read_port(domain='comb')
+			m.submodules.f_head_port = f_head_port = fifo_mem.read_port(domain='comb')
+			m.d.comb += f_port.addr.eq(f_addr)
+			m.d.comb += f_head_port.addr.eq(rd_addr)
+
+			"""
+			Indicators of when Past() is valid in either domain
+			"""
+			f_wr_past_valid = Signal(1, reset=0)
+			f_rd_past_valid = Signal(1, reset=0)
+			w_sync += f_wr_past_valid.eq(1)
+			r_sync += f_rd_past_valid.eq(1)
+
+			"""
+			Addresses as seen from either side, in binary
+			"""
+			f_rd_addr_q = gray_to_bin(m, rd_gray_q)
+			f_wr_addr_q = gray_to_bin(m, wr_gray_q)
+			f_wr_addr_r = gray_to_bin(m, wr_gray_r)
+			f_fill = Signal(self.LGFLEN + 1)
+			m.d.comb += f_fill.eq(wr_addr - rd_addr)
+			# Distance from one address to another, with wrapping behavior
+			def f_distance(a, b):
+				return (a - b)[:self.LGFLEN+1]
+
+			"""
+			Properties of the gray codes
+			"""
+			# The gray codes always match the addresses they were made from
+			m.d.comb += Assert(wr_gray == gray(wr_addr))
+			m.d.comb += Assert(rd_gray == gray(rd_addr))
+
+			"""
+			Properties of the synchronizers
+			"""
+			# Each synchronized address lags behind the one before it in the synchronizer, which in
+			# turn lags behind the address it comes from
+			m.d.comb += Assert(f_distance(rd_addr, f_rd_addr_q) <= f_distance(rd_addr, rd_addr_w))
+			m.d.comb += Assert(f_fill <= f_distance(wr_addr, rd_addr_w))
+			m.d.comb += Assert(f_distance(wr_addr, f_wr_addr_q) <= f_distance(wr_addr, f_wr_addr_r))
+			m.d.comb += Assert(f_distance(f_wr_addr_r, rd_addr) <= f_fill)
+
+			"""
+			Properties of o_fill
+			"""
+			# The size of the FIFO cannot exceed the capacity of the block RAM
+			m.d.comb += Assert(f_fill <= fifo_mem.depth)
+			# The write side never sees fewer words in the FIFO than there really are
+			m.d.comb += Assert(self.o_fill >= f_fill)
+			m.d.comb += Assert(self.o_fill <= fifo_mem.depth)
+
+			"""
+			Properties of o_full and o_empty
+			"""
+			# The FIFO is never written past its capacity, nor read past its end
+			with m.If(f_fill == fifo_mem.depth):
+				m.d.comb += Assert(self.o_full)
+			with m.If(f_fill == 0):
+				m.d.comb += Assert(self.o_empty)
+
+			"""
+			Properties of wr_addr
+			"""
+			# wr_addr should be initially zero
+			with m.If(~f_wr_past_valid):
+				m.d.comb += Assert(wr_addr == 0)
+			# As of the last write clock edge, wr_addr should have incremented by 1 (with wrapping
+			# behavior) if and only if i_wr was asserted and the FIFO was not full
+			with m.If(f_wr_past_valid):
+				with m.If(Past(w_wr, domain=self.w_domain)):
+					m.d.comb += Assert(wr_addr == \
+						(Past(wr_addr, domain=self.w_domain) + 1)[:self.LGFLEN+1])
+				with m.Else():
+					m.d.comb += Assert(wr_addr == Past(wr_addr, domain=self.w_domain))
+
+			"""
+			Properties of rd_addr
+			"""
+			# rd_addr should be initially zero
+			with m.If(~f_rd_past_valid):
+				m.d.comb += Assert(rd_addr == 0)
+			# As of the last read clock edge, rd_addr should have incremented by 1 (with wrapping
+			# behavior) if and only if i_rd and source.valid were asserted
+			with m.If(f_rd_past_valid):
+				with m.If(Past(w_rd, domain=self.r_domain)):
+					m.d.comb += Assert(rd_addr == \
+						(Past(rd_addr, domain=self.r_domain) + 1)[:self.LGFLEN+1])
+				with m.Else():
+					m.d.comb += Assert(rd_addr == Past(rd_addr, domain=self.r_domain))
+
+			"""
+			Properties of o_data
+			"""
+			# Whenever source.valid is asserted, it contains the word at the head of the FIFO
+			with m.If(self.source.valid):
+				m.d.comb += Assert(rd_word == f_head_port.data)
+
+			"""
+			Properties of source
+			"""
+			stream_protocol(m, self.source, f_rd_past_valid, domain=self.r_domain)
+
+			"""
+			FIFO contract
+			Whenever we write an arbitrary value to an arbitrary address, we read that same value back
+			when we get to that address
+			"""
+			f_data = AnyConst(WIDTH)
+			# Whether the last word written to f_addr was f_data
+			f_written = Signal(1, reset=0)
+			with m.If(w_wr & (wr_addr == f_addr)):
+				w_sync += f_written.eq(wr_word == f_data)
+			# While f_addr is in the FIFO, it holds f_data if that is what was written to it
+			with m.If((f_distance(f_addr, rd_addr) < f_fill) & f_written):
+				m.d.comb += Assert(f_port.data == f_data)
+			# Reading from f_addr gives back f_data
+			with m.If(w_rd & (rd_addr == f_addr) & f_written):
+				m.d.comb += Assert(rd_word == f_data)
+
+		return m
+
+if __name__ == '__main__':
+	"""
+	Formal Verification
+	"""
+	class AFIFOTest(FormalTestCase):
+		def test_afifo(self):
+			# Without resets, both sides start out empty together, and neither can be reset on
+			# its own, which would throw the addresses seen by the other side off
+			m = Module()
+			m.domains.write = ClockDomain('write', reset_less=True)
+			m.domains.read = ClockDomain('read', reset_less=True)
+			m.submodules.afifo = AFIFO(LGFLEN=3, fv_mode=True)
+			self.assertFormal(m, mode='prove', depth=20, multiclock=True)
+	AFIFOTest().test_afifo()
@@ -11,9 +11,11 @@ from functools import reduce
 import itertools
 import os
 import subprocess
+import sys
 
-from txuart import *
-from rxuart import *
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart import *
 from sfifo import *
 
 __all__ = ['LineTest', 'VersaECP5Platform']
@@ -21,49 +23,67 @@ __all__ = ['LineTest', 'VersaECP5Platform']
 """
 Line capturer using a FIFO
 See http://zipcpu.com/tutorial/lsn-10-fifo.pdf for more details
+
+The receiver and the transmitter share one divisor register, which starts out at baud_rate and is
+loaded from i_setup whenever i_setup_wr is asserted, so that a design embedding LineTest can switch
+both sides to a different baud rate without rebuilding
 """
 
 class LineTest(Elaboratable):
+	def __init__(self, baud_rate=115200, parity=None):
+		self.baud_rate = baud_rate
+		self.parity = parity
+		self.i_setup = Signal(SETUP_WIDTH, reset=0)
+		self.i_setup_wr = Signal(1, reset=0)
+	def ports(self):
+		return [
+			self.i_setup,
+			self.i_setup_wr
+		]
 	def elaborate(self, platform):
 		m = Module()
 
-		state = Signal(1, reset=0)
-		counter = Signal(2, reset=0)
+		# Divisor register shared by the receiver and the transmitter, so that both sides always
+		# run at the same baud rate
+		setup = Signal(SETUP_WIDTH, reset=baud_setup(platform.default_clk_frequency, self.baud_rate))
+		with m.If(self.i_setup_wr):
+			m.d.sync += setup.eq(self.i_setup)
 
-		m.submodules.rxuart = rxuart = RXUART()
-		m.submodules.sfifo = sfifo = SFIFO()
-		m.submodules.txuart = txuart = TXUART()
+		m.submodules.rxuart = rxuart = RXUART(i_setup=setup, parity=self.parity)
+		m.submodules.sfifo = sfifo = SFIFO(almost_full=79, fwft=True)
+		m.submodules.txuart = txuart = TXUART(i_setup=setup, parity=self.parity)
 		uart = platform.request('uart')
-		rxuart.i_uart_rx = uart.rx.i
-		txuart.o_uart_tx = uart.tx.o
+		m.d.comb += rxuart.i_uart_rx.eq(uart.rx.i)
+		m.d.comb += uart.tx.o.eq(txuart.o_uart_tx)
+
+		# The receiver only strobes o_stb for good frames, so bad ones never make it into the FIFO.
+		# LEDs 0 to 2 light up once a framing error, a parity error or a break has been seen
+		# (the LEDs are active low)
+		for i, errs in enumerate((rxuart.o_frame_errs, rxuart.o_parity_errs, rxuart.o_breaks)):
+			m.d.comb += platform.request('led', i).o.eq(errs == 0)
 
-		m.d.comb += sfifo.i_data.eq(rxuart.o_data)
-		m.d.comb += sfifo.i_wr.eq(rxuart.o_stb & (sfifo.o_fill < 80) & (state == 0))
-		m.d.comb += txuart.i_data.eq(sfifo.o_data)
+		# Received bytes are marked as the last one of the line when they are a newline or when they
+		# fill the 80-byte line buffer up, so the FIFO itself records where each line ends
+		m.d.comb += sfifo.sink.data.eq(rxuart.source.data)
+		m.d.comb += sfifo.sink.last.eq((rxuart.source.data == ord('\n')) | sfifo.o_almost_full)
 
 		with m.FSM():
 			with m.State('IDLE'):
 				m.next = 'IDLE'
-				with m.If(rxuart.o_stb & ((rxuart.o_data == ord('\n')) | (sfifo.o_fill >= 79))):
+				m.d.comb += sfifo.sink.valid.eq(rxuart.source.valid)
+				m.d.comb += rxuart.source.ready.eq(sfifo.sink.ready)
+				with m.If(sfifo.sink.valid & sfifo.sink.ready & sfifo.sink.last):
 					m.next = 'PRINTLN'
-					m.d.sync += state.eq(1)
 			with m.State('PRINTLN'):
 				m.next = 'PRINTLN'
-				with m.If((counter == 0) & ~sfifo.o_empty):
-					m.d.sync += sfifo.i_rd.eq(1)
-					m.d.sync += counter.eq(1)
-				with m.If(counter == 1):
-					m.d.sync += sfifo.i_rd.eq(0)
-					m.d.sync += txuart.i_wr.eq(1)
-					m.d.sync += counter.eq(2)
-				with m.If(counter == 2):
-					m.d.sync += txuart.i_wr.eq(0)
-					m.d.sync += counter.eq(3)
-				with m.If((counter == 3) & ~txuart.o_busy):
-					m.d.sync += counter.eq(0)
-				with m.If((counter == 0) & sfifo.o_empty):
+				# Bytes go straight from the FIFO to the transmitter, which takes the next one while
+				# the current one is still being sent, so the line is printed without any gaps. The
+				# receiver holds on to the first byte typed meanwhile and counts the rest as overruns
+				m.d.comb += txuart.sink.data.eq(sfifo.source.data)
+				m.d.comb += txuart.sink.valid.eq(sfifo.source.valid)
+				m.d.comb += sfifo.source.ready.eq(txuart.sink.ready)
+				with m.If(sfifo.source.valid & sfifo.source.ready & sfifo.source.last):
 					m.next = 'IDLE'
-					m.d.sync += state.eq(0)
 
 		return m
 
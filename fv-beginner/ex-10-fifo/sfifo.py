@@ -6,29 +6,73 @@ from nmigen.build import *
 from nmigen.build import ResourceError
 from nmigen.vendor.lattice_ecp5 import *
 from nmigen_boards.resources import *
-from functools import reduce
 
 import itertools
 import os
 import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uart.stream import *
+from proofcache import *
+from properties import *
 
 __all__ = ['SFIFO']
 
 """
 Synchronous FIFO
 See http://zipcpu.com/tutorial/lsn-10-fifo.pdf for more details
+
+Data comes in through the sink stream and goes out through the source stream, along with the
+first and last markers. i_wr, i_data, i_rd and o_data are aliases of the stream fields, while
+o_full and o_empty are kept as separate outputs. A byte is read whenever i_rd is asserted while
+o_empty is de-asserted, and o_data shows it on the next clock cycle, when source.valid is asserted
+for one clock cycle. In this mode, source is not a stream (nothing waits for source.ready), and
+i_rd is a read request rather than an acknowledgement
+
+In first-word-fall-through (fwft) mode, the read port is addressed with the address of the next
+byte as soon as the current one is read, so the output register of the read port acts as a skid
+register that always holds the head of the FIFO. source is then a stream, and o_empty is the
+inverse of source.valid, i.e. o_data is valid whenever o_empty is de-asserted, which allows a byte
+to be read on every clock cycle. The only time source.valid is held off is for one clock cycle
+after a write to the address the read port is reading from, e.g. into an empty FIFO. o_fill still
+counts every byte in the FIFO, including one that was written into an empty FIFO on the previous
+clock cycle and is not yet in the skid register
+
+o_almost_full is asserted whenever there are at least almost_full bytes in the FIFO, and
+o_almost_empty whenever there are at most almost_empty bytes in it. Both flags are registered and
+computed from the fill level of the next clock cycle, so producers and consumers can throttle
+without comparing o_fill themselves
 """
 
 class SFIFO(Elaboratable):
-	def __init__(self, LGFLEN=10, fv_mode=False):
+	def __init__(self, LGFLEN=10, width=8, almost_full=None, almost_empty=1, fwft=False,
+		fv_mode=False):
+		if almost_full is None:
+			almost_full = (1 << LGFLEN) - 1
+		if not 1 <= almost_full <= (1 << LGFLEN):
+			raise ValueError("almost_full must be between 1 and %d, not %r" % \
+				(1 << LGFLEN, almost_full))
+		if not 0 <= almost_empty < (1 << LGFLEN):
+			raise ValueError("almost_empty must be between 0 and %d, not %r" % \
+				((1 << LGFLEN) - 1, almost_empty))
 		self.LGFLEN = LGFLEN
-		self.i_wr = Signal(1, reset=0)
-		self.i_data = Signal(8, reset=0)
+		self.width = width
+		self.almost_full = almost_full
+		self.almost_empty = almost_empty
+		self.fwft = fwft
+		self.sink = Stream(width, name='sink')
+		self.source = Stream(width, name='source')
+		self.i_wr = self.sink.valid
+		self.i_data = self.sink.data
 		self.o_full = Signal(1, reset=0)
 		self.o_fill = Signal(self.LGFLEN + 1, reset=0)
-		self.i_rd = Signal(1, reset=0)
-		self.o_data = Signal(8, reset=0)
+		self.i_rd = self.source.ready
+		self.o_data = self.source.data
 		self.o_empty = Signal(1, reset=1)
+		self.o_almost_full = Signal(1, reset=0)
+		self.o_almost_empty = Signal(1, reset=1)
 		self.fv_mode = fv_mode
 	def ports(self):
 		return [
@@ -37,18 +81,37 @@ class SFIFO(Elaboratable):
 			self.i_data,
 			self.o_full,
 			self.o_fill,
+			self.o_almost_full,
+			self.sink.ready,
+			self.sink.first,
+			self.sink.last,
 			# Read interface
 			self.i_rd,
 			self.o_data,
-			self.o_empty
+			self.o_empty,
+			self.o_almost_empty,
+			self.source.valid,
+			self.source.first,
+			self.source.last
 		]
 	def elaborate(self, platform):
 		m = Module()
 
-		fifo_mem = Memory(width=8, depth=1<<self.LGFLEN, init=[0]*(1<<self.LGFLEN))
+		# Each word in memory holds a data item along with its first and last markers
+		WIDTH = self.width + 2
+		fifo_mem = Memory(width=WIDTH, depth=1<<self.LGFLEN, init=[0]*(1<<self.LGFLEN))
 		m.submodules.rdport = rdport = fifo_mem.read_port()
 		m.submodules.wrport = wrport = fifo_mem.write_port()
 
+		wr_word = Signal(WIDTH)
+		rd_word = Signal(WIDTH)
+		m.d.comb += wr_word.eq(Cat(self.sink.data, self.sink.first, self.sink.last))
+		m.d.comb += Cat(self.source.data, self.source.first, self.source.last).eq(rd_word)
+
+		# Whether the read port is yet to catch up with a write to the address it is reading from
+		stale = Signal(1, reset=0)
+		nonempty = Signal(1, reset=0)
+
 		w_wr = Signal(1, reset=0)
 		w_rd = Signal(1, reset=0)
 		m.d.comb += w_wr.eq(self.i_wr & ~self.o_full)
@@ -58,27 +121,57 @@ class SFIFO(Elaboratable):
 		rd_addr = Signal(self.LGFLEN + 1, reset=0)
 		m.d.comb += self.o_fill.eq(wr_addr - rd_addr)
 		m.d.comb += self.o_full.eq(self.o_fill == (1 << self.LGFLEN))
-		m.d.comb += self.o_data.eq(rdport.data)
-		m.d.comb += self.o_empty.eq(self.o_fill == 0)
+		m.d.comb += nonempty.eq(self.o_fill != 0)
+		m.d.comb += self.sink.ready.eq(~self.o_full)
+
+		# Fill level in the next clock cycle, from which the almost full and almost empty flags are
+		# registered
+		fill_next = Signal(self.LGFLEN + 1)
+		m.d.comb += fill_next.eq(self.o_fill + w_wr - w_rd)
+		m.d.sync += self.o_almost_full.eq(fill_next >= self.almost_full)
+		m.d.sync += self.o_almost_empty.eq(fill_next <= self.almost_empty)
+		if self.fwft:
+			m.d.comb += self.source.valid.eq(nonempty & ~stale)
+			m.d.comb += self.o_empty.eq(~self.source.valid)
+		else:
+			m.d.sync += self.source.valid.eq(w_rd)
+			m.d.comb += self.o_empty.eq(~nonempty)
 
 		m.d.comb += wrport.en.eq(w_wr)
 		m.d.comb += wrport.addr.eq(wr_addr)
-		m.d.comb += wrport.data.eq(self.i_data)
+		m.d.comb += wrport.data.eq(wr_word)
 		with m.If(w_wr):
 			m.d.sync += wr_addr.eq(wr_addr + 1)
 
-		m.d.comb += rdport.addr.eq(rd_addr)
-		m.d.comb += self.o_data.eq(rdport.data)
+		m.d.comb += rd_word.eq(rdport.data)
 		with m.If(w_rd):
 			m.d.sync += rd_addr.eq(rd_addr + 1)
+		if self.fwft:
+			# Look ahead to the next byte on a read; the only byte the read port can miss is one
+			# written to the very address it is reading from
+			m.d.comb += rdport.addr.eq(rd_addr + w_rd)
+			m.d.sync += stale.eq(w_wr & (wrport.addr == rdport.addr))
+		else:
+			m.d.comb += rdport.addr.eq(rd_addr)
 
 		if self.fv_mode:
 			"""
-			Tie array of past values with fifo_mem for formal verification
+			Two arbitrary consecutive addresses, and what the memory holds under them
+			Rather than keeping a copy of the whole memory, only these two words are looked at, through
+			asynchronous read ports that exist for formal verification only. Since the addresses are
+			arbitrary, whatever is proven for them holds for every address, and the size of the proof
+			does not grow with the size of the memory
 			"""
-			f_past_fifo_mem = Array(Signal(8, reset=0) for i in range(fifo_mem.depth))
-			for i in range(fifo_mem.depth):
-				m.d.sync += f_past_fifo_mem[i].eq(fifo_mem[i])
+			f_first_addr = AnyConst(self.LGFLEN + 1)
+			f_second_addr = AnyConst(self.LGFLEN + 1)
+			m.d.comb += Assume(f_second_addr == (f_first_addr + 1)[:self.LGFLEN+1])
+			m.submodules.f_first_port = f_first_port = fifo_mem.read_port(domain='comb')
+			m.submodules.f_second_port = f_second_port = fifo_mem.read_port(domain='comb')
+			m.d.comb += f_first_port.addr.eq(f_first_addr)
+			m.d.comb += f_second_port.addr.eq(f_second_addr)
+			# As well as the word at the head of the FIFO
+			m.submodules.f_head_port = f_head_port = fifo_mem.read_port(domain='comb')
+			m.d.comb += f_head_port.addr.eq(rd_addr)
 
 			"""
 			Indicator of when Past() is valid
@@ -90,39 +183,9 @@ class SFIFO(Elaboratable):
 			Assumptions on input pins
 			"""
 			# i_wr is never de-asserted for more than 10 consecutive clock cycles
-			f_past10_valid = Signal(1, reset=0)
-			f_past10_ctr = Signal(range(10), reset=0)
-			m.d.sync += f_past10_ctr.eq(f_past10_ctr + 1)
-			with m.If(f_past10_ctr == 9):
-				m.d.sync += f_past10_ctr.eq(f_past10_ctr)
-				m.d.sync += f_past10_valid.eq(1)
-			with m.If(f_past10_valid & reduce(lambda a, b: a & b, \
-				((~Past(self.i_wr, i)) for i in range(1, 11)))):
-				m.d.comb += Assume(self.i_wr)
+			bounded_stall(m, ~self.i_wr, 10, name='f_wr_stall')
 			# i_rd is never de-asserted for more than 10 consecutive clock cycles
-			with m.If(f_past10_valid & reduce(lambda a, b: a & b, \
-				((~Past(self.i_rd, i)) for i in range(1, 11)))):
-				m.d.comb += Assume(self.i_rd)
-
-			"""
-			Assumptions on memory
-			"""
-			# For the read port, given an address in this clock cycle, rdport.data contains the byte
-			# under this address in the next clock cycle
-			with m.If(f_past_valid):
-				m.d.comb += Assume(rdport.data == f_past_fifo_mem[Past(rdport.addr)])
-			# For the write port, given an address in this clock cycle, the given data is written to
-			# the specified address in memory in the next clock cycle if write enable is asserted, and
-			# the memory remains constant otherwise
-			with m.If(f_past_valid):
-				with m.If(Past(wrport.en)):
-					for i in range(fifo_mem.depth):
-						m.d.comb += Assume(Mux(i == Past(wrport.addr), \
-							fifo_mem[i] == Past(wrport.data), \
-							fifo_mem[i] == f_past_fifo_mem[i]))
-				with m.Else():
-					for i in range(fifo_mem.depth):
-						m.d.comb += Assume(fifo_mem[i] == f_past_fifo_mem[i])
+			bounded_stall(m, ~self.i_rd, 10, name='f_rd_stall')
 
 			"""
 			Properties of o_full
@@ -142,20 +205,53 @@ class SFIFO(Elaboratable):
 			"""
 			Properties of o_data
 			"""
-			# o_data should always contain the byte under rd_addr (with the MSB discarded) from the
-			# previous clock cycle
-			with m.If(f_past_valid):
-				m.d.comb += Assert(self.o_data == f_past_fifo_mem[Past(rd_addr)[:self.LGFLEN]])
-			# Therefore, when i_rd is asserted and the FIFO is nonempty, o_data should contain the byte
-			# under rd_addr (with the MSB discarded) in the next clock cycle
-			with m.If(f_past_valid & Past(self.i_rd) & ~Past(self.o_empty)):
-				m.d.comb += Assert(self.o_data == f_past_fifo_mem[Past(rd_addr)[:self.LGFLEN]])
+			# This ties the read port to the memory, which the FIFO contract below only does for the
+			# two arbitrary addresses
+			if self.fwft:
+				# Whenever source.valid is asserted, o_data (along with the first and last markers)
+				# contains the word at the head of the FIFO
+				with m.If(self.source.valid):
+					m.d.comb += Assert(rd_word == f_head_port.data)
+			else:
+				# On the clock cycle after a read, o_data contains the word that was read
+				with m.If(f_past_valid & Past(w_rd)):
+					m.d.comb += Assert(rd_word == Past(f_head_port.data))
+
+			"""
+			Properties of source
+			"""
+			if self.fwft:
+				stream_protocol(m, self.source, f_past_valid)
+				# source.valid is asserted whenever the FIFO is nonempty, except for one clock cycle
+				# after a write to the address the read port was reading from
+				with m.If(f_past_valid & nonempty & \
+					~(Past(w_wr) & (Past(wrport.addr) == Past(rdport.addr)))):
+					m.d.comb += Assert(self.source.valid)
+				with m.If(~nonempty):
+					m.d.comb += Assert(~self.source.valid)
+			else:
+				# source.valid is asserted precisely on the clock cycle after a read
+				with m.If(~f_past_valid):
+					m.d.comb += Assert(~self.source.valid)
+				with m.Else():
+					m.d.comb += Assert(self.source.valid == Past(w_rd))
+
+			"""
+			Properties of o_almost_full and o_almost_empty
+			"""
+			# Even though they are registered, both flags always agree with the current fill level
+			m.d.comb += Assert(self.o_almost_full == (self.o_fill >= self.almost_full))
+			m.d.comb += Assert(self.o_almost_empty == (self.o_fill <= self.almost_empty))
 
 			"""
 			Properties of o_empty
 			"""
-			# The FIFO is empty precisely when none of the block RAM is occupied
-			m.d.comb += Assert(self.o_empty == (self.o_fill == 0))
+			if self.fwft:
+				# In fwft mode, the FIFO is empty precisely when there is no valid byte at its head
+				m.d.comb += Assert(self.o_empty == ~self.source.valid)
+			else:
+				# The FIFO is empty precisely when none of the block RAM is occupied
+				m.d.comb += Assert(self.o_empty == (self.o_fill == 0))
 
 			"""
 			Properties of w_wr
@@ -166,7 +262,7 @@ class SFIFO(Elaboratable):
 			"""
 			Properties of w_rd
 			"""
-			# w_rd should be asserted precisely when i_rd is asserted and the FIFO is nonempty
+			# w_rd should be asserted precisely when i_rd is asserted and the FIFO is not empty
 			m.d.comb += Assert(w_rd == (self.i_rd & ~self.o_empty))
 
 			"""
@@ -190,7 +286,7 @@ class SFIFO(Elaboratable):
 			with m.If(~f_past_valid):
 				m.d.comb += Assert(rd_addr == 0)
 			# rd_addr should increment by 1 (with wrapping behavior) if and only if i_rd is asserted
-			# and the FIFO is nonempty
+			# and the FIFO is not empty
 			with m.If(f_past_valid):
 				with m.If(Past(self.i_rd) & ~Past(self.o_empty)):
 					m.d.comb += Assert(rd_addr == (Past(rd_addr) + 1)[:self.LGFLEN+1])
@@ -202,13 +298,9 @@ class SFIFO(Elaboratable):
 			Whenever we write two arbitrary values to it in succession, we can always read those same
 			values back later
 			"""
-			# Two arbitrary consecutive addresses
-			f_first_addr = AnyConst(self.LGFLEN + 1)
-			f_second_addr = AnyConst(self.LGFLEN + 1)
-			m.d.comb += Assume(f_second_addr == (f_first_addr + 1)[:self.LGFLEN+1])
-			# Two arbitrary data values
-			f_first_data = AnyConst(8)
-			f_second_data = AnyConst(8)
+			# Two arbitrary words
+			f_first_data = AnyConst(WIDTH)
+			f_second_data = AnyConst(WIDTH)
 			# Distance to read address
 			f_distance_to_first = Signal(self.LGFLEN + 1, reset=0)
 			f_distance_to_second = Signal(self.LGFLEN + 1, reset=0)
@@ -217,45 +309,61 @@ class SFIFO(Elaboratable):
 			# Determine whether f_{first,second}_addr is within the active address of the FIFO
 			f_first_addr_in_fifo = Signal(1, reset=0)
 			f_second_addr_in_fifo = Signal(1, reset=0)
-			with m.If((~self.o_empty) & (f_distance_to_first < self.o_fill)):
+			with m.If(nonempty & (f_distance_to_first < self.o_fill)):
 				m.d.comb += f_first_addr_in_fifo.eq(1)
 			with m.Else():
 				m.d.comb += f_first_addr_in_fifo.eq(0)
-			with m.If((~self.o_empty) & (f_distance_to_second < self.o_fill)):
+			with m.If(nonempty & (f_distance_to_second < self.o_fill)):
 				m.d.comb += f_second_addr_in_fifo.eq(1)
 			with m.Else():
 				m.d.comb += f_second_addr_in_fifo.eq(0)
+			# Checks that a read on this clock cycle gives back word, which o_data shows on the same
+			# clock cycle in fwft mode, and on the next one otherwise
+			f_rd_check = Signal(1, reset=0)
+			f_rd_expected = Signal(WIDTH, reset=0)
+			m.d.sync += f_rd_check.eq(0)
+			with m.If(f_rd_check):
+				m.d.comb += Assert(rd_word == f_rd_expected)
+			def f_assert_read(word):
+				if self.fwft:
+					m.d.comb += Assert(rd_word == word)
+				else:
+					m.d.sync += f_rd_check.eq(1)
+					m.d.sync += f_rd_expected.eq(word)
 			# State machine, for formal purposes only
 			with m.FSM():
 				with m.State('IDLE'):
 					m.next = 'IDLE'
-					with m.If(w_wr & (wr_addr == f_first_addr) & (self.i_data == f_first_data)):
+					with m.If(w_wr & (wr_addr == f_first_addr) & (wr_word == f_first_data)):
 						m.next = 'WRITE1'
 				with m.State('WRITE1'):
 					m.next = 'WRITE1'
 					m.d.comb += Assert(f_first_addr_in_fifo)
-					m.d.comb += Assert(fifo_mem[f_first_addr[:self.LGFLEN]] == f_first_data)
+					m.d.comb += Assert(f_first_port.data == f_first_data)
 					m.d.comb += Assert(wr_addr == f_second_addr)
 					with m.If(w_rd & (rd_addr == f_first_addr)):
 						m.next = 'IDLE'
 					with m.Elif(w_wr):
-						with m.If(self.i_data == f_second_data):
+						with m.If(wr_word == f_second_data):
 							m.next = 'WRITE2'
 						with m.Else():
 							m.next = 'IDLE'
 				with m.State('WRITE2'):
 					m.next = 'WRITE2'
 					m.d.comb += Assert(f_first_addr_in_fifo)
-					m.d.comb += Assert(fifo_mem[f_first_addr[:self.LGFLEN]] == f_first_data)
+					m.d.comb += Assert(f_first_port.data == f_first_data)
 					m.d.comb += Assert(f_second_addr_in_fifo)
-					m.d.comb += Assert(fifo_mem[f_second_addr[:self.LGFLEN]] == f_second_data)
-					with m.If(self.i_rd & (rd_addr == f_first_addr)):
+					m.d.comb += Assert(f_second_port.data == f_second_data)
+					with m.If(w_rd & (rd_addr == f_first_addr)):
+						f_assert_read(f_first_data)
 						m.next = 'READ1'
 				with m.State('READ1'):
 					m.next = 'READ1'
 					m.d.comb += Assert(f_second_addr_in_fifo)
-					m.d.comb += Assert(fifo_mem[f_second_addr[:self.LGFLEN]] == f_second_data)
-					with m.If(self.i_rd):
+					m.d.comb += Assert(f_second_port.data == f_second_data)
+					m.d.comb += Assert(rd_addr == f_second_addr)
+					with m.If(w_rd):
+						f_assert_read(f_second_data)
 						m.next = 'IDLE'
 
 		return m
@@ -264,7 +372,11 @@ if __name__ == '__main__':
 	"""
 	Formal Verification
 	"""
-	class SFIFOTest(FHDLTestCase):
+	class SFIFOTest(FormalTestCase):
 		def test_sfifo(self):
-			self.assertFormal(SFIFO(LGFLEN=4, fv_mode=True), mode='prove')
-	SFIFOTest().test_sfifo()
\ No newline at end of file
+			self.assertFormal(SFIFO(LGFLEN=10, fv_mode=True), mode='prove')
+		def test_sfifo_fwft(self):
+			self.assertFormal(SFIFO(LGFLEN=10, width=5, almost_full=1000, almost_empty=3, fwft=True,
+				fv_mode=True), mode='prove')
+	SFIFOTest().test_sfifo()
+	SFIFOTest().test_sfifo_fwft()
\ No newline at end of file
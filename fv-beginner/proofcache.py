@@ -0,0 +1,237 @@
+from nmigen import *
+from nmigen.back import rtlil
+from nmigen.test.utils import *
+
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import time
+import traceback
+
+__all__ = ['FormalTestCase', 'ProofCache', 'PORTFOLIO', 'ENGINE_MODES']
+
+"""
+Cache of formal verification results
+
+FormalTestCase is a drop-in replacement for FHDLTestCase, whose assertFormal only runs SymbiYosys
+when the same proof has not been run before. Proofs are identified by a hash of the whole sby
+configuration, i.e. the RTLIL of the elaborated design along with the mode, depth and engines,
+and of the yosys version, so changing anything that can change the result of a proof (down to the
+line numbers in the src attributes of the RTLIL) runs it again, while re-running a file after
+changing another module does not re-prove anything that module is not part of
+
+Both passes and failures are cached (but not errors or timeouts, which may not happen again). A
+cached failure fails the test with the original output of sby, along with the counterexample
+traces, which are kept in the cache
+
+The cache lives in fv-beginner/proof_cache, or wherever the PROOF_CACHE environment variable
+points to, and PROOF_CACHE=off turns it off. Entries are never evicted, so the directory can be
+deleted at any time
+
+Engine portfolio
+Which solver proves a design fastest varies a lot from design to design. With engines='portfolio'
+(or FORMAL_ENGINES=portfolio in the environment, for every assertFormal that does not pick its
+engines), all the engines in PORTFOLIO for the mode are started at the same time, and sby stops as
+soon as one of them returns PASS or FAIL. The engine that won is recorded in the cache directory,
+and the next run of the same proof starts with that engine alone, only falling back to the whole
+portfolio if it does not reach a conclusion. A portfolio result is cached independently of which
+engine won it
+"""
+
+_DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'proof_cache')
+
+ENGINE_MODES = ('default', 'portfolio')
+
+# Engines raced against each other in portfolio mode. abc pdr does not need a depth to prove
+# a design, but cannot do BMC
+PORTFOLIO = {
+	'prove': ['smtbmc yices', 'smtbmc boolector', 'smtbmc z3', 'abc pdr'],
+	'bmc': ['smtbmc yices', 'smtbmc boolector', 'smtbmc z3', 'abc bmc3'],
+	'cover': ['smtbmc yices', 'smtbmc boolector', 'smtbmc z3']
+}
+
+# Return codes of sby for the results worth caching
+_STATUS = {0: 'PASS', 2: 'FAIL'}
+
+_yosys_version = None
+
+def _tool_version():
+	global _yosys_version
+	if _yosys_version is None:
+		try:
+			_yosys_version = subprocess.run(['yosys', '-V'], stdout=subprocess.PIPE, \
+				universal_newlines=True).stdout.strip()
+		except FileNotFoundError:
+			_yosys_version = ''
+	return _yosys_version
+
+class ProofCache:
+	"""
+	Results of sby runs, keyed by a hash of their configuration
+	"""
+	def __init__(self, directory=None):
+		if directory is None:
+			directory = os.environ.get('PROOF_CACHE', _DEFAULT_DIR)
+		self.directory = None if directory == 'off' else directory
+	def key(self, config):
+		return hashlib.sha256('{}\n{}'.format(_tool_version(), config).encode('utf-8')).hexdigest()
+	def _path(self, key):
+		return os.path.join(self.directory, key[:2], key)
+	def get(self, key):
+		"""
+		Cached result for key, or None. The result is a dict with status ('PASS' or 'FAIL'), the
+		output of sby, and traces, the paths to the counterexample traces
+		"""
+		if self.directory is None:
+			return None
+		path = self._path(key)
+		try:
+			with open(os.path.join(path, 'result.json')) as f:
+				result = json.load(f)
+		except FileNotFoundError:
+			return None
+		result['traces'] = [os.path.join(path, trace) for trace in result['traces']]
+		return result
+	def put(self, key, status, output, work_dir, elapsed):
+		"""
+		Caches the result of the sby run in work_dir, along with its counterexample traces
+		"""
+		if self.directory is None:
+			return
+		os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+		# Entries are written to a temporary directory first, so that several proofs running at
+		# the same time never see a partial entry
+		staging = tempfile.mkdtemp(dir=os.path.dirname(self._path(key)))
+		traces = []
+		for trace in sorted(glob.glob(os.path.join(work_dir, '**', 'trace*.vcd'), recursive=True)):
+			name = os.path.relpath(trace, work_dir).replace(os.sep, '_')
+			shutil.copy(trace, os.path.join(staging, name))
+			traces.append(name)
+		with open(os.path.join(staging, 'result.json'), 'w') as f:
+			json.dump({'status': status, 'output': output, 'traces': traces, 'time': elapsed}, f)
+		try:
+			os.rename(staging, self._path(key))
+		except OSError:
+			# Another process cached the same proof in the meantime
+			shutil.rmtree(staging)
+
+	def _winners_file(self):
+		return os.path.join(self.directory, 'winners.json')
+	def winners(self):
+		"""
+		Engines that won the portfolio for each proof so far
+		"""
+		if self.directory is None:
+			return {}
+		try:
+			with open(self._winners_file()) as f:
+				return json.load(f)
+		except FileNotFoundError:
+			return {}
+	def record_winner(self, proof, engine):
+		if self.directory is None:
+			return
+		winners = self.winners()
+		winners[proof] = engine
+		os.makedirs(self.directory, exist_ok=True)
+		fd, staging = tempfile.mkstemp(dir=self.directory)
+		with os.fdopen(fd, 'w') as f:
+			json.dump(winners, f, indent=1, sort_keys=True)
+		os.replace(staging, self._winners_file())
+
+def _winner(output):
+	"""
+	Engine that reached the conclusion in the output of sby, if any
+	"""
+	match = re.search(r'summary: engine_\d+ \((.+?)\) returned (pass|fail)', output, re.IGNORECASE)
+	return match.group(1) if match else None
+
+def _run_sby(spec_dir, spec_name, config):
+	"""
+	Runs sby on config in spec_dir/spec_name, and returns the status and the output
+	"""
+	work_dir = os.path.join(spec_dir, spec_name)
+	if os.path.exists(work_dir):
+		shutil.rmtree(work_dir)
+	with subprocess.Popen(['sby', '-f', '-d', spec_name], cwd=spec_dir,
+		universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE) as proc:
+		stdout, stderr = proc.communicate(config)
+	return _STATUS.get(proc.returncode, 'ERROR'), stdout
+
+class FormalTestCase(FHDLTestCase):
+	def assertFormal(self, spec, mode='bmc', depth=1, engines=None, multiclock=False):
+		"""
+		Same as FHDLTestCase.assertFormal, with the result cached in a ProofCache. engines are the
+		lines of the [engines] section, or 'portfolio' to race the engines in PORTFOLIO, and
+		multiclock tells yosys that the design has more than one clock, so that they tick
+		independently of each other
+		"""
+		caller, *_ = traceback.extract_stack(limit=2)
+		spec_root, _ = os.path.splitext(os.path.abspath(caller.filename))
+		spec_dir = os.path.dirname(spec_root)
+		spec_name = '{}_{}'.format(os.path.basename(spec_root), caller.name.replace('test_', ''))
+
+		if engines is None:
+			engines = os.environ.get('FORMAL_ENGINES', 'default')
+			if engines not in ENGINE_MODES:
+				raise ValueError("Unknown engine mode {!r}; expected one of {}".format(engines, \
+					', '.join(ENGINE_MODES)))
+			if engines == 'default':
+				engines = 'smtbmc'
+
+		template = textwrap.dedent("""\
+		[options]
+		mode {mode}
+		depth {depth}
+		{multiclock}
+		{wait}
+
+		[engines]
+		{engines}
+
+		[script]
+		read_ilang top.il
+		prep
+
+		[file top.il]
+		{rtlil}
+		""")
+		def config(engines, wait=True):
+			# Without wait, sby stops at the first engine to reach a conclusion
+			return template.format(mode=mode, depth=depth, \
+				multiclock='multiclock on' if multiclock else '', wait='wait on' if wait else '', \
+				engines=engines, rtlil=text)
+		text = rtlil.convert(Fragment.get(spec, platform='formal'))
+
+		cache = ProofCache()
+		key = cache.key(config(engines))
+		result = cache.get(key)
+		if result is None:
+			start = time.perf_counter()
+			if engines == 'portfolio':
+				proof = '{}:{}'.format(spec_name, mode)
+				winner = cache.winners().get(proof)
+				status = 'ERROR'
+				if winner is not None:
+					status, stdout = _run_sby(spec_dir, spec_name, config(winner))
+				if status == 'ERROR':
+					status, stdout = _run_sby(spec_dir, spec_name, config('\n'.join(PORTFOLIO[mode]), \
+						wait=False))
+					winner = _winner(stdout)
+					if winner is not None:
+						cache.record_winner(proof, winner)
+			else:
+				status, stdout = _run_sby(spec_dir, spec_name, config(engines))
+			if status != 'ERROR':
+				cache.put(key, status, stdout, os.path.join(spec_dir, spec_name), \
+					time.perf_counter() - start)
+			result = cache.get(key) or {'status': status, 'output': stdout, 'traces': []}
+		if result['status'] != 'PASS':
+			self.fail('Formal verification failed:\n' + result['output'] + \
+				''.join('\nCounterexample: ' + trace for trace in result['traces']))
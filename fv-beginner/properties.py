@@ -0,0 +1,29 @@
+from nmigen import *
+from nmigen.asserts import *
+
+__all__ = ['bounded_stall']
+
+"""
+Formal properties shared by the modules in fv-beginner
+"""
+
+def bounded_stall(m, stall, limit, check=Assume, name=None, domain='sync'):
+	"""
+	Adds to m that stall is never asserted for more than limit consecutive clock cycles. Use
+	Assume (the default) to constrain the inputs of a module, e.g. that a busy input does not stay
+	asserted forever, and Assert for a property of its outputs
+
+	Rather than looking back limit clock cycles with Past, which k-induction can only see through
+	with a depth of more than limit, this counts the clock cycles stall has been asserted for, so
+	that the whole stall is part of the state in every step. The counter is returned, for
+	invariants relating it to the rest of the design
+	"""
+	count = Signal(range(limit + 1), name=name or 'f_stall', reset=0)
+	with m.If(stall):
+		m.d[domain] += count.eq(count + 1)
+	with m.Else():
+		m.d[domain] += count.eq(0)
+	with m.If(count == limit):
+		m.d.comb += check(~stall)
+	m.d.comb += Assert(count <= limit)
+	return count
@@ -0,0 +1,659 @@
+from nmigen import *
+from nmigen.back import rtlil
+from nmigen.back.pysim import *
+from nmigen.hdl.ast import Assign, SignalDict, SignalSet
+
+import contextlib
+import ctypes
+import hashlib
+import os
+import subprocess
+import time
+
+from tracesink import *
+
+__all__ = ['SimHarness', 'Wait', 'WaitWhile', 'BACKENDS', 'SKIP_MODES']
+
+"""
+Simulation harness shared by the testbenches in fv-beginner
+
+SimHarness has the same interface as the pysim Simulator (add_clock, add_sync_process, write_vcd
+and run), so a testbench switches to it by changing one line, and it can run the same testbench
+processes on either of two backends:
+- 'pysim', the nmigen simulator, which is easy to set up but only manages tens of thousands of
+  clock cycles per second
+- 'cxxrtl', which converts the design to RTLIL, has yosys turn it into C++ with write_cxxrtl,
+  compiles that into a shared library and steps it through the CXXRTL C API. This is orders of
+  magnitude faster, which makes it practical to e.g. send a whole text file at a real baud rate.
+  The compiled library is cached under sim_build, keyed by a hash of the RTLIL, so only the first
+  run of a design pays for the compilation
+
+The backend is picked with the backend argument, or else the SIM_BACKEND environment variable,
+and defaults to 'pysim'. Either way, run() reports how many clock cycles were simulated per second
+
+The cxxrtl backend only understands the commands that the testbenches here use: a bare yield (or
+Tick()) waits for the next rising clock edge, yield sig.eq(value) sets a signal, yield sig reads
+one, and Settle() settles the combinational logic. Signals can only be set or read if they are in
+ports (or in the traces given to write_vcd), since only those are kept by name in the compiled
+design, and there can only be one clock domain, sync
+
+On either backend, a testbench process starts after the first clock edge, as pysim's sync
+processes do, and resumes after each clock edge with the design settled, i.e. it reads the values
+from after the edge. pysim on its own would show the values from before the edge until the process
+settles the design, so that a testbench would e.g. see o_busy go high one clock cycle later on
+pysim than on cxxrtl
+
+Traces
+write_vcd writes the traces with the backend's own VCD writer when given a plain .vcd file. With
+a compressed file or an FST file (which can also be picked with the SIM_TRACE environment
+variable), or a window or trigger to only dump some of the clock cycles, they are sampled once per
+clock cycle instead and streamed to a TraceSink (see tracesink.py), which is what makes tracing
+runs of millions of clock cycles practical
+
+Skipping idle cycles
+Most of the time in a UART testbench is spent waiting while nothing but a baud counter counts.
+Testbenches can wait with yield Wait(cycles) and yield WaitWhile(signal) instead of looping on
+bare yields, and the modules listed in idle can then be fast-forwarded over such stretches. Each
+of these modules has
+- idle, a signal asserted on the clock cycles in which the only registers that change are its
+  counters, and which stays asserted until one of them reaches its limit (as long as the inputs do
+  not change)
+- idle_counters, a list of (counter, limit) pairs, where counter counts towards limit by one per
+  clock cycle while idle is asserted
+When every module is idle, the harness moves all the counters forward by as many clock cycles as
+the nearest one is away from its limit (or as are left to wait) in one go. The modules in idle must
+therefore hold all the state of the design, and the signal given to WaitWhile must not depend on
+the counters, since neither can be checked on the fly. Skipping is only done with a single
+testbench process, since another one could change the inputs in the meantime
+
+The mode is picked with the skip argument, or else the SIM_SKIP environment variable:
+- 'off' (the default) steps through every clock cycle
+- 'on' skips idle stretches
+- 'check' runs the simulation twice, once with and once without skipping, and fails if the
+  testbench read back anything different on any clock cycle
+"""
+
+BACKENDS = ('pysim', 'cxxrtl')
+SKIP_MODES = ('off', 'on', 'check')
+
+class Wait:
+	"""
+	Command for waiting the given number of clock cycles without touching any inputs
+	"""
+	def __init__(self, cycles):
+		self.cycles = cycles
+
+class WaitWhile:
+	"""
+	Command for waiting for clock edges, without touching any inputs, for as long as signal equals
+	value, i.e. the same as while (yield signal) == value: yield
+	"""
+	def __init__(self, signal, value=1):
+		self.signal = signal
+		self.value = value
+
+class _CXXRTLObject(ctypes.Structure):
+	_fields_ = [
+		('type', ctypes.c_uint32),
+		('flags', ctypes.c_uint32),
+		('width', ctypes.c_size_t),
+		('lsb_at', ctypes.c_size_t),
+		('depth', ctypes.c_size_t),
+		('zero_at', ctypes.c_size_t),
+		('curr', ctypes.POINTER(ctypes.c_uint32)),
+		('next', ctypes.POINTER(ctypes.c_uint32)),
+		# Only there in versions of yosys that have outlines (see read())
+		('outline', ctypes.c_void_p)
+	]
+
+def _driver_path(fragment, signal, path=()):
+	"""
+	Names of the submodules down to the one that drives signal, or None if nothing drives it
+	"""
+	for domain, signals in fragment.drivers.items():
+		if signal in signals:
+			return path
+	for subfragment, name in fragment.subfragments:
+		found = _driver_path(subfragment, signal, path + (name,))
+		if found is not None:
+			return found
+	return None
+
+class _CXXRTLDesign:
+	"""
+	Compiled CXXRTL model of a design, driven through the CXXRTL C API
+	"""
+	def __init__(self, fragment, ports, idle, build_dir):
+		fragment = Fragment.get(fragment, platform=None)
+		registers = [counter for module in idle for counter, stop in module.idle_counters]
+		# The registers and idle signals are looked up by name, so they must survive the clean up
+		# below even when nothing in the design reads them
+		for signal in registers + [module.idle for module in idle]:
+			signal.attrs['keep'] = 1
+		text = rtlil.convert(fragment, ports=ports)
+		# Processes are lowered and the wires left dangling by that cleaned up first, as
+		# write_cxxrtl can otherwise take forever to schedule some designs (e.g. RXUART with a
+		# divisor register)
+		script = 'read_ilang {il}; proc; opt_clean; write_cxxrtl {cc}'
+		digest = hashlib.sha1((script + text).encode('utf-8')).hexdigest()[:16]
+		os.makedirs(build_dir, exist_ok=True)
+		il_file = os.path.join(build_dir, digest + '.il')
+		cc_file = os.path.join(build_dir, digest + '.cc')
+		so_file = os.path.join(build_dir, digest + '.so')
+		if not os.path.exists(so_file):
+			with open(il_file, 'w') as f:
+				f.write(text)
+			subprocess.run(['yosys', '-q', '-p', script.format(il=il_file, cc=cc_file)], check=True)
+			include = os.path.join(subprocess.run(['yosys-config', '--datdir'], check=True, \
+				stdout=subprocess.PIPE, universal_newlines=True).stdout.strip(), 'include')
+			runtime = os.path.join(include, 'backends', 'cxxrtl', 'runtime')
+			if os.path.isdir(runtime):
+				# Newer versions of yosys keep the CXXRTL runtime and its C API in a directory of
+				# their own
+				capi = os.path.join(runtime, 'cxxrtl', 'capi')
+				includes = [runtime]
+				sources = [os.path.join(capi, 'cxxrtl_capi.cc'), \
+					os.path.join(capi, 'cxxrtl_capi_vcd.cc')]
+			else:
+				capi = os.path.join(include, 'backends', 'cxxrtl')
+				includes = [include, capi]
+				sources = [os.path.join(capi, 'cxxrtl_capi.cc'), \
+					os.path.join(capi, 'cxxrtl_vcd_capi.cc')]
+			subprocess.run([os.environ.get('CXX', 'c++'), '-std=c++14', '-O2', '-shared', '-fPIC'] + \
+				[flag for path in includes for flag in ('-I', path)] + [cc_file] + sources + \
+				['-o', so_file], check=True)
+
+		self.lib = lib = ctypes.CDLL(os.path.abspath(so_file))
+		lib.cxxrtl_design_create.restype = ctypes.c_void_p
+		lib.cxxrtl_create.argtypes = [ctypes.c_void_p]
+		lib.cxxrtl_create.restype = ctypes.c_void_p
+		lib.cxxrtl_destroy.argtypes = [ctypes.c_void_p]
+		lib.cxxrtl_step.argtypes = [ctypes.c_void_p]
+		lib.cxxrtl_step.restype = ctypes.c_size_t
+		lib.cxxrtl_get_parts.argtypes = [ctypes.c_void_p, ctypes.c_char_p, \
+			ctypes.POINTER(ctypes.c_size_t)]
+		lib.cxxrtl_get_parts.restype = ctypes.POINTER(_CXXRTLObject)
+		lib.cxxrtl_vcd_create.restype = ctypes.c_void_p
+		lib.cxxrtl_vcd_destroy.argtypes = [ctypes.c_void_p]
+		lib.cxxrtl_vcd_timescale.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p]
+		lib.cxxrtl_vcd_add_from.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+		lib.cxxrtl_vcd_sample.argtypes = [ctypes.c_void_p, ctypes.c_uint64]
+		lib.cxxrtl_vcd_read.argtypes = [ctypes.c_void_p, \
+			ctypes.POINTER(ctypes.POINTER(ctypes.c_char)), ctypes.POINTER(ctypes.c_size_t)]
+		# Wires that are computed from others only when needed (e.g. combinational outputs) are
+		# outlined by newer versions of yosys, and only hold a value once their outline is evaluated
+		self.outline_eval = getattr(lib, 'cxxrtl_outline_eval', None)
+		if self.outline_eval is not None:
+			self.outline_eval.argtypes = [ctypes.c_void_p]
+		self.handle = lib.cxxrtl_create(lib.cxxrtl_design_create())
+
+		# Ports are found by name at the top level, and the registers and idle signals of the idle
+		# modules under the hierarchical name of the submodule that drives them (since every
+		# module names its idle signal idle). Writing a register changes its current value
+		self.objects = SignalDict()
+		self.registers = SignalSet(registers)
+		for signal in ports:
+			self.objects[signal] = self._get(signal.name)
+			# Inputs of the compiled design start out at zero, whereas an undriven signal holds its
+			# reset value in pysim
+			if signal.reset and _driver_path(fragment, signal) is None:
+				self.write(self.objects[signal], signal.reset)
+		for signal in registers + [module.idle for module in idle]:
+			path = _driver_path(fragment, signal)
+			if path is None or None in path:
+				raise KeyError("Signal {!r} is not in a named submodule of the simulated design" \
+					.format(signal.name))
+			self.objects[signal] = self._get(' '.join(path + (signal.name,)))
+		self.clk = self._get('clk')
+		self.rst = self._get('rst')
+
+	def _get(self, name):
+		count = ctypes.c_size_t(0)
+		parts = self.lib.cxxrtl_get_parts(self.handle, name.encode('utf-8'), ctypes.byref(count))
+		if not parts or count.value != 1:
+			raise KeyError("Signal {!r} is not in the simulated design".format(name))
+		return parts[0]
+
+	@staticmethod
+	def _chunks(obj):
+		return (obj.width + 31) // 32
+
+	def read(self, obj):
+		if self.outline_eval is not None and obj.outline:
+			self.outline_eval(obj.outline)
+		value = 0
+		for i in range(self._chunks(obj)):
+			value |= obj.curr[i] << (32 * i)
+		return value
+	def write(self, obj, value, register=False):
+		value &= (1 << obj.width) - 1
+		targets = [obj.next if obj.next else obj.curr]
+		if register and obj.next:
+			targets.append(obj.curr)
+		for chunks in targets:
+			for i in range(self._chunks(obj)):
+				chunks[i] = (value >> (32 * i)) & 0xFFFFFFFF
+	def settle(self):
+		self.lib.cxxrtl_step(self.handle)
+	def close(self):
+		self.lib.cxxrtl_destroy(self.handle)
+
+class SimHarness:
+	def __init__(self, fragment, ports=(), backend=None, idle=(), skip=None, build_dir='sim_build'):
+		if backend is None:
+			backend = os.environ.get('SIM_BACKEND', 'pysim')
+		if backend not in BACKENDS:
+			raise ValueError("Unknown simulation backend {!r}; expected one of {}".format(backend, \
+				', '.join(BACKENDS)))
+		if skip is None:
+			skip = os.environ.get('SIM_SKIP', 'off')
+		if skip not in SKIP_MODES:
+			raise ValueError("Unknown skip mode {!r}; expected one of {}".format(skip, \
+				', '.join(SKIP_MODES)))
+		self.fragment = fragment
+		self.ports = list(ports)
+		self.backend = backend
+		self.idle = list(idle)
+		self.skip = skip
+		self.build_dir = build_dir
+		self.period = None
+		self.processes = []
+		self.vcd_file = None
+		self.gtkw_file = None
+		self.traces = ()
+		self.trace_options = {}
+		self.cycles = 0
+		self.skipped = 0
+	def add_clock(self, period):
+		self.period = period
+	def add_sync_process(self, process):
+		self.processes.append(process)
+	@contextlib.contextmanager
+	def write_vcd(self, vcd_file, gtkw_file=None, traces=(), window=None, trigger=None, pre=0, \
+		post=0):
+		self.vcd_file = trace_path(vcd_file)
+		self.gtkw_file = gtkw_file
+		self.traces = traces
+		self.trace_options = {}
+		if window is not None:
+			self.trace_options['window'] = window
+		if trigger is not None:
+			self.trace_options.update(trigger=trigger, pre=pre, post=post)
+		try:
+			yield
+		finally:
+			self.vcd_file = None
+
+	def _trace_sink(self):
+		"""
+		TraceSink to stream the traces to, or None if there are none or the backend writes them
+		"""
+		if self.vcd_file is None:
+			return None
+		if self.vcd_file.endswith('.vcd') and not self.trace_options:
+			return None
+		return TraceSink(self.vcd_file, self.traces, self.period, gtkw_file=self.gtkw_file, \
+			**self.trace_options)
+
+	def run(self):
+		if self.period is None:
+			raise ValueError("add_clock() must be called before run()")
+		if self.skip == 'check':
+			full = self._run(skipping=False)
+			fast = self._run(skipping=True)
+			for (cycle, name, value), (fast_cycle, fast_name, fast_value) in zip(full, fast):
+				if (cycle, name, value) != (fast_cycle, fast_name, fast_value):
+					raise AssertionError("Skipping idle cycles changed what the testbench saw: {} "
+						"was {} on cycle {} when stepping through every cycle, but {} was {} on "
+						"cycle {} when skipping".format(name, value, cycle, fast_name, fast_value, \
+						fast_cycle))
+			if len(full) != len(fast):
+				raise AssertionError("Skipping idle cycles changed how many values the testbench "
+					"read: {} when stepping through every cycle, {} when skipping".format( \
+					len(full), len(fast)))
+		else:
+			self._run(skipping=self.skip == 'on')
+
+	def _run(self, skipping):
+		"""
+		Runs the simulation once, and returns a transcript of every value the testbench read
+		"""
+		self.cycles = 0
+		self.skipped = 0
+		transcript = []
+		processes = [self._expand(process, skipping and len(self.processes) == 1, transcript) \
+			for process in self.processes]
+		start = time.perf_counter()
+		if self.backend == 'pysim':
+			self._run_pysim(processes)
+		else:
+			self._run_cxxrtl(processes)
+		elapsed = time.perf_counter() - start
+		print('{}{}: {} cycles in {:.3f} s ({:.0f} cycles/s)'.format(self.backend, \
+			' (skipping idle cycles)' if skipping else '', self.cycles, elapsed, \
+			self.cycles / elapsed if elapsed else 0))
+		return transcript
+
+	def _expand(self, process, skipping, transcript):
+		"""
+		Wraps a testbench process, so that it only issues the commands the backends understand,
+		counts clock cycles, records what it reads, and skips idle stretches while it waits
+		"""
+		def wrapper():
+			cycles = 0
+			def tick(count=1):
+				nonlocal cycles
+				cycles += count
+				self.cycles = max(self.cycles, cycles)
+			def edge():
+				yield Tick()
+				tick()
+				if self.backend == 'pysim':
+					yield Settle()
+			# The process starts right after the first clock edge, so this is settled too
+			if self.backend == 'pysim':
+				yield Settle()
+			generator = process()
+			response = None
+			while True:
+				try:
+					command = generator.send(response)
+				except StopIteration:
+					break
+				response = None
+				if isinstance(command, Wait):
+					remaining = command.cycles
+					while remaining > 0:
+						skipped = 0
+						if skipping:
+							skipped = yield from self._skip(remaining)
+							tick(skipped)
+							remaining -= skipped
+						if remaining > 0:
+							yield from edge()
+							remaining -= 1
+				elif isinstance(command, WaitWhile):
+					while True:
+						value = yield command.signal
+						if value != command.value:
+							break
+						if skipping:
+							tick((yield from self._skip(None)))
+						yield from edge()
+					transcript.append((cycles, command.signal.name, value))
+				elif command is None or isinstance(command, Tick):
+					yield from edge()
+				else:
+					response = yield command
+					if isinstance(command, Signal):
+						transcript.append((cycles, command.name, response))
+		return wrapper
+
+	def _skip(self, limit):
+		"""
+		Moves the counters of the idle modules forward by as many clock cycles as possible, up to
+		limit (if not None), and returns how many that was
+		The design is settled before the idle signals are read, as the testbench may have set
+		signals they depend on since the last clock edge, and again after the counters are written
+		"""
+		yield Settle()
+		counters = SignalDict()
+		for module in self.idle:
+			if not (yield module.idle):
+				return 0
+			for counter, stop in module.idle_counters:
+				counters[counter] = stop
+		cycles = limit
+		values = SignalDict()
+		for counter, stop in counters.items():
+			values[counter] = yield counter
+			distance = abs(stop - values[counter])
+			cycles = distance if cycles is None else min(cycles, distance)
+		if not cycles:
+			return 0
+		for counter, stop in counters.items():
+			step = cycles if stop > values[counter] else -cycles
+			yield counter.eq(values[counter] + step)
+		yield Settle()
+		self.skipped += cycles
+		return cycles
+
+	def _run_pysim(self, processes):
+		sim = Simulator(self.fragment)
+		sim.add_clock(self.period)
+		for process in processes:
+			sim.add_sync_process(process)
+		sink = self._trace_sink()
+		if sink is not None:
+			def sampler():
+				# Samples the traces once the clock edge has settled, on every clock cycle,
+				# including the ones the testbench process skipped over
+				yield Passive()
+				cycle = 0
+				while True:
+					yield Settle()
+					values = []
+					for signal in sink.signals:
+						values.append((yield signal))
+					sink.sample(cycle + self.skipped, values)
+					yield
+					cycle += 1
+			sim.add_sync_process(sampler)
+			try:
+				sim.run()
+			except:
+				sink.fail()
+				raise
+			finally:
+				sink.close()
+		elif self.vcd_file is None:
+			sim.run()
+		else:
+			with sim.write_vcd(self.vcd_file, self.gtkw_file, traces=self.traces):
+				sim.run()
+
+	def _run_cxxrtl(self, processes):
+		ports = []
+		triggers = [self.trace_options['trigger']] if 'trigger' in self.trace_options else []
+		for signal in list(self.ports) + list(self.traces) + triggers:
+			if not any(signal is port for port in ports):
+				ports.append(signal)
+		names = [port.name for port in ports]
+		duplicates = sorted(set(name for name in names if names.count(name) > 1))
+		if duplicates:
+			raise ValueError("Ports must have unique names to be simulated with cxxrtl, but {} "
+				"appear more than once".format(', '.join(duplicates)))
+		design = _CXXRTLDesign(self.fragment, ports, self.idle, self.build_dir)
+		lib = design.lib
+
+		sink = self._trace_sink() if self.vcd_file is not None else None
+		vcd = None
+		if self.vcd_file is not None and sink is None:
+			vcd = lib.cxxrtl_vcd_create()
+			lib.cxxrtl_vcd_timescale(vcd, 1, b'ps')
+			lib.cxxrtl_vcd_add_from(vcd, design.handle)
+		period_ps = int(round(self.period * 1e12))
+
+		def value_of(value):
+			if isinstance(value, Const):
+				return value.value
+			if isinstance(value, Signal):
+				return design.read(design.objects[value])
+			raise NotImplementedError("Only constants and ports can be used with the cxxrtl "
+				"backend, not {!r}".format(value))
+
+		def advance(process, response):
+			"""
+			Runs a process until it waits for a clock edge. Returns False once it is done
+			"""
+			while True:
+				try:
+					command = process.send(response)
+				except StopIteration:
+					return False
+				response = None
+				if command is None or isinstance(command, Tick):
+					return True
+				elif isinstance(command, Settle):
+					design.settle()
+				elif isinstance(command, Assign):
+					if not isinstance(command.lhs, Signal):
+						raise NotImplementedError("Only whole ports can be set with the cxxrtl "
+							"backend, not {!r}".format(command.lhs))
+					design.write(design.objects[command.lhs], value_of(command.rhs), \
+						register=command.lhs in design.registers)
+					design.settle()
+				elif isinstance(command, Signal):
+					response = value_of(command)
+					if command.signed and response & (1 << (len(command) - 1)):
+						response -= 1 << len(command)
+				else:
+					raise NotImplementedError("Command {!r} is not supported by the cxxrtl "
+						"backend".format(command))
+
+		design.write(design.clk, 0)
+		design.write(design.rst, 0)
+		design.settle()
+		# Like pysim's sync processes, the processes only start after the first clock edge
+		design.write(design.clk, 1)
+		design.settle()
+		design.write(design.clk, 0)
+		design.settle()
+		processes = [process() for process in processes]
+		running = [advance(process, None) for process in processes]
+		try:
+			while any(running):
+				# One clock cycle: sample the waveforms, then the rising and falling edges. The
+				# processes count the cycle once they resume, and have already counted any cycles
+				# they skipped
+				if vcd is not None:
+					lib.cxxrtl_vcd_sample(vcd, self.cycles * period_ps)
+				if sink is not None:
+					sink.sample(self.cycles, [design.read(design.objects[signal]) \
+						for signal in sink.signals])
+				design.write(design.clk, 1)
+				design.settle()
+				design.write(design.clk, 0)
+				design.settle()
+				running = [advance(process, None) if alive else False \
+					for process, alive in zip(processes, running)]
+			if vcd is not None:
+				lib.cxxrtl_vcd_sample(vcd, self.cycles * period_ps)
+				data = ctypes.POINTER(ctypes.c_char)()
+				size = ctypes.c_size_t(0)
+				with open(self.vcd_file, 'wb') as f:
+					while True:
+						lib.cxxrtl_vcd_read(vcd, ctypes.byref(data), ctypes.byref(size))
+						if size.value == 0:
+							break
+						f.write(ctypes.string_at(data, size.value))
+		except:
+			if sink is not None:
+				sink.fail()
+			raise
+		finally:
+			if sink is not None:
+				sink.close()
+			if vcd is not None:
+				lib.cxxrtl_vcd_destroy(vcd)
+			design.close()
+
+if __name__ == '__main__':
+	"""
+	Benchmark
+	Sends the same message through the UART transmitter on both backends, with and without
+	skipping idle cycles
+	"""
+	from uart import *
+
+	import shutil
+	import unittest
+
+	for backend in BACKENDS:
+		for skip in ('off', 'check'):
+			m = Module()
+			m.submodules.txuart = txuart = TXUART(i_setup=Const(baud_setup(100e6, 115200), \
+				SETUP_WIDTH))
+
+			sim = SimHarness(m, ports=txuart.ports(), backend=backend, idle=[txuart], skip=skip)
+
+			def process():
+				for c in "Hello World!\n" * 10:
+					yield WaitWhile(txuart.o_busy)
+					yield txuart.i_wr.eq(1)
+					yield txuart.i_data.eq(ord(c))
+					yield
+					yield txuart.i_wr.eq(0)
+				yield WaitWhile(txuart.o_busy)
+
+			sim.add_clock(1e-8)
+			sim.add_sync_process(process)
+			sim.run()
+
+	"""
+	Tests
+	"""
+	class SimHarnessTest(unittest.TestCase):
+		def test_skip_check(self):
+			# Back-to-back frames at a few divisors, including a fractional one, so that skipping
+			# runs into the strobes, restarts and frame ends that a skip must stop at
+			for setup in (16 << FRAC_BITS, 0x440):
+				m = Module()
+				m.submodules.txuart = txuart = TXUART(i_setup=Const(setup, SETUP_WIDTH))
+
+				sim = SimHarness(m, ports=txuart.ports(), backend='pysim', idle=[txuart], \
+					skip='check')
+
+				def process():
+					yield Wait(25)
+					for c in "Hi!\n":
+						yield WaitWhile(txuart.o_busy)
+						yield txuart.i_wr.eq(1)
+						yield txuart.i_data.eq(ord(c))
+						yield
+						yield txuart.i_wr.eq(0)
+					yield WaitWhile(txuart.o_busy)
+					yield Wait(20)
+
+				sim.add_clock(1e-8)
+				sim.add_sync_process(process)
+				sim.run()
+				self.assertGreater(sim.skipped, 0)
+
+		@unittest.skipIf(shutil.which('yosys-config') is None, "yosys-config is needed to build "
+			"the cxxrtl backend")
+		def test_cxxrtl(self):
+			# The transmitter looped back into the receiver, so that the bytes only come back if
+			# the compiled design is really clocked, read and written
+			m = Module()
+			setup = Const(baud_setup(100e6, 3e6), SETUP_WIDTH)
+			m.submodules.txuart = txuart = TXUART(i_setup=setup)
+			m.submodules.rxuart = rxuart = RXUART(i_setup=setup)
+			m.d.comb += rxuart.i_uart_rx.eq(txuart.o_uart_tx)
+
+			sim = SimHarness(m, ports=txuart.ports() + rxuart.ports(), backend='cxxrtl', \
+				idle=[txuart, rxuart], skip='check')
+
+			tx_msg = "Hi!\n"
+			rx_msg = ""
+
+			def process():
+				nonlocal rx_msg
+				rx_msg = ""
+				for c in tx_msg:
+					yield txuart.i_data.eq(ord(c))
+					yield txuart.i_wr.eq(1)
+					yield
+					yield txuart.i_data.eq(0)
+					yield txuart.i_wr.eq(0)
+					yield WaitWhile(rxuart.o_stb, 0)
+					rx_msg += chr((yield rxuart.o_data))
+					yield WaitWhile(txuart.o_busy)
+
+			sim.add_clock(1e-8)
+			sim.add_sync_process(process)
+			sim.run()
+			self.assertEqual(rx_msg, tx_msg)
+			self.assertGreater(sim.skipped, 0)
+	SimHarnessTest().test_skip_check()
+	SimHarnessTest().test_cxxrtl()
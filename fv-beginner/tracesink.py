@@ -0,0 +1,203 @@
+import collections
+import gzip
+import io
+import os
+import subprocess
+
+__all__ = ['TraceSink', 'TRACE_FORMATS', 'trace_path']
+
+"""
+Streaming waveform writer for SimHarness
+
+TraceSink is given the values of the traced signals once per clock cycle, and writes the changes
+straight to the file, so the memory it uses does not grow with the length of the simulation. The
+file format follows the file name:
+- .vcd, a plain VCD file
+- .vcd.gz, a gzip-compressed VCD file
+- .vcd.zst, a zstd-compressed VCD file, which needs the zstandard package
+- .fst, an FST file, which is converted on the fly by piping the VCD through vcd2fst (from
+  GTKWave)
+
+Rather than the whole simulation, it can dump
+- a window of clock cycles, window=(start, stop), with stop excluded
+- the clock cycles around each cycle on which trigger is asserted, from pre cycles before it to
+  post cycles after it. Only the last pre clock cycles are kept in memory until the trigger is
+  asserted, and they are also dumped if the simulation fails, e.g. on a failed assertion in the
+  testbench
+Clock cycles that are not dumped are marked as x in the waveforms
+
+SimHarness.write_vcd takes the same window, trigger, pre and post arguments, and the format of
+every trace can be changed without touching the testbenches with the SIM_TRACE environment
+variable: 'vcd', 'gz', 'zst', 'fst', or 'off' to not write any traces at all. For instance
+$ SIM_TRACE=gz SIM_BACKEND=cxxrtl python ./rxuart.py
+writes rxuart.vcd.gz
+"""
+
+TRACE_FORMATS = {
+	'vcd': '.vcd',
+	'gz': '.vcd.gz',
+	'zst': '.vcd.zst',
+	'fst': '.fst'
+}
+
+def trace_path(vcd_file, trace_format=None):
+	"""
+	Name of the file to write the traces given for vcd_file to, in trace_format (or else the
+	format picked by SIM_TRACE), or None if traces are turned off
+	"""
+	if trace_format is None:
+		trace_format = os.environ.get('SIM_TRACE')
+	if trace_format is None:
+		return vcd_file
+	if trace_format == 'off':
+		return None
+	if trace_format not in TRACE_FORMATS:
+		raise ValueError("Unknown trace format {!r}; expected one of {}, off".format(trace_format, \
+			', '.join(TRACE_FORMATS)))
+	for extension in sorted(TRACE_FORMATS.values(), key=len, reverse=True):
+		if vcd_file.endswith(extension):
+			vcd_file = vcd_file[:-len(extension)]
+			break
+	return vcd_file + TRACE_FORMATS[trace_format]
+
+def _identifiers():
+	"""
+	Short VCD identifiers, made of the printable ASCII characters
+	"""
+	count = 0
+	while True:
+		code = ''
+		n = count
+		while True:
+			code += chr(33 + n % 94)
+			n //= 94
+			if not n:
+				break
+		yield code
+		count += 1
+
+class TraceSink:
+	def __init__(self, path, traces, period, window=None, trigger=None, pre=0, post=0, \
+		gtkw_file=None):
+		if pre < 0 or post < 0:
+			raise ValueError("pre and post must not be negative")
+		self.path = path
+		self.traces = list(traces)
+		self.period_ps = int(round(period * 1e12))
+		self.window = window
+		self.trigger = trigger
+		self.post = post
+		self.signals = list(self.traces)
+		self.trigger_index = None
+		if trigger is not None:
+			for i, signal in enumerate(self.signals):
+				if signal is trigger:
+					self.trigger_index = i
+			if self.trigger_index is None:
+				self.trigger_index = len(self.signals)
+				self.signals.append(trigger)
+
+		self.history = collections.deque(maxlen=pre)
+		self.remaining = 0
+		self.last = None
+		self.last_cycle = None
+		self.process = None
+		self.file = self._open(path)
+
+		names = collections.Counter()
+		self.names = []
+		identifiers = _identifiers()
+		self.codes = [next(identifiers) for signal in self.signals]
+		self.file.write('$timescale 1 ps $end\n$scope module top $end\n')
+		for signal, code in zip(self.signals, self.codes):
+			name = signal.name
+			if names[name]:
+				name = '{}_{}'.format(name, names[signal.name])
+			names[signal.name] += 1
+			self.names.append(name)
+			self.file.write('$var wire {} {} {} $end\n'.format(len(signal), code, name))
+		self.file.write('$upscope $end\n$enddefinitions $end\n')
+
+		if gtkw_file is not None:
+			with open(gtkw_file, 'w') as f:
+				f.write('[dumpfile] "{}"\n'.format(os.path.abspath(path)))
+				for signal, name in zip(self.traces, self.names):
+					if len(signal) == 1:
+						f.write('top.{}\n'.format(name))
+					else:
+						f.write('top.{}[{}:0]\n'.format(name, len(signal) - 1))
+
+	def _open(self, path):
+		if path.endswith('.gz'):
+			return gzip.open(path, 'wt')
+		if path.endswith('.zst'):
+			try:
+				import zstandard
+			except ImportError:
+				raise ImportError("Writing zstd-compressed traces needs the zstandard package") \
+					from None
+			return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, 'wb')))
+		if path.endswith('.fst'):
+			self.process = subprocess.Popen(['vcd2fst', '-', path], stdin=subprocess.PIPE, \
+				universal_newlines=True)
+			return self.process.stdin
+		return open(path, 'w')
+
+	def _format(self, signal, code, value):
+		if value is None:
+			return ('x{}' if len(signal) == 1 else 'bx {}').format(code)
+		value &= (1 << len(signal)) - 1
+		if len(signal) == 1:
+			return '{}{}'.format(value, code)
+		return 'b{:b} {}'.format(value, code)
+
+	def _write(self, cycle, values):
+		# Mark the clock cycles that were not dumped since the last one that was
+		if self.last_cycle is not None and cycle > self.last_cycle + 1:
+			self._dump(self.last_cycle + 1, [None] * len(values))
+		self._dump(cycle, values)
+		self.last_cycle = cycle
+
+	def _dump(self, cycle, values):
+		changes = [self._format(signal, code, value) for i, (signal, code, value) in \
+			enumerate(zip(self.signals, self.codes, values)) \
+			if self.last is None or self.last[i] != value]
+		if changes:
+			self.file.write('#{}\n{}\n'.format(cycle * self.period_ps, '\n'.join(changes)))
+		self.last = list(values)
+
+	def _flush_history(self):
+		while self.history:
+			self._write(*self.history.popleft())
+
+	def sample(self, cycle, values):
+		"""
+		Values of signals at the end of the given clock cycle
+		"""
+		if self.window is not None and not self.window[0] <= cycle < self.window[1]:
+			self.history.clear()
+			return
+		if self.trigger is None:
+			self._write(cycle, values)
+		elif values[self.trigger_index]:
+			self._flush_history()
+			self._write(cycle, values)
+			self.remaining = self.post
+		elif self.remaining:
+			self._write(cycle, values)
+			self.remaining -= 1
+		elif self.history.maxlen:
+			self.history.append((cycle, list(values)))
+
+	def fail(self):
+		"""
+		Dumps the clock cycles kept in memory, when the simulation stops on an error
+		"""
+		self._flush_history()
+
+	def close(self):
+		if self.last_cycle is not None:
+			self.file.write('#{}\n'.format((self.last_cycle + 1) * self.period_ps))
+		self.file.close()
+		if self.process is not None and self.process.wait():
+			raise subprocess.CalledProcessError(self.process.returncode, self.process.args)
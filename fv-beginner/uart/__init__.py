@@ -0,0 +1,6 @@
+from .baudgen import *
+from .parity import *
+from .stream import *
+from .txuart import *
+from .rxuart import *
+from .versa import *
@@ -0,0 +1,192 @@
+from nmigen import *
+from nmigen.back.pysim import *
+from nmigen.asserts import *
+from nmigen.test.utils import *
+
+__all__ = ['BaudGen', 'baud_setup', 'FRAC_BITS', 'SETUP_WIDTH']
+
+"""
+Fractional baud rate generator shared by the RS-232 transmitter and receiver
+
+i_setup holds the number of clocks per baud as a fixed-point number with FRAC_BITS fractional
+bits, so the baud rate is a register that can be changed at runtime instead of a constant baked
+in at elaboration time. The integer part sets the length of each baud period; the fractional
+part is added to an accumulator at the end of every period, and whenever the accumulator
+overflows the next period is stretched by one clock. The average baud period is therefore
+exact (e.g. 33 1/3 clocks for 3 Mbaud at 100 MHz) and the timing error never exceeds one clock,
+no matter how many bits are sent
+
+idle is asserted on the clock cycles in which the counter does nothing but count down, which lets
+a simulation skip ahead over them (see simharness.py)
+"""
+
+FRAC_BITS = 8
+SETUP_WIDTH = 32
+
+def baud_setup(clk_frequency, baud_rate):
+	"""
+	Value of i_setup for the given clock frequency and baud rate
+	"""
+	return int(round(clk_frequency * (1 << FRAC_BITS) / baud_rate))
+
+class BaudGen(Elaboratable):
+	def __init__(self, fv_mode=False):
+		self.i_setup = Signal(SETUP_WIDTH, reset=0)
+		self.i_restart = Signal(1, reset=0)
+		self.i_half = Signal(1, reset=0)
+		self.o_stb = Signal(1, reset=0)
+		self.counter = Signal(SETUP_WIDTH - FRAC_BITS, reset=0)
+		self.idle = Signal(1)
+		self.idle_counters = [(self.counter, 0)]
+		self.fv_mode = fv_mode
+	def ports(self):
+		return [
+			self.i_setup,
+			self.i_restart,
+			self.i_half,
+			self.o_stb,
+			self.counter
+		]
+	def elaborate(self, platform):
+		m = Module()
+
+		# Integer and fractional parts of the divisor
+		clocks = Signal(SETUP_WIDTH - FRAC_BITS)
+		frac = Signal(FRAC_BITS)
+		m.d.comb += clocks.eq(self.i_setup[FRAC_BITS:])
+		m.d.comb += frac.eq(self.i_setup[:FRAC_BITS])
+
+		# Fractional accumulator; its carry stretches the next baud period by one clock
+		acc = Signal(FRAC_BITS, reset=0)
+		acc_next = Signal(FRAC_BITS + 1)
+		m.d.comb += acc_next.eq(acc + frac)
+
+		# Values the counter is reloaded with for a full and for half a baud period. A divisor of less
+		# than one clock (or two for half a period) gives the shortest period possible instead of
+		# wrapping around to the longest one
+		full = Signal(SETUP_WIDTH - FRAC_BITS)
+		half = Signal(SETUP_WIDTH - FRAC_BITS)
+		m.d.comb += full.eq(Mux(clocks >= 1, clocks - 1, 0))
+		m.d.comb += half.eq(Mux(clocks >= 2, (clocks >> 1) - 1, 0))
+
+		# The counter counts down to zero, so the strobe marks the last clock of each baud period
+		m.d.comb += self.o_stb.eq(self.counter == 0)
+		m.d.comb += self.idle.eq(~self.i_restart & ~self.o_stb)
+
+		with m.If(self.i_restart):
+			# Start a fresh baud period on the next clock. The receiver asks for half a period
+			# first so that it samples each bit in the middle
+			m.d.sync += acc.eq(0)
+			with m.If(self.i_half):
+				m.d.sync += self.counter.eq(half)
+			with m.Else():
+				m.d.sync += self.counter.eq(full)
+		with m.Elif(self.o_stb):
+			m.d.sync += acc.eq(acc_next[:FRAC_BITS])
+			m.d.sync += self.counter.eq(full + acc_next[FRAC_BITS])
+		with m.Else():
+			m.d.sync += self.counter.eq(self.counter - 1)
+
+		if self.fv_mode:
+			"""
+			Indicator of when Past() is valid
+			"""
+			f_past_valid = Signal(1, reset=0)
+			m.d.sync += f_past_valid.eq(1)
+
+			"""
+			Assumptions on input pins
+			"""
+			# A baud period is at least two clocks long, so that half a period is at least one clock
+			m.d.comb += Assume(clocks >= 2)
+			# The divisor only changes while the generator is not in use, i.e. never while we are
+			# looking
+			with m.If(f_past_valid):
+				m.d.comb += Assume(Stable(self.i_setup))
+
+			"""
+			Properties of o_stb
+			"""
+			# o_stb is asserted precisely on the last clock of each baud period
+			m.d.comb += Assert(self.o_stb == (self.counter == 0))
+
+			"""
+			Properties of counter
+			"""
+			# A baud period is never longer than the integer part of the divisor plus one clock
+			m.d.comb += Assert(self.counter <= clocks)
+			# A restart starts a full (or half) baud period on the next clock
+			with m.If(f_past_valid & Past(self.i_restart)):
+				with m.If(Past(self.i_half)):
+					m.d.comb += Assert(self.counter == (Past(clocks) >> 1) - 1)
+				with m.Else():
+					m.d.comb += Assert(self.counter == Past(clocks) - 1)
+			# Within a baud period, counter counts down by 1 every clock
+			with m.If(f_past_valid & ~Past(self.i_restart) & ~Past(self.o_stb)):
+				m.d.comb += Assert(self.counter == Past(self.counter) - 1)
+			# At the end of a baud period, the next one is either the integer part of the divisor
+			# long or one clock longer, depending on the carry out of the fractional accumulator
+			with m.If(f_past_valid & ~Past(self.i_restart) & Past(self.o_stb)):
+				m.d.comb += Assert(self.counter == Past(clocks) - 1 + Past(acc_next)[FRAC_BITS])
+
+			"""
+			No drift
+			f_err keeps track of (clocks in all baud periods started since the last full restart)
+			* 2**FRAC_BITS - (number of such periods) * i_setup, i.e. how far the edges we generate
+			are away from the ideal ones. It is pinned to the fractional accumulator, so it always
+			stays within one clock
+			"""
+			f_err = Signal(signed(SETUP_WIDTH + 2), reset=0)
+			f_full = Signal(1, reset=0)
+			with m.If(self.i_restart):
+				m.d.sync += f_full.eq(~self.i_half)
+				m.d.sync += f_err.eq((clocks << FRAC_BITS) - self.i_setup)
+			with m.Elif(self.o_stb):
+				m.d.sync += f_err.eq(f_err + ((clocks + acc_next[FRAC_BITS]) << FRAC_BITS) - \
+					self.i_setup)
+			with m.If(f_full):
+				m.d.comb += Assert(f_err == -(frac + acc))
+				m.d.comb += Assert(f_err > -(2 << FRAC_BITS))
+				m.d.comb += Assert(f_err <= 0)
+
+		return m
+
+if __name__ == '__main__':
+	"""
+	Simulation
+	"""
+	from simharness import *
+	from proofcache import *
+
+	m = Module()
+	m.submodules.baudgen = baudgen = BaudGen()
+
+	sim = SimHarness(m)
+
+	def process():
+		# 3 Mbaud from a 100 MHz clock, i.e. 33 1/3 clocks per baud
+		yield baudgen.i_setup.eq(baud_setup(100e6, 3e6))
+		yield baudgen.i_restart.eq(1)
+		yield
+		yield baudgen.i_restart.eq(0)
+		cycles = 0
+		bauds = 0
+		while bauds < 300:
+			yield
+			cycles += 1
+			if (yield baudgen.o_stb):
+				bauds += 1
+		print('%d clocks for %d bauds' % (cycles, bauds)) # Should be roughly 10000 clocks
+
+	sim.add_clock(1e-8)
+	sim.add_sync_process(process)
+	with sim.write_vcd('baudgen.vcd', 'baudgen.gtkw', traces=baudgen.ports()):
+		sim.run()
+
+	"""
+	Formal Verification
+	"""
+	class BaudGenTest(FormalTestCase):
+		def test_baudgen(self):
+			self.assertFormal(BaudGen(fv_mode=True), mode='prove', depth=10)
+	BaudGenTest().test_baudgen()
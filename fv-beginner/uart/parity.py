@@ -0,0 +1,24 @@
+from nmigen import *
+from functools import reduce
+
+__all__ = ['PARITY_MODES', 'parity_bit']
+
+"""
+Parity bit shared by the RS-232 transmitter and receiver
+"""
+
+PARITY_MODES = (None, 'even', 'odd', 'mark', 'space')
+
+def parity_bit(parity, data):
+	"""
+	Parity bit sent after data, for any parity mode other than None
+	"""
+	if parity == 'even':
+		return reduce(lambda a, b: a ^ b, data)
+	elif parity == 'odd':
+		return ~reduce(lambda a, b: a ^ b, data)
+	elif parity == 'mark':
+		return Const(1, 1)
+	elif parity == 'space':
+		return Const(0, 1)
+	raise ValueError("Invalid parity mode {!r}".format(parity))
@@ -0,0 +1,33 @@
+from nmigen import *
+from nmigen.asserts import *
+
+__all__ = ['Stream', 'stream_protocol']
+
+"""
+Valid/ready stream shared by the modules in fv-beginner
+
+A byte (or word) moves from source to sink on every clock cycle in which both valid and ready are
+asserted. first and last optionally mark the boundaries of a packet, e.g. a line of text
+"""
+
+class Stream(Record):
+	def __init__(self, width=8, name=None):
+		super().__init__([
+			('data', width),
+			('valid', 1),
+			('ready', 1),
+			('first', 1),
+			('last', 1)
+		], name=name)
+
+def stream_protocol(m, stream, f_past_valid, check=Assert, domain='sync'):
+	"""
+	Adds the stream protocol properties to m: once valid is asserted, it stays asserted, and data,
+	first and last stay stable, until ready is asserted. Use Assert (the default) for a stream
+	the module drives, and Assume for one it receives. domain is the clock domain of the stream
+	"""
+	with m.If(f_past_valid & Past(stream.valid, domain=domain) & ~Past(stream.ready, domain=domain)):
+		m.d.comb += check(stream.valid)
+		m.d.comb += check(Stable(stream.data, domain=domain))
+		m.d.comb += check(Stable(stream.first, domain=domain))
+		m.d.comb += check(Stable(stream.last, domain=domain))
@@ -0,0 +1,374 @@
+from nmigen import *
+from nmigen.back.pysim import *
+from nmigen.asserts import *
+from nmigen.test.utils import *
+
+from .baudgen import *
+from .parity import *
+from .stream import *
+
+__all__ = ['TXUART']
+
+"""
+RS-232 transmitter shared by every design in fv-beginner
+See https://zipcpu.com/tutorial/lsn-05-serialtx.pdf for more details
+
+Rather than one FSM state per bit, the byte is sent out of a shift register and a 4-bit counter
+keeps track of how many baud periods are left in the frame (1 start bit, 8 data bits, an optional
+parity bit and stop_bits stop bits, 1 by default). Ones are shifted in behind the data, so the
+stop bits come out of the shift register for free
+
+The transmitter is double-buffered: once the current frame is down to its stop bits, o_busy is
+de-asserted and the next byte is taken into a holding register, from which the next frame starts
+right after the last stop bit. As long as the next byte is written in time, the line sees
+continuous frames with no idle time in between, i.e. exactly 10 baud periods per byte with one
+stop bit (plus one with parity, and one for each extra stop bit)
+
+Bytes come in through the sink stream, with i_wr and i_data being aliases of its valid and data
+fields, and o_busy the inverse of its ready field
+
+In formal verification mode, f_data, f_counter and f_bits expose the byte being sent, the number
+of clock cycles since the start of the frame and the baud periods left in it, so that the
+receiver can be verified against the transmitter
+
+To run the simulation and formal verification, run
+$ python -m uart.txuart
+from the fv-beginner directory
+"""
+
+class TXUART(Elaboratable):
+	def __init__(self, i_setup=None, parity=None, stop_bits=1, fv_mode=False):
+		assert parity in PARITY_MODES
+		assert stop_bits in (1, 2)
+		self.sink = Stream(8, name='sink')
+		self.i_wr = self.sink.valid
+		self.i_data = self.sink.data
+		self.o_busy = Signal(1, reset=0)
+		self.o_uart_tx = Signal(1, reset=1)
+		self.i_setup = i_setup
+		self.parity = parity
+		self.stop_bits = stop_bits
+		self.fv_mode = fv_mode
+		self.baudgen = BaudGen(fv_mode)
+
+		# Asserted while nothing but the baud generator counter changes, for simharness.py
+		self.idle = Signal(1)
+		self.idle_counters = self.baudgen.idle_counters
+
+		# Extra ports for formal verification
+		self.f_data = Signal(8, reset=0)
+		self.f_counter = Signal(32, reset=0)
+		self.f_bits = Signal(4, reset=0)
+	def ports(self):
+		ports = [
+			self.i_wr,
+			self.i_data,
+			self.o_busy,
+			self.sink.ready,
+			self.o_uart_tx
+		]
+		# A constant divisor is not a port
+		if isinstance(self.i_setup, Signal):
+			ports.append(self.i_setup)
+		if self.fv_mode:
+			ports += [self.f_data, self.f_counter, self.f_bits]
+		return ports
+	def elaborate(self, platform):
+		m = Module()
+
+		# Bits sent out of the shift register (data and parity), and baud periods in a frame
+		NBITS = 8 if self.parity is None else 9
+		STOP = self.stop_bits
+		FRAME = NBITS + 1 + STOP
+
+		# Without a divisor register, the baud rate is fixed at 115200 baud on hardware and at 4
+		# clocks per baud in simulation and formal verification
+		setup = self.i_setup
+		if setup is None:
+			setup = Const(4 << FRAC_BITS, SETUP_WIDTH)
+
+		if platform is not None and platform != "formal":
+			BAUD_RATE = 115200
+			if self.i_setup is None:
+				setup = Const(baud_setup(platform.default_clk_frequency, BAUD_RATE), SETUP_WIDTH)
+
+		m.submodules.baudgen = baudgen = self.baudgen
+		m.d.comb += baudgen.i_setup.eq(setup)
+		# Only the receiver starts on half a baud period
+		m.d.comb += baudgen.i_half.eq(0)
+
+		# Data (and parity) bits that have not been sent yet
+		sreg = Signal(NBITS, reset=(1 << NBITS) - 1)
+		# Baud periods left in the current frame, zero when idle
+		bits = Signal(4, reset=0)
+		# Holding register for the next byte
+		hold = Signal(8, reset=0)
+		hold_valid = Signal(1, reset=0)
+
+		# A byte is taken in when idle, or during the stop bits if the holding register is empty
+		m.d.comb += self.o_busy.eq(hold_valid | (bits > STOP))
+		m.d.comb += self.sink.ready.eq(~self.o_busy)
+
+		# The next byte to be sent, if any
+		next_valid = Signal(1)
+		next_data = Signal(8)
+		m.d.comb += next_valid.eq(hold_valid | self.i_wr)
+		m.d.comb += next_data.eq(Mux(hold_valid, hold, self.i_data))
+
+		# A new frame starts either from idle, or straight after the last stop bit of the current
+		# frame, in which case the baud generator just carries on
+		start = Signal(1)
+		m.d.comb += start.eq(next_valid & ((bits == 0) | (baudgen.o_stb & (bits == 1))))
+
+		with m.If(start):
+			m.d.comb += baudgen.i_restart.eq(bits == 0)
+			m.d.sync += self.o_uart_tx.eq(0)
+			if self.parity is None:
+				m.d.sync += sreg.eq(next_data)
+			else:
+				m.d.sync += sreg.eq(Cat(next_data, parity_bit(self.parity, next_data)))
+			m.d.sync += bits.eq(FRAME)
+		with m.Elif((bits != 0) & baudgen.o_stb):
+			m.d.sync += self.o_uart_tx.eq(sreg[0])
+			m.d.sync += sreg.eq(Cat(sreg[1:], Const(1, 1)))
+			m.d.sync += bits.eq(bits - 1)
+
+		with m.If(self.i_wr & ~self.o_busy & ~start):
+			m.d.sync += hold.eq(self.i_data)
+			m.d.sync += hold_valid.eq(1)
+		with m.Elif(start):
+			m.d.sync += hold_valid.eq(0)
+
+		# Between baud strobes, the frame only moves on when a byte is started or taken in
+		m.d.comb += self.idle.eq(baudgen.idle & ~start & ~(self.i_wr & ~self.o_busy))
+
+		if self.fv_mode:
+			"""
+			Indicator of when Past() is valid
+			"""
+			f_past_valid = Signal(1, reset=0)
+			m.d.sync += f_past_valid.eq(1)
+
+			"""
+			Assumptions on the divisor
+			A divisor register holds an arbitrary constant, so that the proof covers every divisor
+			that fits in it. The constant is made here rather than passed in, since nmigen makes a
+			different one out of an AnyConst in every module that uses it
+			"""
+			if isinstance(self.i_setup, Signal):
+				m.d.comb += Assume(self.i_setup == AnyConst(len(self.i_setup)))
+
+			"""
+			Formal-only copies of the byte being sent, of the clock cycles since the start of
+			the frame and of the baud periods left in it
+			"""
+			m.d.comb += self.f_bits.eq(bits)
+			# Everything sent out of the shift register
+			f_frame = Signal(NBITS)
+			if self.parity is None:
+				m.d.comb += f_frame.eq(self.f_data)
+			else:
+				m.d.comb += f_frame.eq(Cat(self.f_data, parity_bit(self.parity, self.f_data)))
+			with m.If(start):
+				m.d.sync += self.f_data.eq(next_data)
+			with m.If((bits != 0) & ~(baudgen.o_stb & (bits == 1))):
+				m.d.sync += self.f_counter.eq(self.f_counter + 1)
+			with m.Else():
+				m.d.sync += self.f_counter.eq(0)
+
+			"""
+			Properties of o_busy
+			"""
+			# o_busy should be de-asserted if and only if the holding register is empty and the
+			# transmitter is either idle or sending the stop bits
+			m.d.comb += Assert(self.o_busy == (hold_valid | (bits > STOP)))
+
+			"""
+			Properties of the holding register
+			"""
+			# The holding register only fills up during the stop bits, and is emptied by the
+			# start of the next frame
+			with m.If(hold_valid):
+				m.d.comb += Assert((bits >= 1) & (bits <= STOP))
+			# A byte written during the stop bits ends up in the holding register
+			with m.If(f_past_valid & Past(self.i_wr) & ~Past(self.o_busy) & (Past(bits) != 0) & \
+				~Past(start)):
+				m.d.comb += Assert(hold_valid)
+				m.d.comb += Assert(hold == Past(self.i_data))
+			# And stays there until the next frame starts
+			with m.If(f_past_valid & Past(hold_valid) & ~Past(start)):
+				m.d.comb += Assert(hold_valid)
+				m.d.comb += Assert(Stable(hold))
+			# Which it does right after the last stop bit, without any idle time
+			with m.If(f_past_valid & Past(hold_valid) & Past(baudgen.o_stb) & (Past(bits) == 1)):
+				m.d.comb += Assert(~hold_valid)
+				m.d.comb += Assert(bits == FRAME)
+				m.d.comb += Assert(self.o_uart_tx == 0)
+
+			"""
+			Properties of o_uart_tx
+			"""
+			# In each baud period of the frame, o_uart_tx should have the corresponding output
+			with m.Switch(bits):
+				with m.Case(0):
+					m.d.comb += Assert(self.o_uart_tx == 1)
+				with m.Case(FRAME):
+					m.d.comb += Assert(self.o_uart_tx == 0)
+				for i in range(NBITS):
+					with m.Case(FRAME - 1 - i):
+						m.d.comb += Assert(self.o_uart_tx == f_frame[i])
+				with m.Case(*range(1, STOP + 1)):
+					m.d.comb += Assert(self.o_uart_tx == 1)
+				with m.Default():
+					m.d.comb += Assert(0) # This should never happen
+
+			"""
+			Properties of sreg
+			"""
+			# After i baud periods, the first i bits have been shifted out and replaced by ones
+			for i in range(NBITS + 1):
+				with m.If(bits == FRAME - i):
+					m.d.comb += Assert(sreg == Cat(f_frame[i:], Repl(Const(1, 1), i)))
+			# Once all data (and parity) bits are out, only ones are left
+			with m.If(bits <= STOP + 1):
+				m.d.comb += Assert(sreg == (1 << NBITS) - 1)
+
+			"""
+			Baud generator properties
+			The length of each baud period is verified by the baud generator itself, so all we
+			need here is that every transmission from idle starts on a fresh baud period.
+			Back-to-back frames just carry on with the baud generator
+			"""
+			# A new baud period is started precisely when a transmission begins from idle
+			m.d.comb += Assert(baudgen.i_restart == ((bits == 0) & self.i_wr))
+
+			"""
+			Properties of bits
+			"""
+			# A frame is FRAME baud periods long
+			m.d.comb += Assert(bits <= FRAME)
+			# The transmitter should initially be idle
+			with m.If(~f_past_valid):
+				m.d.comb += Assert(bits == 0)
+			# When idle, i_wr starts a new frame on the next clock cycle, and nothing else does
+			with m.If(f_past_valid & (Past(bits) == 0)):
+				with m.If(Past(self.i_wr)):
+					m.d.comb += Assert(bits == FRAME)
+				with m.Else():
+					m.d.comb += Assert(bits == 0)
+			# During a transmission, bits counts down by 1 at the end of every baud period and
+			# remains stable otherwise. After the last stop bit, the next frame starts straight
+			# away if there is a byte to send
+			with m.If(f_past_valid & (Past(bits) != 0)):
+				with m.If(Past(baudgen.o_stb) & (Past(bits) == 1) & Past(next_valid)):
+					m.d.comb += Assert(bits == FRAME)
+				with m.Elif(Past(baudgen.o_stb)):
+					m.d.comb += Assert(bits == Past(bits) - 1)
+				with m.Else():
+					m.d.comb += Assert(Stable(bits))
+
+			"""
+			f_data properties
+			"""
+			# When idle, on i_wr, f_data should take the value of i_data on the next
+			# clock cycle
+			with m.If(f_past_valid & (Past(bits) == 0) & Past(self.i_wr)):
+				m.d.comb += Assert(self.f_data == Past(self.i_data))
+			# Back-to-back frames send the byte from the holding register
+			with m.If(f_past_valid & (Past(bits) != 0) & Past(start)):
+				m.d.comb += Assert(self.f_data == Mux(Past(hold_valid), Past(hold), Past(self.i_data)))
+			# f_data should remain stable during a transmission, even if i_data
+			# changes
+			with m.If(f_past_valid & (Past(bits) != 0) & ~Past(start)):
+				m.d.comb += Assert(Stable(self.f_data))
+
+			"""
+			f_counter properties
+			"""
+			# f_counter is initially zero
+			with m.If(~f_past_valid):
+				m.d.comb += Assert(self.f_counter == 0)
+			# f_counter is always zero when idle
+			with m.If(bits == 0):
+				m.d.comb += Assert(self.f_counter == 0)
+			# f_counter is zero at the start of every frame
+			with m.If(f_past_valid & Past(start)):
+				m.d.comb += Assert(self.f_counter == 0)
+			# f_counter is always increasing during a transmission
+			with m.If(f_past_valid & (Past(bits) != 0) & (bits != 0) & ~Past(start)):
+				m.d.comb += Assert(self.f_counter == Past(self.f_counter) + 1)
+			# For an integer divisor every baud period has the same length, so f_counter is
+			# pinned to the baud generator
+			with m.If((bits != 0) & (setup[:FRAC_BITS] == 0)):
+				m.d.comb += Assert(self.f_counter + baudgen.counter == \
+					(FRAME + 1 - bits) * setup[FRAC_BITS:] - 1)
+			# For any divisor every baud period is the integer part of the divisor long or one clock
+			# longer, which bounds f_counter in every step rather than only after a whole frame has
+			# been unrolled
+			with m.If(bits != 0):
+				m.d.comb += Assert(self.f_counter + baudgen.counter >= \
+					(FRAME + 1 - bits) * setup[FRAC_BITS:] - 1)
+				m.d.comb += Assert(self.f_counter + baudgen.counter <= \
+					(FRAME + 1 - bits) * (setup[FRAC_BITS:] + 1) - 1)
+
+		return m
+
+if __name__ == "__main__":
+	"""
+	Simulation
+	"""
+	from simharness import *
+	from proofcache import *
+
+	m = Module()
+	m.submodules.txuart = txuart = TXUART()
+
+	sim = SimHarness(m, idle=[txuart])
+
+	msg = "Hello World!\n"
+
+	def process():
+		yield Wait(25)
+		# Bytes are written as soon as the transmitter takes them, so the frames should follow
+		# each other without any idle time on o_uart_tx
+		for c in msg:
+			yield WaitWhile(txuart.o_busy)
+			yield txuart.i_wr.eq(1)
+			yield txuart.i_data.eq(ord(c))
+			yield
+			yield txuart.i_wr.eq(0)
+			yield txuart.i_data.eq(0)
+			yield
+		yield Wait(100)
+
+	sim.add_clock(1e-8)
+	sim.add_sync_process(process)
+
+	with sim.write_vcd('txuart.vcd', 'txuart.gtkw', traces=txuart.ports()):
+		sim.run()
+
+	"""
+	Formal Verification
+	"""
+	class TXUARTTest(FormalTestCase):
+		def test_txuart(self):
+			# The divisor register has 3 integer bits, so the proofs cover every divisor from 2
+			# clocks per baud (the least the baud generator takes) to just under 8, with any
+			# fractional part. Multiplying by a wider one in the f_counter properties leaves the
+			# default solver stuck in induction
+			self.assertFormal(TXUART(i_setup=Signal(FRAC_BITS + 3), fv_mode=True), mode='prove', \
+				depth=8)
+		def test_txuart_parity(self):
+			self.assertFormal(TXUART(i_setup=Signal(FRAC_BITS + 3), parity='odd', fv_mode=True), \
+				mode='prove', depth=8)
+		def test_txuart_2stop(self):
+			self.assertFormal(TXUART(i_setup=Signal(FRAC_BITS + 3), stop_bits=2, fv_mode=True), \
+				mode='prove', depth=8)
+	TXUARTTest().test_txuart()
+	TXUARTTest().test_txuart_parity()
+	TXUARTTest().test_txuart_2stop()
+
+	"""
+	Build - No build since the transmitter is just a component. A top-level is required
+	for building the design
+	"""
@@ -5,6 +5,7 @@ from nmigen.test.utils import *
 from nmigen.cli import main_parser, main_runner
 from lfsr_fib import *
 from lfsr_gal import *
+from lfsr_wide import lfsr_invariant
 from functools import reduce
 
 __all__ = ["LFSREquiv"]
@@ -47,44 +48,15 @@ class LFSREquiv(Elaboratable):
 		m.d.comb += self.o_bit.eq(self.fib_bit ^ self.gal_bit)
 
 		if self.fv_mode:
-			f_past_valid = Signal(1, reset=0)
-			m.d.sync += f_past_valid.eq(1)
-
-			with m.If(~f_past_valid):
-				m.d.comb += Assert(fib.sreg[0] == gal.sreg[0])
-				m.d.comb += Assert(fib.sreg[1] == gal.sreg[1])
-				m.d.comb += Assert(fib.sreg[2] == gal.sreg[2])
-				m.d.comb += Assert((fib.sreg[3] ^ gal.sreg[3]) == gal.sreg[0])
-				m.d.comb += Assert((fib.sreg[4] ^ gal.sreg[4]) == gal.sreg[1])
-				m.d.comb += Assert((fib.sreg[5] ^ gal.sreg[5]) == (gal.sreg[2] ^ gal.sreg[0]))
-				m.d.comb += Assert((fib.sreg[6] ^ gal.sreg[6]) == (gal.sreg[3] ^ gal.sreg[1]))
-				m.d.comb += Assert((fib.sreg[7] ^ gal.sreg[7]) == (gal.sreg[4] ^ gal.sreg[2]))
-			with m.Elif((Past(fib.sreg)[0] == Past(gal.sreg)[0]) & \
-				(Past(fib.sreg)[1] == Past(gal.sreg)[1]) & \
-				(Past(fib.sreg)[2] == Past(gal.sreg)[2]) & \
-				((Past(fib.sreg)[3] ^ Past(gal.sreg)[3]) == Past(gal.sreg)[0]) & \
-				((Past(fib.sreg)[4] ^ Past(gal.sreg)[4]) == Past(gal.sreg)[1]) & \
-				((Past(fib.sreg)[5] ^ Past(gal.sreg)[5]) == (Past(gal.sreg)[2] ^ Past(gal.sreg)[0])) & \
-				((Past(fib.sreg)[6] ^ Past(gal.sreg)[6]) == (Past(gal.sreg)[3] ^ Past(gal.sreg)[1])) & \
-				((Past(fib.sreg)[7] ^ Past(gal.sreg)[7]) == (Past(gal.sreg)[4] ^ Past(gal.sreg)[2]))):
-				m.d.comb += Assert(fib.sreg[0] == gal.sreg[0])
-				m.d.comb += Assert(fib.sreg[1] == gal.sreg[1])
-				m.d.comb += Assert(fib.sreg[2] == gal.sreg[2])
-				m.d.comb += Assert((fib.sreg[3] ^ gal.sreg[3]) == gal.sreg[0])
-				m.d.comb += Assert((fib.sreg[4] ^ gal.sreg[4]) == gal.sreg[1])
-				m.d.comb += Assert((fib.sreg[5] ^ gal.sreg[5]) == (gal.sreg[2] ^ gal.sreg[0]))
-				m.d.comb += Assert((fib.sreg[6] ^ gal.sreg[6]) == (gal.sreg[3] ^ gal.sreg[1]))
-				m.d.comb += Assert((fib.sreg[7] ^ gal.sreg[7]) == (gal.sreg[4] ^ gal.sreg[2]))
-
 			# Circuit Invariant - the property that holds between clock cycles
-			m.d.comb += Assert(fib.sreg[0] == gal.sreg[0])
-			m.d.comb += Assert(fib.sreg[1] == gal.sreg[1])
-			m.d.comb += Assert(fib.sreg[2] == gal.sreg[2])
-			m.d.comb += Assert((fib.sreg[3] ^ gal.sreg[3]) == gal.sreg[0])
-			m.d.comb += Assert((fib.sreg[4] ^ gal.sreg[4]) == gal.sreg[1])
-			m.d.comb += Assert((fib.sreg[5] ^ gal.sreg[5]) == (gal.sreg[2] ^ gal.sreg[0]))
-			m.d.comb += Assert((fib.sreg[6] ^ gal.sreg[6]) == (gal.sreg[3] ^ gal.sreg[1]))
-			m.d.comb += Assert((fib.sreg[7] ^ gal.sreg[7]) == (gal.sreg[4] ^ gal.sreg[2]))
+			# Bit j of fib.sreg is the bit gal.sreg shifts out j steps later,
+			# which is an XOR of bits of gal.sreg derived from the taps (see
+			# lfsr_invariant). As it is inductive, it also holds initially
+			# and after every step
+			for j, mask in enumerate(lfsr_invariant(len(fib.sreg), \
+				LFSRFib.TAPS, LFSRGal.TAPS)):
+				m.d.comb += Assert(fib.sreg[j] == reduce(lambda a, b: a ^ b, \
+					(gal.sreg[i] for i in range(len(gal.sreg)) if (mask >> i) & 1)))
 
 			# Therefore, our desired property follows immediately. Q.E.D.
 			m.d.comb += Assert(~self.o_bit)
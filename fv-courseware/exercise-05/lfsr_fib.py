@@ -12,6 +12,7 @@ https://zipcpu.com/tutorial/class-verilog.pdf
 """
 
 class LFSRFib(Elaboratable):
+	TAPS = 0x2d
 	def __init__(self, i_reset, i_ce, i_in, o_bit, fv_mode = False):
 		self.i_reset = i_reset
 		self.i_ce = i_ce
@@ -29,7 +30,7 @@ class LFSRFib(Elaboratable):
 		]
 	def elaborate(self, platform):
 		m = Module()
-		TAPS = Const(0x2d)
+		TAPS = Const(self.TAPS)
 		with m.If(self.i_reset):
 			m.d.sync += self.sreg.eq(0x80)
 		with m.Elif(self.i_ce):
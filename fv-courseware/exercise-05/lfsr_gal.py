@@ -9,6 +9,7 @@ https://zipcpu.com/tutorial/class-verilog.pdf
 """
 
 class LFSRGal(Elaboratable):
+	TAPS = 0xb4
 	def __init__(self, i_reset, i_ce, i_in, o_bit, fv_mode = False):
 		self.i_reset = i_reset
 		self.i_ce = i_ce
@@ -27,7 +28,7 @@ class LFSRGal(Elaboratable):
 	def elaborate(self, platform):
 		m = Module()
 		
-		TAPS = Const(0xb4)
+		TAPS = Const(self.TAPS)
 
 		with m.If(self.i_reset):
 			m.d.sync += self.sreg.eq(0x80)
@@ -0,0 +1,149 @@
+from nmigen import *
+from nmigen.back.pysim import *
+from lfsr_fib import *
+from lfsr_gal import *
+
+import numpy as np
+import time
+
+__all__ = ["FIB_TAPS", "GAL_TAPS", "SREG_RESET", "fib_model", "gal_model", "check_lfsr"]
+
+"""
+Bit-accurate NumPy reference models of LFSRFib and LFSRGal
+
+Both models step a whole batch of LFSRs at once, one per row of i_in (and of i_reset and i_ce, which
+default to never resetting and always enabled), so that long sequences for many seeds and input
+streams can be generated at millions of steps per second. They return sreg on every clock cycle,
+i.e. sreg[:, t] is the value before the clock edge at the end of cycle t, and o_bit is sreg & 1
+
+check_lfsr simulates one of the LFSRs with one stream of inputs and compares sreg on every clock
+cycle against the corresponding model. By default it uses the pysim simulator, but any simulator
+with the same interface can be passed in, e.g. a compiled one:
+	check_lfsr(LFSRGal, gal_model, i_in, simulator=lambda m, ports: \
+		SimHarness(m, ports=ports, backend='cxxrtl'))
+with SimHarness from fv-beginner/simharness.py
+
+To check the models against pysim and measure their throughput, run
+$ python ./lfsr_model.py
+"""
+
+FIB_TAPS = LFSRFib.TAPS
+GAL_TAPS = LFSRGal.TAPS
+SREG_RESET = 0x80
+
+# Parity of every possible 8-bit value, for the XOR of the Fibonacci taps
+_PARITY = np.array([bin(i).count("1") & 1 for i in range(256)], dtype=np.uint8)
+
+def _inputs(i_in, i_reset, i_ce, seeds):
+	"""
+	Inputs as (steps, batch) arrays, so that each clock cycle is a contiguous row, and the initial
+	state of each LFSR in the batch
+	"""
+	i_in = np.atleast_2d(np.asarray(i_in, dtype=np.uint8))
+	shape = i_in.shape
+	if i_reset is None:
+		i_reset = np.zeros(shape, dtype=bool)
+	if i_ce is None:
+		i_ce = np.ones(shape, dtype=bool)
+	i_reset = np.broadcast_to(np.asarray(i_reset, dtype=bool), shape)
+	i_ce = np.broadcast_to(np.asarray(i_ce, dtype=bool), shape)
+	state = np.broadcast_to(np.asarray(seeds, dtype=np.uint8), shape[:1]).copy()
+	return np.ascontiguousarray(i_in.T), np.ascontiguousarray(i_reset.T), \
+		np.ascontiguousarray(i_ce.T), state
+
+def _run(step, i_in, i_reset, i_ce, seeds):
+	i_in, i_reset, i_ce, state = _inputs(i_in, i_reset, i_ce, seeds)
+	sreg = np.empty(i_in.shape, dtype=np.uint8)
+	for t in range(i_in.shape[0]):
+		sreg[t] = state
+		state = np.where(i_reset[t], np.uint8(SREG_RESET), \
+			np.where(i_ce[t], step(state, i_in[t]), state)).astype(np.uint8)
+	return sreg.T
+
+def _fib_step(state, i_in):
+	# The new MSB is the XOR of the taps and i_in
+	return (state >> 1) | ((_PARITY[state & FIB_TAPS] ^ i_in) << 7)
+
+def _gal_step(state, i_in):
+	# i_in is shifted in at the MSB, and the taps are flipped whenever a 1 is shifted out
+	return ((state >> 1) | (i_in << 7)) ^ (GAL_TAPS * (state & 1))
+
+def fib_model(i_in, i_reset=None, i_ce=None, seeds=SREG_RESET):
+	"""
+	sreg of LFSRFib on every clock cycle, for each row of inputs
+	"""
+	return _run(_fib_step, i_in, i_reset, i_ce, seeds)
+
+def gal_model(i_in, i_reset=None, i_ce=None, seeds=SREG_RESET):
+	"""
+	sreg of LFSRGal on every clock cycle, for each row of inputs
+	"""
+	return _run(_gal_step, i_in, i_reset, i_ce, seeds)
+
+def check_lfsr(lfsr_cls, model, i_in, i_reset=None, i_ce=None, simulator=None):
+	"""
+	Simulates lfsr_cls with a single stream of inputs, and raises AssertionError on the first
+	clock cycle on which sreg differs from model
+	"""
+	steps = len(i_in)
+	i_reset = np.zeros(steps, dtype=bool) if i_reset is None else np.asarray(i_reset, dtype=bool)
+	i_ce = np.ones(steps, dtype=bool) if i_ce is None else np.asarray(i_ce, dtype=bool)
+	expected = model(i_in, i_reset, i_ce)[0]
+
+	m = Module()
+	s_reset = Signal(1, reset=0)
+	# pysim starts sync processes after the first clock edge, which must leave sreg alone for it to
+	# still be in step with the model
+	s_ce = Signal(1, reset=0)
+	s_in = Signal(1, reset=0)
+	o_bit = Signal(1)
+	m.submodules.lfsr = lfsr = lfsr_cls(s_reset, s_ce, s_in, o_bit)
+
+	if simulator is None:
+		sim = Simulator(m)
+	else:
+		sim = simulator(m, lfsr.ports())
+
+	mismatches = []
+
+	def process():
+		for t in range(steps):
+			actual = yield lfsr.sreg
+			if actual != expected[t] and not mismatches:
+				mismatches.append((t, actual, expected[t]))
+			yield s_reset.eq(int(i_reset[t]))
+			yield s_ce.eq(int(i_ce[t]))
+			yield s_in.eq(int(i_in[t]))
+			# Read sreg on the next iteration after the clock edge has settled, so that it is the
+			# value before the edge at the end of cycle t + 1
+			yield
+			yield Settle()
+
+	sim.add_clock(1e-8)
+	sim.add_sync_process(process)
+	sim.run()
+
+	if mismatches:
+		t, actual, wanted = mismatches[0]
+		raise AssertionError("{}: sreg is 0x{:02x} on clock cycle {}, but the model says " \
+			"0x{:02x}".format(lfsr_cls.__name__, actual, t, wanted))
+
+if __name__ == "__main__":
+	rng = np.random.default_rng(0)
+
+	# Throughput of the models
+	batch, steps = 4096, 2000
+	i_in = rng.integers(0, 2, size=(batch, steps), dtype=np.uint8)
+	i_reset = rng.random((batch, steps)) < 0.001
+	i_ce = rng.random((batch, steps)) < 0.9
+	seeds = rng.integers(1, 256, size=batch, dtype=np.uint8)
+	for name, model in (("fib_model", fib_model), ("gal_model", gal_model)):
+		start = time.perf_counter()
+		model(i_in, i_reset, i_ce, seeds)
+		elapsed = time.perf_counter() - start
+		print("{}: {:.0f} steps/s".format(name, batch * steps / elapsed))
+
+	# Comparison against the simulated designs
+	for lfsr_cls, model in ((LFSRFib, fib_model), (LFSRGal, gal_model)):
+		for i in range(3):
+			check_lfsr(lfsr_cls, model, i_in[i], i_reset[i], i_ce[i])
@@ -0,0 +1,259 @@
+from nmigen import *
+from nmigen.back.pysim import *
+from nmigen.asserts import *
+from nmigen.test.utils import *
+from lfsr_model import *
+from functools import reduce
+
+import abc
+import numpy as np
+
+__all__ = ["LFSRFibWide", "LFSRGalWide", "LFSREquivWide", "galois_taps", "lfsr_invariant"]
+
+"""
+Wide and parallel-output LFSR generators
+
+LFSRFibWide and LFSRGalWide generalise LFSRFib and LFSRGal to any width and feedback polynomial,
+and take `lanes` steps per clock cycle. Every bit of the LFSR after `lanes` steps, as well as every
+bit shifted out along the way, is an XOR of bits of sreg and i_in (i.e. a linear function over
+GF(2)), so the unrolled next-state matrix is worked out at elaboration time by stepping the LFSR
+symbolically, and turned into one XOR tree per bit. i_in[k] is the input of step k, and
+o_bits[k] is the bit shifted out by step k, so o_bits[0] is the oldest bit
+
+The taps follow LFSRFib and LFSRGal: for the Fibonacci form, bit j of taps set means sreg[j]
+is XORed into the new MSB, and the Galois form with the bit-reversed taps (see galois_taps)
+generates the same sequence. E.g. LFSRFibWide(8, 0x2d) and LFSRGalWide(8, 0xb4) behave exactly
+like LFSRFib and LFSRGal, and LFSRFibWide(31, 0x9, lanes=32) is a PRBS31 (x^31 + x^28 + 1)
+generator producing 32 bits per clock cycle
+
+LFSREquivWide generalises the equivalence proof in lfsr_equiv.py to any polynomial and number of
+lanes. The invariant relating the two shift registers (see lfsr_invariant) is worked out the same
+way: bit j of the Fibonacci register is the bit that comes out j steps later, which for the Galois
+register is a linear function of its current state. As the invariant is inductive, the proofs
+need a single step of induction whatever the width, although that step grows with the width and
+the number of lanes, and so does the time the solver takes for it
+
+To run the simulation and formal verification in this script, run
+$ python ./lfsr_wide.py
+If no output is generated then this means both have passed
+"""
+
+def galois_taps(taps, width):
+	"""
+	Taps of the Galois form generating the same sequence as the Fibonacci form with taps
+	"""
+	return int("{:0{}b}".format(taps, width)[::-1], 2)
+
+def _xor_of(value, mask):
+	"""
+	XOR of the bits of value selected by mask
+	"""
+	bits = [value[i] for i in range(len(value)) if (mask >> i) & 1]
+	if not bits:
+		return Const(0, 1)
+	return reduce(lambda a, b: a ^ b, bits)
+
+def _fib_step(taps, state, i_in):
+	# The new MSB is the XOR of the taps and i_in
+	new = reduce(lambda a, b: a ^ b, \
+		(bit for j, bit in enumerate(state) if (taps >> j) & 1), i_in)
+	return state[1:] + [new]
+
+def _gal_step(taps, state, i_in):
+	# i_in is shifted in at the MSB, and the taps are flipped whenever a 1 is shifted out
+	shifted = state[1:] + [i_in]
+	return [bit ^ (state[0] if (taps >> j) & 1 else 0) for j, bit in enumerate(shifted)]
+
+def _apply(masks, state):
+	"""
+	masks (over the bits of some register) applied to state (masks of the bits of that register)
+	"""
+	return [reduce(lambda a, b: a ^ b, \
+		(bit for i, bit in enumerate(state) if (mask >> i) & 1), 0) for mask in masks]
+
+def lfsr_invariant(width, fib_taps, gal_taps, reset = None):
+	"""
+	Masks over the bits of the Galois register giving each bit of the Fibonacci register, for
+	LFSRs of the given width and taps with the same reset value. Raises ValueError if the two
+	LFSRs do not generate the same sequence, i.e. if the relation is not inductive
+	"""
+	reset = (1 << (width - 1)) if reset is None else reset
+	gal = [1 << i for i in range(width)]
+	in_mask = 1 << width
+
+	# Bit j of the Fibonacci register is what the Galois register shifts out j steps later
+	state = gal
+	masks = []
+	for j in range(width):
+		masks.append(state[0])
+		state = _gal_step(gal_taps, state, 0)
+
+	# The relation has to hold after reset, and be preserved by every step (over the bits of the
+	# Galois register and i_in)
+	if _apply(masks, [(reset >> i) & 1 for i in range(width)]) != \
+		[(reset >> j) & 1 for j in range(width)]:
+		raise ValueError("The LFSRs with taps 0x{:x} and 0x{:x} differ after reset" \
+			.format(fib_taps, gal_taps))
+	if _fib_step(fib_taps, masks, in_mask) != _apply(masks, _gal_step(gal_taps, gal, in_mask)):
+		raise ValueError("The LFSRs with taps 0x{:x} and 0x{:x} do not generate the same " \
+			"sequence".format(fib_taps, gal_taps))
+
+	return masks
+
+class _LFSRWide(Elaboratable):
+	def __init__(self, width, taps, lanes = 1, reset = None):
+		assert width >= 2 and 0 < taps < (1 << width) and lanes >= 1
+		self.width = width
+		self.taps = taps
+		self.lanes = lanes
+		self.i_reset = Signal(1, reset=0)
+		self.i_ce = Signal(1, reset=1)
+		self.i_in = Signal(lanes, reset=0)
+		self.o_bits = Signal(lanes)
+		self.sreg_reset = (1 << (width - 1)) if reset is None else reset
+		self.sreg = Signal(width, reset=self.sreg_reset)
+	def ports(self):
+		return [
+			self.i_reset,
+			self.i_ce,
+			self.i_in,
+			self.o_bits,
+			self.sreg
+		]
+	@abc.abstractmethod
+	def step(self, state, i_in):
+		"""
+		One step of the LFSR, on a list of bit masks (one per bit of sreg) over the bits of
+		Cat(sreg, i_in)
+		"""
+	def unrolled(self):
+		"""
+		Masks over the bits of Cat(sreg, i_in) of every bit of sreg after `lanes` steps, and of
+		every bit shifted out along the way
+		"""
+		state = [1 << i for i in range(self.width)]
+		outputs = []
+		for k in range(self.lanes):
+			outputs.append(state[0])
+			state = self.step(state, 1 << (self.width + k))
+		return state, outputs
+	def elaborate(self, platform):
+		m = Module()
+
+		state, outputs = self.unrolled()
+		inputs = Cat(self.sreg, self.i_in)
+
+		with m.If(self.i_reset):
+			m.d.sync += self.sreg.eq(self.sreg_reset)
+		with m.Elif(self.i_ce):
+			m.d.sync += self.sreg.eq(Cat(*(_xor_of(inputs, mask) for mask in state)))
+		m.d.comb += self.o_bits.eq(Cat(*(_xor_of(inputs, mask) for mask in outputs)))
+
+		return m
+
+class LFSRFibWide(_LFSRWide):
+	def step(self, state, i_in):
+		return _fib_step(self.taps, state, i_in)
+
+class LFSRGalWide(_LFSRWide):
+	def step(self, state, i_in):
+		return _gal_step(self.taps, state, i_in)
+
+class LFSREquivWide(Elaboratable):
+	def __init__(self, width, taps, lanes = 1, fv_mode = False):
+		self.fib = LFSRFibWide(width, taps, lanes)
+		self.gal = LFSRGalWide(width, galois_taps(taps, width), lanes)
+		self.i_reset = Signal(1, reset=0)
+		self.i_ce = Signal(1, reset=1)
+		self.i_in = Signal(lanes, reset=0)
+		self.o_bits = Signal(lanes)
+		self.fv_mode = fv_mode
+	def ports(self):
+		return [
+			self.i_reset,
+			self.i_ce,
+			self.i_in,
+			self.o_bits
+		]
+	def elaborate(self, platform):
+		m = Module()
+
+		m.submodules.fib = fib = self.fib
+		m.submodules.gal = gal = self.gal
+		for lfsr in (fib, gal):
+			m.d.comb += [
+				lfsr.i_reset.eq(self.i_reset),
+				lfsr.i_ce.eq(self.i_ce),
+				lfsr.i_in.eq(self.i_in)
+			]
+
+		m.d.comb += self.o_bits.eq(fib.o_bits ^ gal.o_bits)
+
+		if self.fv_mode:
+			# Circuit Invariant - the property that holds between clock cycles
+			for j, mask in enumerate(lfsr_invariant(fib.width, fib.taps, gal.taps)):
+				m.d.comb += Assert(fib.sreg[j] == _xor_of(gal.sreg, mask))
+
+			# Therefore, our desired property follows immediately. Q.E.D.
+			m.d.comb += Assert(self.o_bits == 0)
+
+		return m
+
+# Formal Verification
+class LFSREquivWideTest(FHDLTestCase):
+	def test_lfsr_equiv_8(self):
+		# The polynomial of lfsr_equiv.py, one bit per clock cycle
+		self.assertFormal(LFSREquivWide(8, 0x2d, fv_mode = True), mode="prove")
+	def test_lfsr_equiv_prbs31(self):
+		# PRBS31, 32 bits per clock cycle
+		self.assertFormal(LFSREquivWide(31, 0x9, lanes = 32, fv_mode = True), mode="prove")
+	# x^16 + x^14 + x^13 + x^11 + 1, x^32 + x^22 + x^2 + x + 1 and
+	# x^64 + x^63 + x^61 + x^60 + 1 (taps of the reciprocal polynomials, as
+	# for PRBS31), with a single step of induction. Each width is a test of its
+	# own, so that each gets its own time limit in run_formal.py
+	def test_lfsr_equiv_16(self):
+		self.assertFormal(LFSREquivWide(16, 0x002d, fv_mode = True), mode="prove", depth=1)
+	def test_lfsr_equiv_32(self):
+		self.assertFormal(LFSREquivWide(32, 0xc0000401, fv_mode = True), mode="prove", depth=1)
+	def test_lfsr_equiv_64(self):
+		self.assertFormal(LFSREquivWide(64, 0x1b, fv_mode = True), mode="prove", depth=1)
+
+if __name__ == "__main__":
+	# Simulation
+	# LFSRFibWide(8, 0x2d) and LFSRGalWide(8, 0xb4) with 4 lanes shift out the same bits as the
+	# golden models of LFSRFib and LFSRGal, 4 at a time
+	LANES = 4
+	CYCLES = 250
+	rng = np.random.default_rng(0)
+	i_in = rng.integers(0, 2, size=LANES * CYCLES, dtype=np.uint8)
+	for lfsr_cls, taps, model in ((LFSRFibWide, 0x2d, fib_model), (LFSRGalWide, 0xb4, gal_model)):
+		# pysim starts sync processes after the first clock edge, which has already taken LANES
+		# steps with i_in at its reset value of zero
+		expected = (model(np.concatenate([np.zeros(LANES, dtype=np.uint8), i_in]))[0] & 1)[LANES:]
+
+		m = Module()
+		m.submodules.lfsr = lfsr = lfsr_cls(8, taps, LANES)
+
+		sim = Simulator(m)
+
+		def process():
+			for t in range(CYCLES):
+				chunk = i_in[LANES * t:LANES * (t + 1)]
+				yield lfsr.i_in.eq(int(sum(int(b) << k for k, b in enumerate(chunk))))
+				yield Settle()
+				o_bits = yield lfsr.o_bits
+				for k in range(LANES):
+					assert (o_bits >> k) & 1 == expected[LANES * t + k], \
+						"{}: bit {} differs from the model".format(lfsr_cls.__name__, LANES * t + k)
+				yield
+
+		sim.add_clock(1e-8)
+		sim.add_sync_process(process)
+		sim.run()
+
+	# Formal Verification
+	LFSREquivWideTest().test_lfsr_equiv_8()
+	LFSREquivWideTest().test_lfsr_equiv_prbs31()
+	LFSREquivWideTest().test_lfsr_equiv_16()
+	LFSREquivWideTest().test_lfsr_equiv_32()
+	LFSREquivWideTest().test_lfsr_equiv_64()
@@ -0,0 +1,325 @@
+import argparse
+import ast
+import concurrent.futures
+import fnmatch
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import unittest
+import xml.etree.ElementTree as ET
+
+__all__ = ['Target', 'discover', 'run_target', 'run_targets']
+
+"""
+Parallel runner for the formal verification in fv-beginner and fv-courseware
+
+Formal targets are collected from the sources without running them:
+- every test method of every FHDLTestCase (or FormalTestCase, see fv-beginner/proofcache.py)
+  subclass, whether it is defined at the top level of a file or in its if __name__ == '__main__'
+  block
+- every design that a file hands to main_runner in its if __name__ == '__main__' block, which is
+  converted to RTLIL with the file's own generate command and proven with sby, using the .sby file
+  next to it if there is one (e.g. reqarb.sby), or else in prove mode with the default depth
+
+--engines portfolio races several solvers on every target, both in the tests (through
+FORMAL_ENGINES) and in the .sby files of the main_runner designs, whose engines are replaced
+
+Each target runs in a process of its own, so that a proof that runs for too long can be killed
+along with its solvers, and up to --jobs of them run at the same time, the slowest ones (according
+to the previous JSON report, if any) first. With as many jobs as targets, the whole suite takes
+about as long as its slowest proof
+
+To list or run the targets, and write the reports, run
+$ python ./run_formal.py --list
+$ python ./run_formal.py -j 8 --timeout 1800 --junit formal.xml --json formal.json
+and -k picks the targets whose names match a pattern, e.g. -k '*sfifo*'
+"""
+
+TREES = ('fv-beginner', 'fv-courseware')
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SBY = """\
+[options]
+mode prove
+
+[engines]
+smtbmc
+
+[script]
+read_ilang toplevel.il
+prep -top top
+
+[files]
+toplevel.il
+"""
+
+class Target:
+	"""
+	A formal target, test_name being either Class.test_method or main_runner
+	"""
+	def __init__(self, path, test_name):
+		self.path = path
+		self.test_name = test_name
+	@property
+	def name(self):
+		return '{}::{}'.format(os.path.relpath(self.path, ROOT), self.test_name)
+	@classmethod
+	def from_name(cls, name):
+		path, test_name = name.split('::')
+		return cls(os.path.join(ROOT, path), test_name)
+
+def _is_main_block(node):
+	return isinstance(node, ast.If) and isinstance(node.test, ast.Compare) and \
+		isinstance(node.test.left, ast.Name) and node.test.left.id == '__name__' and \
+		isinstance(node.test.comparators[0], ast.Constant) and \
+		node.test.comparators[0].value == '__main__'
+
+TEST_CASES = ('FHDLTestCase', 'FormalTestCase')
+
+def _is_test_case(node):
+	return isinstance(node, ast.ClassDef) and any( \
+		(isinstance(base, ast.Name) and base.id in TEST_CASES) or \
+		(isinstance(base, ast.Attribute) and base.attr in TEST_CASES) for base in node.bases)
+
+def _calls(node, name):
+	return any(isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and \
+		call.func.id == name for call in ast.walk(node))
+
+def _is_sys_path_call(node):
+	"""
+	Whether node is e.g. sys.path.insert(...), which the imports after it may rely on
+	"""
+	return isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and \
+		isinstance(node.value.func, ast.Attribute) and \
+		isinstance(node.value.func.value, ast.Attribute) and node.value.func.value.attr == 'path'
+
+def _sources(trees):
+	for tree in trees:
+		for dirpath, dirnames, filenames in os.walk(os.path.join(ROOT, tree)):
+			dirnames[:] = sorted(d for d in dirnames if d != '__pycache__' and \
+				not d.startswith('.'))
+			for filename in sorted(filenames):
+				if filename.endswith('.py'):
+					yield os.path.join(dirpath, filename)
+
+def discover(trees=TREES):
+	"""
+	Formal targets in the given directories, in the order they appear
+	"""
+	targets = []
+	for path in _sources(trees):
+		with open(path) as f:
+			module = ast.parse(f.read(), path)
+		for node in module.body:
+			nodes = node.body if _is_main_block(node) else [node]
+			for child in nodes:
+				if _is_test_case(child):
+					for item in child.body:
+						if isinstance(item, ast.FunctionDef) and item.name.startswith('test'):
+							targets.append(Target(path, '{}.{}'.format(child.name, item.name)))
+			if _is_main_block(node) and _calls(node, 'main_runner'):
+				targets.append(Target(path, 'main_runner'))
+	return targets
+
+def _load(path):
+	"""
+	Namespace of the file at path, with the test cases (and imports) of its __main__ block, but
+	without running any of its simulations or tests
+	"""
+	with open(path) as f:
+		module = ast.parse(f.read(), path)
+	body = []
+	for node in module.body:
+		if _is_main_block(node):
+			body += [child for child in node.body if isinstance(child, (ast.Import, \
+				ast.ImportFrom, ast.ClassDef, ast.FunctionDef)) or _is_sys_path_call(child)]
+		elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and \
+			isinstance(node.value.func, ast.Attribute) and \
+			node.value.func.attr.startswith('test'):
+			# e.g. LFSREquivTest().test_lfsr_equiv() at the top level
+			continue
+		else:
+			body.append(node)
+	module.body = body
+	name = os.path.splitext(os.path.basename(path))[0]
+	namespace = {'__name__': name, '__file__': path}
+	directory = os.path.dirname(path)
+	if os.path.exists(os.path.join(directory, '__init__.py')):
+		# Modules in a package (e.g. uart) use relative imports
+		namespace['__package__'] = os.path.basename(directory)
+		namespace['__name__'] = '{}.{}'.format(namespace['__package__'], name)
+	exec(compile(module, path, 'exec'), namespace)
+	return namespace
+
+def run_target(target):
+	"""
+	Runs a single target in this process, and returns whether it passed
+	"""
+	directory = os.path.dirname(target.path)
+	os.chdir(directory)
+	if os.path.exists(os.path.join(directory, '__init__.py')):
+		# Modules in a package are imported through the package. Putting the package directory
+		# itself on the path would let its modules shadow top-level ones, standard library included
+		sys.path[:0] = [os.path.dirname(directory)]
+	else:
+		sys.path[:0] = [directory, os.path.dirname(directory)]
+	if target.test_name == 'main_runner':
+		return _run_main_runner(target)
+	class_name, method_name = target.test_name.split('.')
+	test_case = _load(target.path)[class_name](method_name)
+	result = unittest.TextTestRunner(stream=sys.stdout, verbosity=0).run(test_case)
+	return result.wasSuccessful()
+
+def _run_main_runner(target):
+	directory = os.path.dirname(target.path)
+	stem = os.path.splitext(os.path.basename(target.path))[0]
+	work_dir = os.path.join(directory, '{}_main_runner'.format(stem))
+	if os.path.exists(work_dir):
+		shutil.rmtree(work_dir)
+	os.makedirs(work_dir)
+	rtlil = subprocess.run([sys.executable, target.path, 'generate', '-t', 'il'], check=True, \
+		stdout=subprocess.PIPE, universal_newlines=True).stdout
+	with open(os.path.join(work_dir, 'toplevel.il'), 'w') as f:
+		f.write(rtlil)
+	sby_file = os.path.join(directory, stem + '.sby')
+	if os.path.exists(sby_file):
+		with open(sby_file) as f:
+			config = f.read()
+	else:
+		config = DEFAULT_SBY
+	if os.environ.get('FORMAL_ENGINES') == 'portfolio':
+		config = _portfolio(config)
+	with open(os.path.join(work_dir, stem + '.sby'), 'w') as f:
+		f.write(config)
+	return subprocess.run(['sby', '-f', stem + '.sby'], cwd=work_dir).returncode == 0
+
+def _portfolio(config):
+	"""
+	config with its engines replaced by the portfolio for its mode, all racing each other
+	"""
+	sys.path.insert(0, os.path.join(ROOT, 'fv-beginner'))
+	from proofcache import PORTFOLIO
+	mode = re.search(r'^mode\s+(\w+)', config, re.MULTILINE).group(1)
+	config = re.sub(r'^wait\s+on\s*\n', '', config, flags=re.MULTILINE)
+	return re.sub(r'(^\[engines\]\n)(.*?)(?=^\[|\Z)', \
+		lambda match: match.group(1) + '\n'.join(PORTFOLIO[mode]) + '\n\n', config, \
+		flags=re.MULTILINE | re.DOTALL)
+
+def _spawn(target, timeout):
+	"""
+	Runs target in a process of its own, and returns its status, wall time and output
+	"""
+	start = time.perf_counter()
+	with subprocess.Popen([sys.executable, os.path.abspath(__file__), '--run', target.name], \
+		stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, \
+		start_new_session=True) as proc:
+		try:
+			output, _ = proc.communicate(timeout=timeout)
+			status = 'passed' if proc.returncode == 0 else 'failed'
+		except subprocess.TimeoutExpired:
+			# Kill sby and the solvers as well
+			os.killpg(proc.pid, signal.SIGKILL)
+			output, _ = proc.communicate()
+			status = 'timeout'
+	return {
+		'name': target.name,
+		'status': status,
+		'time': time.perf_counter() - start,
+		'output': output
+	}
+
+def run_targets(targets, jobs=None, timeout=None, durations={}):
+	"""
+	Runs targets across jobs processes, the ones that took longest before (according to
+	durations) first, and returns their results in the order of targets
+	"""
+	order = sorted(targets, key=lambda target: durations.get(target.name, float('inf')), \
+		reverse=True)
+	results = {}
+	with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+		futures = [executor.submit(_spawn, target, timeout) for target in order]
+		for future in concurrent.futures.as_completed(futures):
+			result = future.result()
+			results[result['name']] = result
+			print('{:7} {:8.1f} s  {}'.format(result['status'].upper(), result['time'], \
+				result['name']), flush=True)
+	return [results[target.name] for target in targets]
+
+def write_junit(results, path, elapsed):
+	suite = ET.Element('testsuite', name='formal', tests=str(len(results)), \
+		failures=str(sum(result['status'] == 'failed' for result in results)), \
+		errors=str(sum(result['status'] == 'timeout' for result in results)), \
+		time='{:.3f}'.format(elapsed))
+	for result in results:
+		path_name, test_name = result['name'].split('::')
+		case = ET.SubElement(suite, 'testcase', classname=path_name, name=test_name, \
+			time='{:.3f}'.format(result['time']))
+		if result['status'] == 'failed':
+			ET.SubElement(case, 'failure', message='Formal verification failed').text = \
+				result['output']
+		elif result['status'] == 'timeout':
+			ET.SubElement(case, 'error', type='timeout', message='Timed out').text = \
+				result['output']
+		ET.SubElement(case, 'system-out').text = result['output']
+	ET.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
+
+def write_json(results, path, elapsed):
+	with open(path, 'w') as f:
+		json.dump({'time': elapsed, 'targets': results}, f, indent=2)
+
+def main():
+	parser = argparse.ArgumentParser(description='Runs the formal verification in parallel')
+	parser.add_argument('-j', '--jobs', type=int, default=None,
+		help='number of targets to run at the same time (default: number of CPUs)')
+	parser.add_argument('--timeout', type=float, default=None,
+		help='seconds after which a target is killed (default: none)')
+	parser.add_argument('-k', dest='patterns', action='append', default=[],
+		help='only run the targets whose names match this glob pattern')
+	parser.add_argument('--list', action='store_true', help='list the targets and exit')
+	parser.add_argument('--junit', help='file to write a JUnit XML report to')
+	parser.add_argument('--json', help='file to write a JSON report to, which is also read to '
+		'run the slowest targets first')
+	parser.add_argument('--engines', choices=('default', 'portfolio'), default=None,
+		help="'portfolio' races several solvers on each target (see fv-beginner/proofcache.py)")
+	parser.add_argument('--run', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run:
+		sys.exit(0 if run_target(Target.from_name(args.run)) else 1)
+
+	if args.engines is not None:
+		os.environ['FORMAL_ENGINES'] = args.engines
+
+	targets = [target for target in discover() if not args.patterns or \
+		any(fnmatch.fnmatch(target.name, pattern) for pattern in args.patterns)]
+	if args.list:
+		for target in targets:
+			print(target.name)
+		return
+
+	durations = {}
+	if args.json and os.path.exists(args.json):
+		with open(args.json) as f:
+			durations = {result['name']: result['time'] for result in json.load(f)['targets']}
+
+	start = time.perf_counter()
+	results = run_targets(targets, args.jobs, args.timeout, durations)
+	elapsed = time.perf_counter() - start
+	if args.junit:
+		write_junit(results, args.junit, elapsed)
+	if args.json:
+		write_json(results, args.json, elapsed)
+
+	passed = sum(result['status'] == 'passed' for result in results)
+	print('{} of {} targets passed in {:.1f} s (longest {:.1f} s, {:.1f} s in total)'.format( \
+		passed, len(results), elapsed, max((result['time'] for result in results), default=0), \
+		sum(result['time'] for result in results)))
+	sys.exit(0 if passed == len(results) else 1)
+
+if __name__ == '__main__':
+	main()